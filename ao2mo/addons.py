@@ -3,6 +3,9 @@
 # Author: Qiming Sun <osirpt.sun@gmail.com>
 #
 
+import os
+import json
+import struct
 import ctypes
 import tempfile
 import numpy
@@ -12,7 +15,9 @@ import pyscf.lib
 libao2mo = pyscf.lib.load_library('libao2mo')
 
 class load(object):
-    '''load 2e integrals from hdf5 file
+    '''load 2e integrals from hdf5 file or from the raw array file (see
+    :class:`RawFile`).  The integrals of the raw array file are returned as a
+    read-only numpy.memmap, so the slices are not copied.
 
     Usage:
         with load(erifile) as eri:
@@ -25,19 +30,164 @@ class load(object):
 
     def __enter__(self):
         if isinstance(self.eri, str):
-            self.feri = h5py.File(self.eri, 'r')
+            self.feri = _open(self.eri)
             return self.feri[self.dataname]
         elif (hasattr(self.eri, 'read') or #isinstance(self.eri, file) or
               isinstance(self.eri, tempfile._TemporaryFileWrapper)):
-            self.feri = h5py.File(self.eri.name)
+            self.feri = _open(self.eri.name)
             return self.feri[self.dataname]
         else:
             return self.eri
 
     def __exit__(self, type, value, traceback):
-        if not isinstance(self.eri, numpy.ndarray):
+        if self.feri is not None:
             self.feri.close()
 
+def _open(filename):
+    if is_raw(filename):
+        return RawFile(filename, 'r')
+    else:
+        return h5py.File(filename, 'r')
+
+
+RAW_MAGIC = b'PYSCFRAW'
+# The header is padded to RAW_ALIGN bytes.  Each array starts at a multiple
+# of RAW_ALIGN, so that the arrays are page aligned when they are mapped.
+RAW_ALIGN = 4096
+
+def is_raw(filename):
+    '''Whether the file is in the raw array format of :class:`RawFile`'''
+    if not os.path.isfile(filename):
+        return False
+    with open(filename, 'rb') as f:
+        return f.read(len(RAW_MAGIC)) == RAW_MAGIC
+
+class RawFile(object):
+    '''A file of raw little-endian arrays, which can be used in place of the
+    HDF5 file to store the MO integrals.  The arrays are accessed through
+    numpy.memmap.  Slicing an array does not copy the data, and the data are
+    shared in the page cache by all processes which read the same file.
+
+    The file starts with RAW_MAGIC, followed by the length of the JSON header
+    (8-byte little-endian integer) and the JSON header, which is
+    {"datasets": {name: {"dtype": "<f8", "shape": [...], "offset": n}}}.
+    The header and the arrays are aligned to RAW_ALIGN bytes.  Like the HDF5
+    file, the space of a deleted or overwritten dataset is not reclaimed.
+
+    Args:
+        filename : str
+
+    Kwargs:
+        mode : str
+            'r' read only; 'r+' read/write an existing file; 'w' create or
+            truncate; 'a' read/write if the file exists, create otherwise.
+
+    Examples:
+
+    >>> f = RawFile('eri.dat', 'w')
+    >>> eri = f.create_dataset('eri_mo', (55,55), 'f8')
+    >>> eri[:] = 1.
+    >>> f.close()
+    >>> with ao2mo.load('eri.dat') as eri:
+    ...     print(eri[:2,:2])
+    [[ 1.  1.]
+     [ 1.  1.]]
+    '''
+    def __init__(self, filename, mode='r'):
+        assert(mode in ('r', 'r+', 'w', 'a'))
+        self.filename = filename
+        if mode == 'w' or (mode == 'a' and not os.path.isfile(filename)):
+            self._datasets = {}
+            self._header_size = RAW_ALIGN
+            open(filename, 'wb').close()
+            self._write_header()
+            mode = 'r+'
+        else:
+            self._read_header()
+            if mode == 'a':
+                mode = 'r+'
+        self.mode = mode
+        self._mmaps = []
+
+    def _read_header(self):
+        with open(self.filename, 'rb') as f:
+            if f.read(len(RAW_MAGIC)) != RAW_MAGIC:
+                raise IOError('%s is not a raw integral file' % self.filename)
+            n = struct.unpack('<Q', f.read(8))[0]
+            header = json.loads(f.read(n).decode('ascii'))
+        self._datasets = header['datasets']
+        self._header_size = header['header_size']
+
+    def _write_header(self):
+        header = {'datasets': self._datasets,
+                  'header_size': self._header_size}
+        header = json.dumps(header, sort_keys=True).encode('ascii')
+        nbytes = len(RAW_MAGIC) + 8 + len(header)
+        if nbytes > self._header_size:
+            raise RuntimeError('Too many datasets in raw file %s' % self.filename)
+        with open(self.filename, 'r+b') as f:
+            f.write(RAW_MAGIC)
+            f.write(struct.pack('<Q', len(header)))
+            f.write(header)
+            f.write(b' ' * (self._header_size - nbytes))
+
+    def keys(self):
+        return list(self._datasets.keys())
+
+    def __contains__(self, name):
+        return name in self._datasets
+
+    def __getitem__(self, name):
+        info = self._datasets[name]
+        dtype = numpy.dtype(str(info['dtype']))
+        shape = tuple(info['shape'])
+        if numpy.prod(shape) == 0:
+            return numpy.empty(shape, dtype=dtype)
+        arr = numpy.memmap(self.filename, dtype=dtype, mode=self.mode,
+                           offset=info['offset'], shape=shape)
+        if self.mode != 'r':
+            self._mmaps.append(arr)
+        return arr
+
+    def __delitem__(self, name):
+        if self.mode == 'r':
+            raise IOError('%s is opened read only' % self.filename)
+        del(self._datasets[name])
+        self._write_header()
+
+    def create_dataset(self, name, shape, dtype='f8', **kwargs):
+        '''Create an array of given shape and dtype.  The kwargs (e.g. chunks
+        for the HDF5 dataset) are ignored.  If name exists, the old dataset
+        is dropped.'''
+        if self.mode == 'r':
+            raise IOError('%s is opened read only' % self.filename)
+        if name in self._datasets:
+            del(self._datasets[name])
+        dtype = numpy.dtype(dtype).newbyteorder('<')
+        shape = [int(x) for x in shape]
+        offset = os.path.getsize(self.filename)
+        offset = (offset+RAW_ALIGN-1) // RAW_ALIGN * RAW_ALIGN
+        with open(self.filename, 'r+b') as f:
+            f.truncate(offset + int(numpy.prod(shape))*dtype.itemsize)
+        self._datasets[name] = {'dtype': dtype.str, 'shape': shape,
+                                'offset': offset}
+        self._write_header()
+        return self[name]
+
+    def flush(self):
+        for arr in self._mmaps:
+            arr.flush()
+
+    def close(self):
+        self.flush()
+        self._mmaps = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, type, value, traceback):
+        self.close()
+
 
 def restore(symmetry, eri, norb, tao=None):
     r'''Convert the 2e integrals between different level of permutation symmetry
@@ -133,6 +283,49 @@ def restore(symmetry, eri, norb, tao=None):
 
     return _call_restore(origsym, targetsym, eri, eri1, norb)
 
+def contract_rdm2(dm2_slabs, eri, mo_coeff=None):
+    r'''sum_{pqrs} dm2[p,q,r,s] (pq|rs) for the 2-RDM given slab by slab, as
+    the (p0, p1, dm2[p0:p1]) generated by cc.ccsd_rdm.iter_rdm2 or
+    mp.mp2.iter_rdm2.  The full 2-RDM and the full MO integrals are not
+    held in memory.
+
+    Args:
+        dm2_slabs : iterable of (p0, p1, dm2[p0:p1])
+
+        eri : ndarray, HDF5 dataset or :class:`Mole` object
+            If mo_coeff is None, eri is the MO integrals without permutation
+            symmetry, of shape (nmo,nmo,nmo,nmo) or (nmo*nmo,nmo*nmo).
+            Otherwise, it is the AO integrals (e.g. mf._eri) or the Mole
+            object from which (p0:p1 q|rs) are transformed for each slab.
+
+    Kwargs:
+        mo_coeff : ndarray
+            The orbitals of the 2-RDM
+
+    Examples:
+
+    >>> dm2_slabs = cc.ccsd_rdm.iter_rdm2(mycc, t1, t2, l1, l2)
+    >>> e2 = ao2mo.addons.contract_rdm2(dm2_slabs, mol, mf.mo_coeff) * .5
+    '''
+    from pyscf.ao2mo import incore
+    from pyscf.ao2mo import outcore
+    e = 0
+    for p0, p1, dm2 in dm2_slabs:
+        nmo = dm2.shape[1]
+        if mo_coeff is None:
+            if len(eri.shape) == 4:
+                g = eri[p0:p1]
+            else:
+                g = eri[p0*nmo:p1*nmo]
+        else:
+            mos = (mo_coeff[:,p0:p1], mo_coeff, mo_coeff, mo_coeff)
+            if isinstance(eri, numpy.ndarray):
+                g = incore.general(eri, mos, compact=False)
+            else:
+                g = outcore.general_iofree(eri, mos, compact=False)
+        e += numpy.dot(dm2.ravel(), numpy.asarray(g).ravel())
+    return e
+
 def _call_restore(origsym, targetsym, eri, eri1, norb, tao=None):
     if numpy.iscomplexobj(eri):
         raise RuntimeError('TODO')
@@ -2,6 +2,7 @@
 # $Id$
 # -*- coding: utf-8
 
+import sys
 import time
 import tempfile
 import numpy
@@ -9,6 +10,7 @@ import h5py
 import pyscf.lib
 import pyscf.lib.logger as logger
 from pyscf.ao2mo import _ao2mo
+from pyscf.ao2mo import addons
 
 # default ioblk_size is 256 MB
 
@@ -17,7 +19,8 @@ IOBUF_ROW_MIN = 160
 
 def full(mol, mo_coeff, erifile, dataname='eri_mo', tmpdir=None,
          intor='cint2e_sph', aosym='s4', comp=1,
-         max_memory=2000, ioblk_size=256, verbose=logger.WARN, compact=True):
+         max_memory=2000, ioblk_size=256, verbose=logger.WARN, compact=True,
+         nproc=1, file_format='hdf5'):
     r'''Transfer arbitrary spherical AO integrals to MO integrals for given orbitals
 
     Args:
@@ -71,6 +74,18 @@ def full(mol, mo_coeff, erifile, dataname='eri_mo', tmpdir=None,
             returned MO integrals has (up to 4-fold) permutation symmetry.
             If it's False, the function will abandon any permutation symmetry,
             and return the "plain" MO integrals
+        nproc : int
+            When nproc > 1, the AO integrals of the disjoint shell ranges are
+            generated and half-transformed on a pool of nproc processes, and
+            the kl-transformation runs in parallel over blocks of ij rows.
+            max_memory is shared by all processes.  The number of OpenMP
+            threads of each process can be controlled by OMP_NUM_THREADS.
+            The processes are not forked (see :func:`pyscf.lib.process_pool`),
+            the calling script needs the "if __name__ == '__main__':" guard.
+        file_format : str
+            'hdf5' (default) or 'raw'.  For 'raw', erifile is written in the
+            raw array format of :class:`ao2mo.addons.RawFile`, which
+            :func:`ao2mo.load` maps into memory with numpy.memmap.
 
     Returns:
         None
@@ -100,12 +115,14 @@ def full(mol, mo_coeff, erifile, dataname='eri_mo', tmpdir=None,
     dataset ['eri_mo', 'new'], shape (3, 100, 55)
     '''
     general(mol, (mo_coeff,)*4, erifile, dataname, tmpdir,
-            intor, aosym, comp, max_memory, ioblk_size, verbose, compact)
+            intor, aosym, comp, max_memory, ioblk_size, verbose, compact,
+            nproc, file_format)
     return erifile
 
 def general(mol, mo_coeffs, erifile, dataname='eri_mo', tmpdir=None,
             intor='cint2e_sph', aosym='s4', comp=1,
-            max_memory=2000, ioblk_size=256, verbose=logger.WARN, compact=True):
+            max_memory=2000, ioblk_size=256, verbose=logger.WARN, compact=True,
+            nproc=1, file_format='hdf5'):
     r'''For the given four sets of orbitals, transfer arbitrary spherical AO
     integrals to MO integrals on the fly.
 
@@ -161,6 +178,18 @@ def general(mol, mo_coeffs, erifile, dataname='eri_mo', tmpdir=None,
             returned MO integrals has (up to 4-fold) permutation symmetry.
             If it's False, the function will abandon any permutation symmetry,
             and return the "plain" MO integrals
+        nproc : int
+            When nproc > 1, the AO integrals of the disjoint shell ranges are
+            generated and half-transformed on a pool of nproc processes, and
+            the kl-transformation runs in parallel over blocks of ij rows.
+            max_memory is shared by all processes.  The number of OpenMP
+            threads of each process can be controlled by OMP_NUM_THREADS.
+            The processes are not forked (see :func:`pyscf.lib.process_pool`),
+            the calling script needs the "if __name__ == '__main__':" guard.
+        file_format : str
+            'hdf5' (default) or 'raw'.  For 'raw', erifile is written in the
+            raw array format of :class:`ao2mo.addons.RawFile`, which
+            :func:`ao2mo.load` maps into memory with numpy.memmap.
 
     Returns:
         None
@@ -241,7 +270,12 @@ def general(mol, mo_coeffs, erifile, dataname='eri_mo', tmpdir=None,
 #    if nij_pair > nkl_pair:
 #        log.warn('low efficiency for AO to MO trans!')
 
-    if h5py.is_hdf5(erifile):
+    if file_format == 'raw':
+        if addons.is_raw(erifile):
+            feri = addons.RawFile(erifile, 'a')
+        else:
+            feri = addons.RawFile(erifile, 'w')
+    elif h5py.is_hdf5(erifile):
         feri = h5py.File(erifile)
         if dataname in feri:
             del(feri[dataname])
@@ -265,57 +299,71 @@ def general(mol, mo_coeffs, erifile, dataname='eri_mo', tmpdir=None,
 # transform e1
     swapfile = tempfile.NamedTemporaryFile(dir=tmpdir)
     half_e1(mol, mo_coeffs, swapfile.name, intor, aosym, comp,
-            max_memory, ioblk_size, log, compact)
+            max_memory, ioblk_size, log, compact, nproc=nproc)
 
     time_1pass = log.timer('AO->MO eri transformation 1 pass', *time_0pass)
 
     mem_words = max_memory * 1e6 / 8
     iobuflen = guess_e2bufsize(ioblk_size, nij_pair, nao_pair)[0]
 
+    if nproc > 1:
+# nproc blocks being computed, nproc+1 results pending in this process, one
+# block queued and one being written by the writer thread
+        iobuflen = min(iobuflen, max(1, int(mem_words/(2*nproc+3) /
+                                            (nao_pair+nkl_pair))))
+    else:
+# two buffers for prefetching the half-transformed integrals, three buffers
+# for the output which is being written, queued and computed
+        iobuflen = min(iobuflen, max(1, int(mem_words/(nao_pair*2+nkl_pair*3))))
+
     log.debug('step2: kl-pair (ao %d, mo %d), mem %.8g MB, ioblock %.8g MB',
               nao_pair, nkl_pair, iobuflen*nao_pair*8/1e6,
               iobuflen*nkl_pair*8/1e6)
 
+    if nproc > 1:
+        _e2_parallel(swapfile.name, h5d_eri, mokl, klshape, aosym, klmosym,
+                     numpy.array(mol.ao_loc_nr(), dtype=numpy.int32),
+                     nij_pair, nao_pair, comp, iobuflen, nproc, log)
+        feri.close()
+        log.timer('AO->MO eri transformation 2 pass', *time_1pass)
+        log.timer('AO->MO eri transformation', *time_0pass)
+        return erifile
+
     fswap = h5py.File(swapfile.name, 'r')
     klaoblks = len(fswap['0'])
     ijmoblks = int(numpy.ceil(float(nij_pair)/iobuflen)) * comp
     ao_loc = numpy.array(mol.ao_loc_nr(), dtype=numpy.int32)
+    tasks = [(icomp, row0, row1)
+             for row0, row1 in prange(0, nij_pair, iobuflen)
+             for icomp in range(comp)]
+    def load(task, buf):
+        icomp, row0, row1 = task
+        return _load_e2_block(fswap, ['%d/%d'%(icomp,ic) for ic in range(klaoblks)],
+                              row0, row1, buf)
+    reader = _Prefetcher(load, tasks,
+                         [numpy.empty((iobuflen,nao_pair)) for i in range(2)])
+    writer = _AsyncWriter()
+    bufs1 = [numpy.empty((iobuflen,nkl_pair)) for i in range(3)]
     ti0 = time_1pass
-    bufs1 = numpy.empty((iobuflen,nkl_pair))
-    buf = numpy.empty((iobuflen, nao_pair))
-    istep = 0
-    for row0, row1 in prange(0, nij_pair, iobuflen):
+    for istep, (task, buf) in enumerate(reader):
+        icomp, row0, row1 = task
         nrow = row1 - row0
-
-        for icomp in range(comp):
-            istep += 1
-            tioi = 0
-            log.debug('step 2 [%d/%d], [%d,%d:%d], row = %d', \
-                      istep, ijmoblks, icomp, row0, row1, nrow)
-
-            col0 = 0
-            for ic in range(klaoblks):
-                dat = fswap['%d/%d'%(icomp,ic)]
-                col1 = col0 + dat.shape[1]
-                buf[:nrow,col0:col1] = dat[row0:row1]
-                col0 = col1
-            ti2 = log.timer('step 2 [%d/%d], load buf'%(istep,ijmoblks), *ti0)
-            tioi += ti2[1]-ti0[1]
-            pbuf = bufs1[:nrow]
-            _ao2mo.nr_e2_(buf[:nrow], mokl, klshape, aosym, klmosym,
-                          ao_loc=ao_loc, vout=pbuf)
-
-            tw1 = time.time()
-            if comp == 1:
-                h5d_eri[row0:row1] = pbuf
-            else:
-                h5d_eri[icomp,row0:row1] = pbuf
-            tioi += time.time()-tw1
-
-            ti1 = (time.clock(), time.time())
-            log.debug('step 2 [%d/%d] CPU time: %9.2f, Wall time: %9.2f, I/O time: %9.2f', \
-                      istep, ijmoblks, ti1[0]-ti0[0], ti1[1]-ti0[1], tioi)
-            ti0 = ti1
+        log.debug('step 2 [%d/%d], [%d,%d:%d], row = %d', \
+                  istep+1, ijmoblks, icomp, row0, row1, nrow)
+        pbuf = bufs1[istep%3][:nrow]
+        _ao2mo.nr_e2_(buf, mokl, klshape, aosym, klmosym,
+                      ao_loc=ao_loc, vout=pbuf)
+        if comp == 1:
+            writer.write(h5d_eri, slice(row0,row1), pbuf)
+        else:
+            writer.write(h5d_eri, (icomp,slice(row0,row1)), pbuf)
+
+        ti1 = (time.clock(), time.time())
+        log.debug('step 2 [%d/%d] CPU time: %9.2f, Wall time: %9.2f', \
+                  istep+1, ijmoblks, ti1[0]-ti0[0], ti1[1]-ti0[1])
+        ti0 = ti1
+    writer.close()
+    _log_io_time(log, reader, writer, time.time()-time_1pass[1])
     feri.close()
     fswap.close()
 
@@ -328,7 +376,7 @@ def general(mol, mo_coeffs, erifile, dataname='eri_mo', tmpdir=None,
 def half_e1(mol, mo_coeffs, swapfile,
             intor='cint2e_sph', aosym='s4', comp=1,
             max_memory=2000, ioblk_size=256, verbose=logger.WARN, compact=True,
-            ao2mopt=None):
+            ao2mopt=None, nproc=1):
     r'''Half transform arbitrary spherical AO integrals to MO integrals
     for the given two sets of orbitals
 
@@ -374,7 +422,13 @@ def half_e1(mol, mo_coeffs, swapfile,
             If it's False, the function will abandon any permutation symmetry,
             and return the "plain" MO integrals
         ao2mopt : :class:`AO2MOpt` object
-            Precomputed data to improve perfomance
+            Precomputed data to improve perfomance.  It is ignored when
+            nproc > 1 since each process builds its own AO2MOpt.
+        nproc : int
+            Number of processes to generate and transform the AO integrals.
+            The half-transformed integrals are written to swapfile by one
+            background thread of the calling process.  See
+            :func:`pyscf.lib.process_pool` for the constraints.
 
     Returns:
         None
@@ -409,12 +463,19 @@ def half_e1(mol, mo_coeffs, swapfile,
         moij = numpy.asarray(numpy.hstack((mo_coeffs[0],mo_coeffs[1])), order='F')
         ijshape = (0, nmoi, nmoi, nmoj)
 
+    if nproc > 1:
+# Each process holds its own buffers.  The calling process keeps up to
+# nproc+1 transformed blocks, plus the block queued and the block being
+# written to swapfile.
+        max_memory = max_memory / (2*nproc+3)
     e1buflen, mem_words, iobuf_words, ioblk_words = \
             guess_e1bufsize(max_memory, ioblk_size, nij_pair, nao_pair, comp)
 # The buffer to hold AO integrals in C code, see line (@)
     aobuflen = int((mem_words - iobuf_words) // (nao_pair*comp))
     shranges = guess_shell_ranges(mol, e1buflen, aobuflen, aosym)
-    if ao2mopt is None:
+    if nproc > 1:
+        ao2mopt = None
+    elif ao2mopt is None:
         if intor == 'cint2e_sph':
             ao2mopt = _ao2mo.AO2MOpt(mol, intor, 'CVHFnr_schwarz_cond',
                                      'CVHFsetnr_direct_scf')
@@ -432,6 +493,13 @@ def half_e1(mol, mo_coeffs, swapfile,
     # transform e1
     ti0 = log.timer('Initializing ao2mo.outcore.half_e1', *time0)
     nstep = len(shranges)
+    if nproc > 1:
+        _e1_parallel(mol, intor, aosym, comp, moij, ijshape, ijmosym,
+                     shranges, fswap, nproc, log)
+        fswap.close()
+        log.timer('gen AO/transform MO on %d processes' % nproc, *ti0)
+        return swapfile
+
     maxbuflen = max([x[2] for x in shranges])
     bufs1 = numpy.empty((comp*maxbuflen,nao_pair))
     bufs2 = numpy.empty((comp*maxbuflen,nij_pair))
@@ -736,6 +804,313 @@ def guess_shell_ranges(mol, max_iobuf, max_aobuf, aosym):
     ijsh_range.append((ij_start, ij, buflen, ijdiv))
     return ijsh_range
 
+# Data of the worker processes, initialized by _e1_worker_init or
+# _e2_worker_init when the pool is created.
+_worker_data = {}
+
+class _MolEnv(object):
+    '''The _atm, _bas, _env of a Mole object, which can be sent to the worker
+    processes'''
+    def __init__(self, atm, bas, env):
+        self._atm = atm
+        self._bas = bas
+        self._env = env
+
+def _e1_worker_init(atm, bas, env, intor, aosym, comp, moij, ijshape, ijmosym):
+    mol = _MolEnv(atm, bas, env)
+    if intor == 'cint2e_sph':
+        ao2mopt = _ao2mo.AO2MOpt(mol, intor, 'CVHFnr_schwarz_cond',
+                                 'CVHFsetnr_direct_scf')
+    else:
+        ao2mopt = _ao2mo.AO2MOpt(mol, intor)
+    _worker_data.clear()
+    _worker_data.update(mol=mol, intor=intor, aosym=aosym, comp=comp,
+                        moij=moij, ijshape=ijshape, ijmosym=ijmosym,
+                        ao2mopt=ao2mopt)
+
+def _e1_worker(sh_range):
+    '''Generate and half transform the AO integrals of one shell range.
+    Returns the transposed block of shape (comp,nij_pair,len(buf))'''
+    d = _worker_data
+    mol = d['mol']
+    comp = d['comp']
+    iobuf = None
+    p0 = 0
+    for aoshs in sh_range[3]:
+        buf = _ao2mo.nr_e1fill_(d['intor'], aoshs, mol._atm, mol._bas,
+                                mol._env, d['aosym'], comp, d['ao2mopt'])
+        buf = _ao2mo.nr_e1_(buf.reshape(comp*aoshs[2],-1), d['moij'],
+                            d['ijshape'], d['aosym'], d['ijmosym'])
+        if iobuf is None:
+            iobuf = numpy.empty((comp,buf.shape[1],sh_range[2]))
+        buf = buf.reshape(comp,aoshs[2],-1)
+        for icomp in range(comp):
+            iobuf[icomp,:,p0:p0+aoshs[2]] = pyscf.lib.transpose(buf[icomp])
+        p0 += aoshs[2]
+    return iobuf
+
+def _e1_parallel(mol, intor, aosym, comp, moij, ijshape, ijmosym,
+                 shranges, fswap, nproc, log):
+    '''Distribute the shell ranges over nproc processes.  The transformed
+    blocks are appended to fswap in a background thread.  At most nproc+1
+    blocks are scheduled at a time to bound the memory usage.'''
+    import collections
+    nstep = len(shranges)
+    initargs = (mol._atm, mol._bas, mol._env, intor, aosym, comp,
+                moij, ijshape, ijmosym)
+    writer = _AsyncWriter()
+    pool = pyscf.lib.process_pool(nproc, _e1_worker_init, initargs)
+    t0 = time.time()
+    try:
+        pending = collections.deque()
+        def flush():
+            istep, res = pending.popleft()
+            iobuf = res.get()
+            log.debug('step 1 [%d/%d], AO [%d:%d], len(buf) = %d',
+                      istep+1, nstep, *(shranges[istep][:3]))
+            for icomp in range(comp):
+                writer.write(fswap, '%d/%d'%(icomp,istep), iobuf[icomp])
+        for istep, sh_range in enumerate(shranges):
+            pending.append((istep, pool.apply_async(_e1_worker, (sh_range,))))
+            if len(pending) > nproc:
+                flush()
+        while pending:
+            flush()
+        writer.close()
+    finally:
+        pool.close()
+        pool.join()
+    writer.report(log, time.time()-t0)
+
+def _e2_worker_init(swapfile, mokl, klshape, aosym, klmosym, ao_loc):
+    fswap = h5py.File(swapfile, 'r')
+    _worker_data.clear()
+    _worker_data.update(fswap=fswap, mokl=mokl, klshape=klshape, aosym=aosym,
+                        klmosym=klmosym, ao_loc=ao_loc,
+                        klaoblks=len(fswap['0']))
+
+def _e2_worker(args):
+    icomp, row0, row1 = args
+    d = _worker_data
+    fswap = d['fswap']
+    buf = numpy.hstack([fswap['%d/%d'%(icomp,ic)][row0:row1]
+                        for ic in range(d['klaoblks'])])
+    return _ao2mo.nr_e2_(buf, d['mokl'], d['klshape'], d['aosym'],
+                         d['klmosym'], ao_loc=d['ao_loc'])
+
+def _e2_parallel(swapfile, h5d_eri, mokl, klshape, aosym, klmosym, ao_loc,
+                 nij_pair, nao_pair, comp, iobuflen, nproc, log):
+    '''The kl-transformation for blocks of ij rows on nproc processes.  Each
+    process reads its rows from swapfile.  The results are written to
+    h5d_eri in a background thread.'''
+    import collections
+    tasks = [(icomp, row0, row1)
+             for row0, row1 in prange(0, nij_pair, iobuflen)
+             for icomp in range(comp)]
+    ntask = len(tasks)
+    initargs = (swapfile, mokl, klshape, aosym, klmosym, ao_loc)
+    writer = _AsyncWriter()
+    pool = pyscf.lib.process_pool(nproc, _e2_worker_init, initargs)
+    t0 = time.time()
+    try:
+        pending = collections.deque()
+        def flush():
+            istep, res = pending.popleft()
+            icomp, row0, row1 = tasks[istep]
+            pbuf = res.get()
+            log.debug('step 2 [%d/%d], [%d,%d:%d], row = %d',
+                      istep+1, ntask, icomp, row0, row1, row1-row0)
+            if comp == 1:
+                writer.write(h5d_eri, slice(row0,row1), pbuf)
+            else:
+                writer.write(h5d_eri, (icomp,slice(row0,row1)), pbuf)
+        for istep, task in enumerate(tasks):
+            pending.append((istep, pool.apply_async(_e2_worker, (task,))))
+            if len(pending) > nproc:
+                flush()
+        while pending:
+            flush()
+        writer.close()
+    finally:
+        pool.close()
+        pool.join()
+    writer.report(log, time.time()-t0)
+
+
+def _load_e2_block(fswap, blknames, row0, row1, buf):
+    '''Read the rows row0:row1 of the column blocks blknames of the swap file
+    into buf.  Returns the filled part of buf.'''
+    nrow = row1 - row0
+    col0 = 0
+    for name in blknames:
+        dat = fswap[name]
+        col1 = col0 + dat.shape[1]
+        buf[:nrow,col0:col1] = dat[row0:row1]
+        col0 = col1
+    return buf[:nrow]
+
+class _Prefetcher(object):
+    '''Iterate over tasks and yield (task, block).  The block of each task is
+    generated by load(task, buf) in a background thread, alternating between
+    the given buffers.  While the caller works on the block of one task, the
+    block of the next task is being loaded into another buffer.  The block is
+    valid until the next iteration.
+    '''
+    def __init__(self, load, tasks, bufs, async_io=True):
+        self.load = load
+        self.tasks = list(tasks)
+        self.bufs = bufs
+        self.async_io = async_io and len(bufs) > 1
+        self.io_time = 0
+        self.wait_time = 0
+
+    def __iter__(self):
+        if self.async_io:
+            return self._iter_async()
+        else:
+            return self._iter_sync()
+
+    def _iter_sync(self):
+        for task in self.tasks:
+            t0 = time.time()
+            blk = self.load(task, self.bufs[0])
+            self.io_time += time.time() - t0
+            yield task, blk
+
+    def _iter_async(self):
+        import threading
+        try:
+            import queue
+        except ImportError:
+            import Queue as queue
+        free = queue.Queue()
+        ready = queue.Queue()
+        for buf in self.bufs:
+            free.put(buf)
+        stop = []
+        def loop():
+            for task in self.tasks:
+                buf = free.get()
+                if stop:
+                    return
+                try:
+                    t0 = time.time()
+                    blk = self.load(task, buf)
+                    self.io_time += time.time() - t0
+                except Exception:
+                    ready.put((False, sys.exc_info()))
+                    return
+                ready.put((True, (task, blk, buf)))
+        thread = threading.Thread(target=loop)
+        thread.daemon = True
+        thread.start()
+        try:
+            for i in range(len(self.tasks)):
+                t0 = time.time()
+                ok, item = ready.get()
+                self.wait_time += time.time() - t0
+                if not ok:
+                    raise item[1]
+                task, blk, buf = item
+                yield task, blk
+                free.put(buf)
+        finally:
+            stop.append(True)
+            free.put(None)
+            thread.join()
+
+def _log_io_time(log, reader, writer, wall_time):
+    '''Report the time of reading and writing, and the time that the
+    computation was blocked by I/O'''
+    rwait = reader.wait_time if reader.async_io else reader.io_time
+    wwait = writer.wait_time if writer.async_io else writer.io_time
+    log.debug('I/O read %.2f s (blocked %.2f s), write %.2f s (blocked %.2f s), '
+              'compute %.2f s of wall time %.2f s',
+              reader.io_time, rwait, writer.io_time, wwait,
+              wall_time-rwait-wwait, wall_time)
+
+class _AsyncWriter(object):
+    '''Write array blocks to HDF5 datasets/groups, either immediately or in a
+    background thread.  In the background mode, at most one block is queued,
+    so the caller computes the next block while the previous block is being
+    written.
+    '''
+    def __init__(self, async_io=True):
+        self.async_io = async_io
+        self.io_time = 0
+        self.wait_time = 0
+        self._error = None
+        if async_io:
+            import threading
+            try:
+                import queue
+            except ImportError:
+                import Queue as queue
+            self._queue = queue.Queue(1)
+            self._thread = threading.Thread(target=self._loop)
+            self._thread.daemon = True
+            self._thread.start()
+
+    def _loop(self):
+        while True:
+            item = self._queue.get()
+            try:
+                if item is None:
+                    return
+                if self._error is None:
+                    t0 = time.time()
+                    item[0][item[1]] = item[2]
+                    self.io_time += time.time() - t0
+            except Exception:
+                self._error = sys.exc_info()
+            finally:
+                self._queue.task_done()
+
+    def write(self, dest, key, value):
+        '''dest[key] = value.  value should not be modified by the caller
+        after this call.'''
+        if self.async_io:
+            t0 = time.time()
+            self._queue.put((dest, key, value))
+            self.wait_time += time.time() - t0
+            self._check()
+        else:
+            t0 = time.time()
+            dest[key] = value
+            self.io_time += time.time() - t0
+
+    def sync(self):
+        '''Wait until all queued blocks are written.'''
+        if self.async_io:
+            t0 = time.time()
+            self._queue.join()
+            self.wait_time += time.time() - t0
+            self._check()
+
+    def close(self):
+        if self.async_io and self._thread.is_alive():
+            self.sync()
+            self._queue.put(None)
+            self._thread.join()
+        self._check()
+
+    def _check(self):
+        if self._error is not None:
+            err, self._error = self._error, None
+            raise err[1]
+
+    def report(self, log, wall_time):
+        if self.async_io:
+            overlap = max(0, self.io_time - self.wait_time)
+            log.debug('async I/O: write %.2f s, compute blocked on I/O %.2f s, '
+                      'overlapped %.2f s (%.0f%%) of wall time %.2f s',
+                      self.io_time, self.wait_time, overlap,
+                      overlap/max(self.io_time,1e-9)*100, wall_time)
+        else:
+            log.debug('I/O: write %.2f s of wall time %.2f s',
+                      self.io_time, wall_time)
+
+
 def _stand_sym_code(sym):
     if isinstance(sym, int):
         return 's%d' % sym
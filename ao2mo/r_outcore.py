@@ -9,6 +9,7 @@ import h5py
 import pyscf.lib
 import pyscf.lib.logger as logger
 from pyscf.ao2mo import _ao2mo
+from pyscf.ao2mo import outcore
 
 # default ioblk_size is 256 MB
 
@@ -84,6 +85,9 @@ def general(mol, mo_coeffs, erifile, dataname='eri_mo', tmpdir=None,
     time_1pass = log.timer('AO->MO eri transformation 1 pass', *time_0pass)
 
     e2buflen = guess_e2bufsize(ioblk_size, nij_pair, nao_pair)[0]
+# two buffers to prefetch the half-transformed integrals, three for the output
+    mem_words = max_memory * 1e6 / 16
+    e2buflen = min(e2buflen, max(1, int(mem_words/(nao_pair*2+nkl_pair*3))))
 
     log.debug('step2: kl-pair (ao %d, mo %d), mem %.8g MB, '
               'ioblock (r/w) %.8g/%.8g MB', \
@@ -95,39 +99,39 @@ def general(mol, mo_coeffs, erifile, dataname='eri_mo', tmpdir=None,
     ijmoblks = int(numpy.ceil(float(nij_pair)/e2buflen)) * comp
     ao_loc = numpy.array(mol.ao_loc_2c(), dtype=numpy.int32)
     tao = numpy.array(mol.tmap(), dtype=numpy.int32)
+    tasks = [(icomp, row0, row1)
+             for row0, row1 in prange(0, nij_pair, e2buflen)
+             for icomp in range(comp)]
+    def load(task, buf):
+        icomp, row0, row1 = task
+        return outcore._load_e2_block(fswap, ['%d/%d'%(icomp,ic)
+                                              for ic in range(klaoblks)],
+                                      row0, row1, buf)
+    reader = outcore._Prefetcher(load, tasks,
+                                 [numpy.empty((e2buflen, nao_pair), dtype=numpy.complex)
+                                  for i in range(2)])
+    writer = outcore._AsyncWriter()
+    bufs1 = [numpy.empty((e2buflen, nkl_pair), dtype=numpy.complex)
+             for i in range(3)]
     ti0 = time_1pass
-    buf = numpy.empty((e2buflen, nao_pair), dtype=numpy.complex)
-    istep = 0
-    for row0, row1 in prange(0, nij_pair, e2buflen):
+    for istep, (task, buf) in enumerate(reader):
+        icomp, row0, row1 = task
         nrow = row1 - row0
-
-        for icomp in range(comp):
-            istep += 1
-            tioi = 0
-            log.debug('step 2 [%d/%d], [%d,%d:%d], row = %d', \
-                      istep, ijmoblks, icomp, row0, row1, nrow)
-
-            col0 = 0
-            for ic in range(klaoblks):
-                dat = fswap['%d/%d'%(icomp,ic)]
-                col1 = col0 + dat.shape[1]
-                buf[:nrow,col0:col1] = dat[row0:row1]
-                col0 = col1
-            ti2 = log.timer('step 2 [%d/%d], load buf'%(istep,ijmoblks), *ti0)
-            tioi += ti2[1]-ti0[1]
-            pbuf = _ao2mo.r_e2_(buf[:nrow], mokl, klshape, tao, ao_loc, aosym)
-
-            tw1 = time.time()
-            if comp == 1:
-                h5d_eri[row0:row1] = pbuf
-            else:
-                h5d_eri[icomp,row0:row1] = pbuf
-            tioi += time.time()-tw1
-
-            ti1 = (time.clock(), time.time())
-            log.debug('step 2 [%d/%d] CPU time: %9.2f, Wall time: %9.2f, I/O time: %9.2f', \
-                      istep, ijmoblks, ti1[0]-ti0[0], ti1[1]-ti0[1], tioi)
-            ti0 = ti1
+        log.debug('step 2 [%d/%d], [%d,%d:%d], row = %d', \
+                  istep+1, ijmoblks, icomp, row0, row1, nrow)
+        pbuf = _ao2mo.r_e2_(buf, mokl, klshape, tao, ao_loc, aosym,
+                            vout=bufs1[istep%3][:nrow])
+        if comp == 1:
+            writer.write(h5d_eri, slice(row0,row1), pbuf)
+        else:
+            writer.write(h5d_eri, (icomp,slice(row0,row1)), pbuf)
+
+        ti1 = (time.clock(), time.time())
+        log.debug('step 2 [%d/%d] CPU time: %9.2f, Wall time: %9.2f', \
+                  istep+1, ijmoblks, ti1[0]-ti0[0], ti1[1]-ti0[1])
+        ti0 = ti1
+    writer.close()
+    outcore._log_io_time(log, reader, writer, time.time()-time_1pass[1])
     feri.close()
     fswap.close()
 
@@ -116,6 +116,61 @@ class KnowValues(unittest.TestCase):
         eri1 = eri1.reshape(nao,nao,nao,nao)
         self.assertTrue(numpy.allclose(eri1, eriref))
 
+    def test_nroutcore_nproc(self):
+        ftmp = tempfile.NamedTemporaryFile()
+        erifile = ftmp.name
+        mo1 = mo[:,:10]
+        mo2 = mo[:,10:18]
+        ao2mo.outcore.general(mol, (mo1,mo2,mo1,mo1), erifile,
+                              dataname='eri_ref', max_memory=10, ioblk_size=5)
+        ao2mo.outcore.general(mol, (mo1,mo2,mo1,mo1), erifile,
+                              max_memory=10, ioblk_size=5, nproc=3)
+        feri = h5py.File(erifile, 'r')
+        self.assertEqual(feri['eri_mo'].shape, (80,55))
+        self.assertTrue(numpy.allclose(feri['eri_mo'], feri['eri_ref']))
+        feri.close()
+
+        ao2mo.outcore.full(mol, mo, erifile, dataname='eri_ref',
+                           intor='cint2e_ip1_sph', aosym='s2kl', comp=3,
+                           max_memory=10, ioblk_size=5)
+        ao2mo.outcore.full(mol, mo, erifile, intor='cint2e_ip1_sph',
+                           aosym='s2kl', comp=3, max_memory=10, ioblk_size=5,
+                           nproc=2)
+        feri = h5py.File(erifile, 'r')
+        self.assertTrue(numpy.allclose(feri['eri_mo'], feri['eri_ref']))
+        feri.close()
+
+    def test_nroutcore_raw(self):
+        ftmp = tempfile.NamedTemporaryFile()
+        erifile = ftmp.name
+        mo1 = mo[:,:10]
+        mo2 = mo[:,10:18]
+        eriref = ao2mo.outcore.general_iofree(mol, (mo1,mo2,mo1,mo1))
+        ao2mo.outcore.general(mol, (mo1,mo2,mo1,mo1), erifile,
+                              max_memory=10, ioblk_size=5, file_format='raw')
+        self.assertTrue(ao2mo.addons.is_raw(erifile))
+        with ao2mo.load(erifile) as eri:
+            self.assertTrue(isinstance(eri, numpy.memmap))
+            self.assertTrue(numpy.allclose(eri, eriref))
+        ao2mo.outcore.full(mol, mo1, erifile, dataname='eri_ip1',
+                           intor='cint2e_ip1_sph', aosym='s2kl', comp=3,
+                           max_memory=10, ioblk_size=5, file_format='raw')
+        with ao2mo.load(ftmp, 'eri_ip1') as eri:
+            self.assertEqual(eri.shape, (3,100,55))
+        with ao2mo.load(erifile) as eri:
+            self.assertTrue(numpy.allclose(eri, eriref))
+
+    def test_prefetcher(self):
+        def load(task, buf):
+            buf[:] = task
+            return buf
+        reader = ao2mo.outcore._Prefetcher(load, range(9),
+                                           [numpy.empty(3) for i in range(2)])
+        self.assertEqual([int(blk[0]) for task, blk in reader], list(range(9)))
+        reader = ao2mo.outcore._Prefetcher(load, range(9), [numpy.empty(3)],
+                                           async_io=False)
+        self.assertEqual([int(blk[0]) for task, blk in reader], list(range(9)))
+
 def s2ij_s1(symmetry, eri, norb):
     idx = numpy.tril_indices(norb)
     eri1 = numpy.empty((norb,norb,norb,norb))
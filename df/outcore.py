@@ -14,6 +14,7 @@ import pyscf.lib
 from pyscf.lib import logger
 import pyscf.gto
 from pyscf.ao2mo import _ao2mo
+from pyscf.ao2mo import outcore as ao2mo_outcore
 from pyscf.scf import _vhf
 from pyscf.df import incore
 
@@ -255,35 +256,41 @@ def general(mol, mo_coeffs, erifile, auxbasis='weigend', dataname='eri_mo', tmpd
             feri.create_group(str(icomp)) # for h5py old version
 
     iolen = min(int(ioblk_size*1e6/8/(nao_pair+nij_pair)), naoaux)
+# two buffers to prefetch the AO integrals, three for the output
+    iolen = max(1, min(iolen, int(max_memory*1e6/8/(nao_pair*2+nij_pair*3))))
     totstep = (naoaux+iolen-1)//iolen * comp
-    buf = numpy.empty((iolen, nao_pair))
-    istep = 0
+    tasks = [(icomp, row0, row1)
+             for icomp in range(comp)
+             for row0, row1 in prange(0, naoaux, iolen)]
+    def load(task, buf):
+        icomp, row0, row1 = task
+        if comp == 1:
+            blknames = ['%s/%d'%(dataname,ic) for ic in range(aopairblks)]
+        else:
+            blknames = ['%s/%d/%d'%(dataname,icomp,ic) for ic in range(aopairblks)]
+        return ao2mo_outcore._load_e2_block(fswap, blknames, row0, row1, buf)
+    reader = ao2mo_outcore._Prefetcher(load, tasks,
+                                       [numpy.empty((iolen, nao_pair))
+                                        for i in range(2)])
+    writer = ao2mo_outcore._AsyncWriter()
+    bufs1 = [numpy.empty((iolen, nij_pair)) for i in range(3)]
     ti0 = time1
-    for icomp in range(comp):
-        for row0, row1 in prange(0, naoaux, iolen):
-            nrow = row1 - row0
-            istep += 1
-
-            log.debug('step 2 [%d/%d], [%d,%d:%d], row = %d',
-                      istep, totstep, icomp, row0, row1, nrow)
-            col0 = 0
-            for ic in range(aopairblks):
-                if comp == 1:
-                    dat = fswap['%s/%d'%(dataname,ic)]
-                else:
-                    dat = fswap['%s/%d/%d'%(dataname,icomp,ic)]
-                col1 = col0 + dat.shape[1]
-                buf[:nrow,col0:col1] = dat[row0:row1]
-                col0 = col1
-
-            buf1 = _ao2mo.nr_e2_(buf[:nrow], moij, ijshape, aosym_as_nr_e2, ijmosym)
-            if comp == 1:
-                h5d_eri[row0:row1] = buf1
-            else:
-                h5d_eri[icomp,row0:row1] = buf1
-
-            ti0 = log.timer('step 2 [%d/%d], [%d,%d:%d], row = %d'%
-                            (istep, totstep, icomp, row0, row1, nrow), *ti0)
+    for istep, (task, buf) in enumerate(reader):
+        icomp, row0, row1 = task
+        nrow = row1 - row0
+        log.debug('step 2 [%d/%d], [%d,%d:%d], row = %d',
+                  istep+1, totstep, icomp, row0, row1, nrow)
+        buf1 = _ao2mo.nr_e2_(buf, moij, ijshape, aosym_as_nr_e2, ijmosym,
+                             vout=bufs1[istep%3][:nrow])
+        if comp == 1:
+            writer.write(h5d_eri, slice(row0,row1), buf1)
+        else:
+            writer.write(h5d_eri, (icomp,slice(row0,row1)), buf1)
+
+        ti0 = log.timer('step 2 [%d/%d], [%d,%d:%d], row = %d'%
+                        (istep+1, totstep, icomp, row0, row1, nrow), *ti0)
+    writer.close()
+    ao2mo_outcore._log_io_time(log, reader, writer, time.time()-time1[1])
 
     fswap.close()
     feri.close()
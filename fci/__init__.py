@@ -11,6 +11,9 @@
 #              MO integrals
 # direct_uhf   arbitary number of alpha and beta electrons, based on UHF
 #              MO integrals
+# direct_sparse model Hamiltonians (Hubbard, PPP) with sparse 2e interaction
+# selected_ci  heat-bath selected CI, arbitary number of alpha and beta
+#              electrons, for active spaces beyond the reach of FCI
 #
 
 from pyscf.fci import cistring
@@ -22,6 +25,8 @@ from pyscf.fci import direct_spin1_symm
 from pyscf.fci import addons
 from pyscf.fci import rdm
 from pyscf.fci import spin_op
+from pyscf.fci import selected_ci
+from pyscf.fci import direct_sparse
 from pyscf.fci.cistring import num_strings
 from pyscf.fci.rdm import reorder_rdm
 from pyscf.fci.spin_op import spin_square
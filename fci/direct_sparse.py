@@ -0,0 +1,379 @@
+#!/usr/bin/env python
+#
+# FCI solver for model Hamiltonians (Hubbard, PPP, ...) whose two-electron
+# interaction has only a few nonzero elements.  The interaction is given in
+# one of the sparse forms below and only the nonzero terms are contracted with
+# the CI vector.  The density-density part of the interaction is diagonal in
+# the determinant basis and is applied as a diagonal matrix.
+#
+#   * scalar U or 1D array of length norb: on-site (Hubbard) interaction
+#     U_p n_{p,alpha} n_{p,beta}, i.e. (pp|pp) = U_p
+#   * 2D array V of shape (norb,norb): density-density interaction,
+#     (pp|rr) = V[p,r], e.g. the PPP model.  The on-site U is V[p,p]
+#   * tuple (idx, val), idx of shape (nnz,4) and val of shape (nnz,): general
+#     sparse list of (pq|rs) = val for (p,q,r,s) in idx.  Every nonzero
+#     element must be listed, no permutation symmetry is assumed.  See
+#     :func:`sparse_eri` to generate the list from dense integrals.
+#   * tuple (idx, val, f1e): the interaction returned by :func:`absorb_h1e`.
+#     The one-electron operator f1e is kept as a separate term
+#     \sum_{pq} f1e_{pq} E_{pq} of contract_2e.
+#
+# The Hamiltonian is written as
+#     H = \sum_{pq} f_{pq} E_{pq} + 1/2 \sum_{pqrs} (pq|rs) E_{pq} E_{rs}
+# with f_{pq} = h_{pq} - 1/2 \sum_r (pr|rq).  The one-electron part is
+# contracted by direct_spin1.contract_1e.
+#
+
+import numpy
+import pyscf.lib
+import pyscf.lib.logger as logger
+import pyscf.gto
+from pyscf.fci import cistring
+from pyscf.fci import direct_spin1
+
+def _unpack_nelec(nelec):
+    if isinstance(nelec, (int, numpy.integer)):
+        nelecb = nelec//2
+        neleca = nelec - nelecb
+    else:
+        neleca, nelecb = nelec
+    return neleca, nelecb
+
+def sparse_eri(eri, norb, tol=1e-12):
+    '''Convert dense integrals to the sparse list (idx, val) which keeps
+    the elements with abs value larger than tol.
+    '''
+    import pyscf.ao2mo
+    eri = pyscf.ao2mo.restore(1, eri, norb)
+    idx = numpy.argwhere(abs(eri) > tol)
+    val = eri[idx[:,0],idx[:,1],idx[:,2],idx[:,3]]
+    return idx, val
+
+def hubbard_h1e(nsite, t=1., pbc=True):
+    '''Nearest-neighbour hopping matrix of the 1D Hubbard chain'''
+    h1e = numpy.zeros((nsite,nsite))
+    for i in range(nsite-1):
+        h1e[i,i+1] = h1e[i+1,i] = -t
+    if pbc and nsite > 2:
+        h1e[0,nsite-1] = h1e[nsite-1,0] = -t
+    return h1e
+
+def _parse_eri(eri, norb):
+    '''Split the interaction into the density-density matrix V[p,r] of the
+    (pp|rr) terms and the list of remaining terms.
+
+    Returns:
+        vdiag : (norb,norb) ndarray
+        idx, val : the (pq|rs) terms which change the determinants
+    '''
+    if isinstance(eri, tuple):
+        idx, val = eri
+        idx = numpy.asarray(idx, dtype=numpy.int32).reshape(-1,4)
+        val = numpy.asarray(val, dtype=numpy.double).ravel()
+        dd = (idx[:,0] == idx[:,1]) & (idx[:,2] == idx[:,3])
+        vdiag = numpy.zeros((norb,norb))
+        numpy.add.at(vdiag, (idx[dd,0],idx[dd,2]), val[dd])
+        return vdiag, idx[~dd], val[~dd]
+
+    eri = numpy.asarray(eri, dtype=numpy.double)
+    if eri.ndim == 0 or (eri.ndim == 1 and eri.size == norb):
+        vdiag = numpy.diag(numpy.ones(norb) * eri)
+    elif eri.shape == (norb,norb):
+        vdiag = eri
+    else:
+        raise ValueError('Unknown sparse representation of eri %s' %
+                         str(eri.shape))
+    return vdiag, numpy.zeros((0,4), dtype=numpy.int32), numpy.zeros(0)
+
+def _effective_h1e(h1e, vdiag, idx, val):
+    '''f_{pq} = h_{pq} - 1/2 \sum_r (pr|rq)'''
+    f1e = numpy.array(h1e, dtype=numpy.double)
+    f1e -= numpy.diag(vdiag.diagonal()) * .5
+    mask = idx[:,1] == idx[:,2]
+    numpy.add.at(f1e, (idx[mask,0],idx[mask,3]), val[mask] * -.5)
+    return f1e
+
+def _occ(norb, nelec):
+    strs = numpy.asarray(cistring.gen_strings4orblist(range(norb), nelec),
+                         dtype=numpy.int64)
+    return ((strs[:,None] >> numpy.arange(norb)) & 1).astype(numpy.double)
+
+def _excitation_table(link_index, norb):
+    '''Reorganize link_index (generated by cistring.gen_linkstr_index) so that
+    the strings connected by E_{pq} can be sliced for each pair pq.
+
+    Returns:
+        offsets, str0, str1, sign.  For pair pq = p*norb+q, the range
+        offsets[pq]:offsets[pq+1] holds E_{pq}|str0> = sign|str1>
+    '''
+    na, nlink = link_index.shape[:2]
+    pq = link_index[:,:,0] * norb + link_index[:,:,1]
+    str0 = numpy.repeat(numpy.arange(na, dtype=numpy.int32), nlink)
+    order = numpy.argsort(pq.ravel(), kind='mergesort')
+    pq = pq.ravel()[order]
+    offsets = numpy.searchsorted(pq, numpy.arange(norb*norb+1))
+    str1 = link_index[:,:,2].ravel()[order]
+    sign = link_index[:,:,3].ravel()[order].astype(numpy.double)
+    return offsets, str0[order], str1, sign
+
+def gen_excitation_tables(norb, nelec):
+    neleca, nelecb = _unpack_nelec(nelec)
+    taba = _excitation_table(cistring.gen_linkstr_index(range(norb), neleca),
+                             norb)
+    if neleca == nelecb:
+        tabb = taba
+    else:
+        tabb = _excitation_table(cistring.gen_linkstr_index(range(norb),
+                                                            nelecb), norb)
+    return taba, tabb
+
+def _apply_E(ci, p, q, norb, tables, out, fac=1):
+    '''out += fac * E_{pq} ci'''
+    taba, tabb = tables
+    pq = p * norb + q
+    offsets, str0, str1, sign = taba
+    i0, i1 = offsets[pq], offsets[pq+1]
+    if i1 > i0:
+        out[str1[i0:i1]] += ci[str0[i0:i1]] * (sign[i0:i1,None] * fac)
+    offsets, str0, str1, sign = tabb
+    i0, i1 = offsets[pq], offsets[pq+1]
+    if i1 > i0:
+        out[:,str1[i0:i1]] += ci[:,str0[i0:i1]] * (sign[i0:i1] * fac)
+    return out
+
+def _diag_2e(vdiag, occa, occb):
+    '''1/2 \sum_{pr} V[p,r] n_p n_r for all determinants'''
+    da = numpy.einsum('ip,pr,ir->i', occa, vdiag, occa) * .5
+    db = numpy.einsum('ip,pr,ir->i', occb, vdiag, occb) * .5
+    return (da[:,None] + db + numpy.dot(occa, numpy.dot(vdiag, occb.T))
+            * .5 + numpy.dot(occa, numpy.dot(vdiag.T, occb.T)) * .5)
+
+def _contract_offdiag(idx, val, fcivec, norb, tables):
+    ci1 = numpy.zeros_like(fcivec)
+    if len(val) == 0:
+        return ci1
+    # Group the terms by rs so that E_{rs}|c> is computed once
+    rs = idx[:,2] * norb + idx[:,3]
+    order = numpy.argsort(rs, kind='mergesort')
+    rs = rs[order]
+    idx = idx[order]
+    val = val[order]
+    bounds = numpy.append(numpy.nonzero(numpy.diff(rs))[0]+1, len(rs))
+    t = numpy.empty_like(fcivec)
+    i0 = 0
+    for i1 in bounds:
+        r, s = idx[i0,2:]
+        t[:] = 0
+        _apply_E(fcivec, r, s, norb, tables, t)
+        for k in range(i0, i1):
+            _apply_E(t, idx[k,0], idx[k,1], norb, tables, ci1, val[k]*.5)
+        i0 = i1
+    return ci1
+
+def contract_2e(eri, fcivec, norb, nelec, link_index=None):
+    r'''Contract the two-electron interaction with a FCI vector
+
+    .. math::
+
+        |c'> = 1/2 \sum_{pqrs} (pq|rs) E_{pq} E_{rs} |c>
+
+    Note unlike direct_spin1.contract_2e, the input eri is the sparse
+    interaction (see the module header) and the one-electron Hamiltonian is
+    not absorbed.  The contribution :math:`-1/2 (pr|rq) E_{pq}` is
+    included in :func:`contract_1e`.  The interaction returned by
+    :func:`absorb_h1e` includes the one-electron part.
+
+    Kwargs:
+        link_index : tuple
+            Excitation tables generated by :func:`gen_excitation_tables`
+    '''
+    neleca, nelecb = _unpack_nelec(nelec)
+    na = cistring.num_strings(norb, neleca)
+    nb = cistring.num_strings(norb, nelecb)
+    fcivec = numpy.asarray(fcivec, order='C').reshape(na,nb)
+    if isinstance(eri, tuple) and len(eri) == 3:
+        eri, f1e = eri[:2], eri[2]
+        ci1 = direct_spin1.contract_1e(f1e, fcivec, norb, nelec)
+    else:
+        ci1 = numpy.zeros_like(fcivec)
+    vdiag, idx, val = _parse_eri(eri, norb)
+    ci1 += fcivec * _diag_2e(vdiag, _occ(norb, neleca), _occ(norb, nelecb))
+    if len(val) > 0:
+        if link_index is None:
+            link_index = gen_excitation_tables(norb, nelec)
+        ci1 += _contract_offdiag(idx, val, fcivec, norb, link_index)
+    return ci1
+
+def contract_1e(h1e, eri, fcivec, norb, nelec, link_index=None):
+    '''Contract the one-electron Hamiltonian including the -1/2 (pr|rq)
+    contribution from the normal ordering of the interaction.
+    '''
+    vdiag, idx, val = _parse_eri(eri, norb)
+    f1e = _effective_h1e(h1e, vdiag, idx, val)
+    fcivec = numpy.asarray(fcivec, order='C')
+    return direct_spin1.contract_1e(f1e, fcivec, norb, nelec, link_index)
+
+def absorb_h1e(h1e, eri, norb, nelec, fac=1):
+    r'''Attach the one-electron Hamiltonian to the sparse interaction.  The
+    returned interaction (idx, val, f1e) holds the two-electron terms and
+    the effective one-electron operator :math:`f_{pq}`, which is applied
+    once by contract_2e rather than expanded into (pq|kk) terms.
+    As in direct_spin1.absorb_h1e, contract_2e of the returned interaction
+    gives 2*fac*H|c>, i.e. fac=.5 for the full Hamiltonian.
+    '''
+    vdiag, idx, val = _parse_eri(eri, norb)
+    f1e = _effective_h1e(h1e, vdiag, idx, val)
+    p, r = numpy.nonzero(vdiag)
+    idx = numpy.vstack((numpy.vstack((p,p,r,r)).T, idx)).astype(numpy.int32)
+    val = numpy.hstack((vdiag[p,r], val))
+    return idx, val * (fac*2), f1e * (fac*2)
+
+def make_hdiag(h1e, eri, norb, nelec):
+    '''Diagonal Hamiltonian for Davidson preconditioner
+    '''
+    neleca, nelecb = _unpack_nelec(nelec)
+    vdiag, idx, val = _parse_eri(eri, norb)
+    f1e = _effective_h1e(h1e, vdiag, idx, val)
+    occa = _occ(norb, neleca)
+    occb = _occ(norb, nelecb)
+    hdiag = _diag_2e(vdiag, occa, occb)
+    hdiag += numpy.dot(occa, f1e.diagonal())[:,None]
+    hdiag += numpy.dot(occb, f1e.diagonal())
+    # exchange terms (pq|qp) E_{pq} E_{qp} = n_{p,s} (1-n_{q,s}) on diagonal
+    mask = ((idx[:,0] == idx[:,3]) & (idx[:,1] == idx[:,2]) &
+            (idx[:,0] != idx[:,1]))
+    if mask.any():
+        k = numpy.zeros((norb,norb))
+        numpy.add.at(k, (idx[mask,0],idx[mask,1]), val[mask] * .5)
+        hdiag += numpy.einsum('ip,pq,iq->i', occa, k, 1-occa)[:,None]
+        hdiag += numpy.einsum('ip,pq,iq->i', occb, k, 1-occb)
+    return hdiag.ravel()
+
+def energy(h1e, eri, fcivec, norb, nelec, link_index=None):
+    '''Compute the FCI electronic energy for given model Hamiltonian and FCI
+    vector.
+    '''
+    ci1 = (contract_1e(h1e, eri, fcivec, norb, nelec) +
+           contract_2e(eri, fcivec, norb, nelec, link_index))
+    return numpy.dot(fcivec.reshape(-1), ci1.reshape(-1))
+
+def get_init_guess(norb, nelec, nroots, hdiag):
+    '''The lowest diagonal elements of model Hamiltonians are usually highly
+    degenerate, e.g. all determinants without double occupancy of the
+    half-filled Hubbard model have zero diagonal.  A single determinant guess
+    can be an exact zero of the energy which stalls the Davidson iteration.
+    Small (reproducible) noise is added to break the degeneracy.
+    '''
+    ci0 = direct_spin1.get_init_guess(norb, nelec, nroots, hdiag)
+    rand = numpy.random.RandomState(1)
+    for x in ci0:
+        x += rand.random_sample(x.size) * 1e-5
+        x *= 1./numpy.linalg.norm(x)
+    return ci0
+
+def kernel(h1e, eri, norb, nelec, ci0=None, level_shift=1e-3, tol=1e-10,
+           lindep=1e-14, max_cycle=50, nroots=1, **kwargs):
+    cis = FCISolver(None)
+    cis.level_shift = level_shift
+    cis.conv_tol = tol
+    cis.lindep = lindep
+    cis.max_cycle = max_cycle
+    cis.nroots = nroots
+    for k, v in kwargs.items():
+        setattr(cis, k, v)
+    return kernel_ms1(cis, h1e, eri, norb, nelec, ci0=ci0)
+
+def kernel_ms1(fci, h1e, eri, norb, nelec, ci0=None, **kwargs):
+    neleca, nelecb = _unpack_nelec(nelec)
+    nelec = (neleca, nelecb)
+    na = cistring.num_strings(norb, neleca)
+    nb = cistring.num_strings(norb, nelecb)
+    log = logger.Logger(fci.stdout, fci.verbose)
+
+    vdiag, idx, val = _parse_eri(eri, norb)
+    f1e = _effective_h1e(h1e, vdiag, idx, val)
+    link_indexa = cistring.gen_linkstr_index_trilidx(range(norb), neleca)
+    link_indexb = cistring.gen_linkstr_index_trilidx(range(norb), nelecb)
+    dd = _diag_2e(vdiag, _occ(norb, neleca), _occ(norb, nelecb))
+    if len(val) > 0:
+        tables = gen_excitation_tables(norb, nelec)
+    log.debug('%d nonzero off-diagonal (pq|rs) terms', len(val))
+
+    hdiag = fci.make_hdiag(h1e, eri, norb, nelec)
+    precond = fci.make_precond(hdiag)
+
+    def hop(c):
+        c = c.reshape(na,nb)
+        hc = direct_spin1.contract_1e(f1e, c, norb, nelec,
+                                      (link_indexa,link_indexb))
+        hc += c * dd
+        if len(val) > 0:
+            hc += _contract_offdiag(idx, val, c, norb, tables)
+        return hc.ravel()
+
+    if ci0 is None:
+        ci0 = fci.get_init_guess(norb, nelec, fci.nroots, hdiag)
+    elif isinstance(ci0, numpy.ndarray) and ci0.size == na*nb:
+        ci0 = [ci0.ravel()]
+    else:
+        ci0 = [x.ravel() for x in ci0]
+
+    e, c = fci.eig(hop, ci0, precond, **kwargs)
+    if fci.nroots > 1:
+        return e, [ci.reshape(na,nb) for ci in c]
+    else:
+        return e, c.reshape(na,nb)
+
+
+class FCISolver(direct_spin1.FCISolver):
+    '''FCI solver for model Hamiltonians with sparse two-electron
+    interaction.  The argument eri of kernel, energy, contract_2e etc. is
+    one of the sparse forms described in the module header.
+
+    Examples:
+
+    >>> h1e = direct_sparse.hubbard_h1e(12, t=1.)
+    >>> e, c = direct_sparse.FCISolver().kernel(h1e, 4., 12, (6,6))
+    '''
+    def __init__(self, mol=None):
+        direct_spin1.FCISolver.__init__(self, mol)
+        # direct_spin1.make_pspace_precond requires dense integrals
+        self.pspace_size = 0
+
+    def dump_flags(self, verbose=None):
+        direct_spin1.FCISolver.dump_flags(self, verbose)
+
+    def absorb_h1e(self, h1e, eri, norb, nelec, fac=1):
+        return absorb_h1e(h1e, eri, norb, nelec, fac)
+
+    def make_hdiag(self, h1e, eri, norb, nelec):
+        return make_hdiag(h1e, eri, norb, nelec)
+
+    def get_init_guess(self, norb, nelec, nroots, hdiag):
+        return get_init_guess(norb, nelec, nroots, hdiag)
+
+    def make_precond(self, hdiag, *args):
+        return direct_spin1.make_diag_precond(hdiag, None, None, None,
+                                              self.level_shift)
+
+    def contract_2e(self, eri, fcivec, norb, nelec, link_index=None,
+                    **kwargs):
+        return contract_2e(eri, fcivec, norb, nelec, link_index)
+
+    def kernel(self, h1e, eri, norb, nelec, ci0=None, **kwargs):
+        if self.verbose > logger.QUIET:
+            pyscf.gto.mole.check_sanity(self, self._keys, self.stdout)
+        return kernel_ms1(self, h1e, eri, norb, nelec, ci0, **kwargs)
+
+    def energy(self, h1e, eri, fcivec, norb, nelec, link_index=None):
+        return energy(h1e, eri, fcivec, norb, nelec, link_index)
+
+
+if __name__ == '__main__':
+    import time
+    nsite = 12
+    h1e = hubbard_h1e(nsite)
+    t0 = time.time()
+    e, c = kernel(h1e, 4., nsite, (6,6), verbose=0)
+    print('Hubbard U/t=4 12-site ring E = %.12f  time %.2fs' %
+          (e, time.time()-t0))
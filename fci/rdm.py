@@ -207,6 +207,103 @@ def _complete_dm3_(dm2, dm3):
                 tmp = transpose01(tmp, k, i, j)
     return dm3
 
+def _t1ket_sf(civec, norb, p, link_index):
+    '''t1[q] = E^q_p|civec> for all q'''
+    link_indexa, link_indexb = link_index
+    na, nb = civec.shape
+    t1 = numpy.zeros((norb,na,nb))
+    str0, k = numpy.nonzero(link_indexa[:,:,1] == p)
+    a, str1, sign = link_indexa[str0,k,0], link_indexa[str0,k,2], link_indexa[str0,k,3]
+    t1[a,str1] += civec[str0] * sign.reshape(-1,1)
+    str0, k = numpy.nonzero(link_indexb[:,:,1] == p)
+    a, str1, sign = link_indexb[str0,k,0], link_indexb[str0,k,2], link_indexb[str0,k,3]
+    t1[a,:,str1] += civec[:,str0].T * sign.reshape(-1,1)
+    return t1
+
+def make_dm3_slices(civec, norb, nelec, link_index=None, p0=0, p1=None):
+    r'''Generator of the spin-traced 3-pdm, one slice of the first index at a
+    time.  The full 3-pdm is never held in memory.  Only the slices p0:p1 are
+    generated if p0, p1 are given.
+
+    Each slice is computed as the transition 2-pdm between :math:`E^q_p|c>`
+    and :math:`|c>`, since :math:`dm3[p,q] = <c|E^p_q E^r_s E^t_u|c>`.
+
+    Yields:
+        p, dm3[p] in the storage of :func:`make_dm123`, a (norb,)*5 array
+    '''
+    if isinstance(nelec, (int, numpy.integer)):
+        neleca = nelecb = nelec//2
+    else:
+        neleca, nelecb = nelec
+    if link_index is None:
+        link_indexa = cistring.gen_linkstr_index(range(norb), neleca)
+        link_indexb = cistring.gen_linkstr_index(range(norb), nelecb)
+        link_index = (link_indexa, link_indexb)
+    na = link_index[0].shape[0]
+    nb = link_index[1].shape[0]
+    civec = numpy.asarray(civec, order='C').reshape(na,nb)
+    if p1 is None:
+        p1 = norb
+    for p in range(p0, p1):
+        t1 = _t1ket_sf(civec, norb, p, link_index)
+        dm3p = numpy.empty((norb,)*5)
+        for q in range(norb):
+            dm3p[q] = make_rdm12_spin1('FCItdm12kern_sf', t1[q], civec,
+                                       norb, nelec, link_index, 2)[1]
+        yield p, dm3p
+
+def make_rdm12_sa(civecs, weights, norb, nelec, link_index=None):
+    r'''Weighted average of the spin-traced 1- and 2-pdm of several states.
+
+    The states are stacked along the beta strings into one CI vector of
+    shape (na, nb*nstates), with a block-diagonal beta link table.  Beta
+    excitations never couple two blocks and alpha excitations keep the beta
+    index, so one call of the RDM driver on the stacked vector gives the
+    sum over states, with larger matrix multiplications than one call per
+    state.
+
+    Returns:
+        dm1, dm2 in the storage of :func:`make_rdm12_spin1`, i.e. dm2 is
+        :math:`<p^+ q r^+ s>`.  Call :func:`reorder_rdm` to get the regular
+        2-pdm.
+    '''
+    civec, link_index = _stack_states(civecs, weights, norb, nelec, link_index)
+    return make_rdm12_spin1('FCIrdm12kern_sf', civec, civec, norb, nelec,
+                            link_index, 1)
+
+def make_rdm1_sa(civecs, weights, norb, nelec, link_index=None):
+    '''Weighted average of the spin-traced 1-pdm of several states.  See
+    :func:`make_rdm12_sa`.
+    '''
+    civec, link_index = _stack_states(civecs, weights, norb, nelec, link_index)
+    return (make_rdm1_spin1('FCImake_rdm1a', civec, civec, norb, nelec, link_index)
+          + make_rdm1_spin1('FCImake_rdm1b', civec, civec, norb, nelec, link_index))
+
+def _stack_states(civecs, weights, norb, nelec, link_index=None):
+    assert(all([w >= 0 for w in weights]))
+    if isinstance(nelec, (int, numpy.integer)):
+        neleca = nelecb = nelec//2
+    else:
+        neleca, nelecb = nelec
+    if link_index is None:
+        link_indexa = cistring.gen_linkstr_index(range(norb), neleca)
+        link_indexb = cistring.gen_linkstr_index(range(norb), nelecb)
+    else:
+        link_indexa, link_indexb = link_index
+    na = link_indexa.shape[0]
+    nb = link_indexb.shape[0]
+    nroots = len(weights)
+# civec is scaled by sqrt(weight) so that the bra-ket products carry the
+# weights
+    civec = numpy.empty((na,nroots,nb))
+    for i, w in enumerate(weights):
+        civec[:,i] = numpy.asarray(civecs[i]).reshape(na,nb) * numpy.sqrt(w)
+    civec = civec.reshape(na,nroots*nb)
+    link_indexb = numpy.vstack([link_indexb]*nroots)
+    for i in range(1, nroots):
+        link_indexb[i*nb:(i+1)*nb,:,2] += i * nb
+    return civec, (link_indexa, link_indexb)
+
 def make_dm1234(fname, cibra, ciket, norb, nelec):
     r'''Spin traced 1, 2, 3 and 4-particle density matrices.
 
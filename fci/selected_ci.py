@@ -0,0 +1,1095 @@
+#!/usr/bin/env python
+#
+# Heat-bath selected configuration interaction (SHCI) for arbitary number of
+# alpha and beta electrons.  The variational space is grown by the heat-bath
+# criterion |H_{ai} c_i| > select_cutoff, the Hamiltonian is diagonalized in
+# the selected space as a sparse matrix, and the remaining correlation is
+# estimated by Epstein-Nesbet second order perturbation theory.
+#
+# Determinants are stored as pairs of 64-bit strings (alpha, beta) with the
+# same bit convention as cistring, so the number of orbitals is limited to 64.
+#
+# ref. JCTC, 12, 3674 (2016); JCTC, 13, 1595 (2017)
+#
+
+import sys
+import time
+import numpy
+import scipy.linalg
+import scipy.sparse
+import pyscf.lib
+import pyscf.lib.logger as logger
+import pyscf.gto
+import pyscf.ao2mo
+from pyscf.fci import direct_spin1
+
+_DET_DTYPE = numpy.dtype([('a', numpy.uint64), ('b', numpy.uint64)])
+_ONE = numpy.uint64(1)
+
+class SCIvector(numpy.ndarray):
+    '''CI coefficients on the determinants stored in the attribute ``_dets``,
+    which is a (ndet,2) uint64 array of (alpha, beta) strings.
+    '''
+    def __array_finalize__(self, obj):
+        self._dets = getattr(obj, '_dets', None)
+
+def as_SCIvector(civec, dets):
+    civec = numpy.asarray(civec).view(SCIvector)
+    civec._dets = dets
+    return civec
+
+def _unpack_nelec(nelec):
+    if isinstance(nelec, (int, numpy.integer)):
+        nelecb = nelec//2
+        neleca = nelec - nelecb
+    else:
+        neleca, nelecb = nelec
+    return neleca, nelecb
+
+def popcount(strs):
+    '''Number of 1-bits of each element of the uint64 array'''
+    x = numpy.asarray(strs, dtype=numpy.uint64)
+    x = x - ((x >> numpy.uint64(1)) & numpy.uint64(0x5555555555555555))
+    x = ((x & numpy.uint64(0x3333333333333333)) +
+         ((x >> numpy.uint64(2)) & numpy.uint64(0x3333333333333333)))
+    x = (x + (x >> numpy.uint64(4))) & numpy.uint64(0x0f0f0f0f0f0f0f0f)
+    x = (x * numpy.uint64(0x0101010101010101)) >> numpy.uint64(56)
+    return x.astype(numpy.int64)
+
+def _bit(orb):
+    return numpy.left_shift(_ONE, numpy.asarray(orb, dtype=numpy.uint64))
+
+def _lowbit(strs):
+    return strs & (~strs + _ONE)
+
+def _bit_index(onebit):
+    '''Orbital index of the strings which have only one bit set'''
+    return popcount(onebit - _ONE)
+
+def _str2occ(strs, norb):
+    '''Occupation numbers (0 or 1) of the strings, in a (nstr,norb) array'''
+    strs = numpy.asarray(strs, dtype=numpy.uint64)
+    occ = (strs[:,None] >> numpy.arange(norb, dtype=numpy.uint64)) & _ONE
+    return occ.astype(numpy.double)
+
+def _str2occlst(strs, norb, nelec):
+    '''Occupied orbitals of the strings, in a (nstr,nelec) array'''
+    occ = _str2occ(strs, norb)
+    return numpy.nonzero(occ)[1].reshape(-1,nelec)
+
+def _parity_des(strs, orb):
+    '''Sign of the annihilation operator a_orb on the strings'''
+    mask = _bit(orb) - _ONE
+    return 1 - 2 * (popcount(strs & mask) & 1)
+
+def _parity_single(strs, i, a):
+    '''Sign of the excitation a^+ i on the strings'''
+    i = numpy.asarray(i, dtype=numpy.int64)
+    a = numpy.asarray(a, dtype=numpy.int64)
+    lo = numpy.minimum(i, a)
+    hi = numpy.maximum(i, a)
+    mask = (_bit(hi) - _ONE) ^ (_bit(lo+1) - _ONE)
+    return 1 - 2 * (popcount(strs & mask) & 1)
+
+def _as_keys(dets):
+    return numpy.ascontiguousarray(dets, dtype=numpy.uint64).view(_DET_DTYPE).ravel()
+
+def _unique_dets(dets):
+    '''Sorted unique determinants and the map from input to the unique list'''
+    dets = numpy.asarray(dets, dtype=numpy.uint64).reshape(-1,2)
+    order = numpy.lexsort((dets[:,1], dets[:,0]))
+    sdets = dets[order]
+    mask = numpy.ones(len(dets), dtype=bool)
+    mask[1:] = (sdets[1:,0] != sdets[:-1,0]) | (sdets[1:,1] != sdets[:-1,1])
+    inverse = numpy.empty(len(dets), dtype=numpy.int64)
+    inverse[order] = numpy.cumsum(mask) - 1
+    return sdets[mask], inverse
+
+def _search_dets(sorted_dets, dets):
+    '''Address of dets in sorted_dets.  -1 for the dets not found'''
+    ref = _as_keys(sorted_dets)
+    keys = _as_keys(dets)
+    if ref.size == 0:
+        return -numpy.ones(keys.size, dtype=numpy.int64)
+    idx = numpy.searchsorted(ref, keys)
+    idx[idx >= ref.size] = 0
+    found = ref[idx] == keys
+    idx[~found] = -1
+    return idx
+
+
+def make_hdiag(h1e, eri, dets, norb, nelec=None):
+    '''Diagonal Hamiltonian for the determinants'''
+    eri = pyscf.ao2mo.restore(1, eri, norb)
+    jdiag = numpy.einsum('iijj->ij', eri)
+    kdiag = numpy.einsum('ijji->ij', eri)
+    hdiag = numpy.empty(len(dets))
+    blksize = max(1, int(2e7/norb))
+    for p0 in range(0, len(dets), blksize):
+        p1 = min(len(dets), p0+blksize)
+        occa = _str2occ(dets[p0:p1,0], norb)
+        occb = _str2occ(dets[p0:p1,1], norb)
+        occ = occa + occb
+        hdiag[p0:p1] =(numpy.dot(occ, h1e.diagonal())
+                     + numpy.einsum('ni,ni->n', numpy.dot(occ, jdiag), occ) * .5
+                     - numpy.einsum('ni,ni->n', numpy.dot(occa, kdiag), occa) * .5
+                     - numpy.einsum('ni,ni->n', numpy.dot(occb, kdiag), occb) * .5)
+    return hdiag
+
+def _single_excitation(h1e, vj, vk, str_s, str_o, i, a, norb):
+    '''Matrix elements <ket'|H|ket> for the excitation i->a on the strings
+    str_s.  str_o are the strings of the other spin'''
+    occs = _str2occ(str_s, norb)
+    occo = _str2occ(str_o, norb)
+    v = (h1e[a,i] + (vj[a,i] * (occs+occo)).sum(axis=1)
+         - (vk[a,i] * occs).sum(axis=1))
+    return v * _parity_single(str_s, i, a)
+
+def _same_spin_double(eri, strs, i, j, a, b):
+    '''Matrix elements of the excitation i->a, j->b for the same spin'''
+    sign = _parity_single(strs, i, a)
+    strs = strs ^ _bit(i) | _bit(a)
+    sign *= _parity_single(strs, j, b)
+    return sign * (eri[a,i,b,j] - eri[a,j,b,i])
+
+def _offdiag_elements(h1e, eri, vjk, dets, bra, ket, norb):
+    '''Off-diagonal Hamiltonian matrix elements <bra|H|ket> between
+    determinants which differ by single or double excitations.
+    '''
+    vj, vk = vjk
+    stra, strb = dets[ket,0], dets[ket,1]
+    diffa = dets[bra,0] ^ stra
+    diffb = dets[bra,1] ^ strb
+    nexa = popcount(diffa) // 2
+    nexb = popcount(diffb) // 2
+    hbra = numpy.zeros(len(bra))
+
+    for nexs, nexo, diffs, stri, stro in ((nexa, nexb, diffa, stra, strb),
+                                          (nexb, nexa, diffb, strb, stra)):
+        # singles
+        idx = numpy.where((nexs == 1) & (nexo == 0))[0]
+        if idx.size > 0:
+            holes = diffs[idx] & stri[idx]
+            parts = diffs[idx] ^ holes
+            i = _bit_index(holes)
+            a = _bit_index(parts)
+            hbra[idx] = _single_excitation(h1e, vj, vk, stri[idx], stro[idx],
+                                           i, a, norb)
+        # same-spin doubles
+        idx = numpy.where((nexs == 2) & (nexo == 0))[0]
+        if idx.size > 0:
+            holes = diffs[idx] & stri[idx]
+            parts = diffs[idx] ^ holes
+            hi = _lowbit(holes)
+            pa = _lowbit(parts)
+            i = _bit_index(hi)
+            j = _bit_index(holes ^ hi)
+            a = _bit_index(pa)
+            b = _bit_index(parts ^ pa)
+            hbra[idx] = _same_spin_double(eri, stri[idx], i, j, a, b)
+
+    # opposite-spin doubles
+    idx = numpy.where((nexa == 1) & (nexb == 1))[0]
+    if idx.size > 0:
+        holea = diffa[idx] & stra[idx]
+        holeb = diffb[idx] & strb[idx]
+        i = _bit_index(holea)
+        a = _bit_index(diffa[idx] ^ holea)
+        j = _bit_index(holeb)
+        b = _bit_index(diffb[idx] ^ holeb)
+        sign = (_parity_single(stra[idx], i, a) *
+                _parity_single(strb[idx], j, b))
+        hbra[idx] = sign * eri[a,i,b,j]
+    return hbra
+
+def _hole_keys(dets, norb, neleca, nelecb, p0=0):
+    '''(N-2)-electron strings generated by removing two electrons from each
+    determinant.  Two determinants are connected by the Hamiltonian if and
+    only if they share at least one key.  The addresses of the determinants
+    start from p0.
+    '''
+    stra = dets[:,0]
+    strb = dets[:,1]
+    keys = []
+    if neleca > 0:
+        bita = _bit(_str2occlst(stra, norb, neleca))
+    if nelecb > 0:
+        bitb = _bit(_str2occlst(strb, norb, nelecb))
+    if neleca > 1:
+        ii, jj = numpy.triu_indices(neleca, 1)
+        ka = stra[:,None] ^ bita[:,ii] ^ bita[:,jj]
+        keys.append((ka, numpy.repeat(strb[:,None], len(ii), axis=1)))
+    if nelecb > 1:
+        ii, jj = numpy.triu_indices(nelecb, 1)
+        kb = strb[:,None] ^ bitb[:,ii] ^ bitb[:,jj]
+        keys.append((numpy.repeat(stra[:,None], len(ii), axis=1), kb))
+    if neleca > 0 and nelecb > 0:
+        ka = (stra[:,None] ^ bita).repeat(nelecb, axis=1)
+        kb = numpy.tile(strb[:,None] ^ bitb, (1,neleca))
+        keys.append((ka, kb))
+    ka = numpy.hstack([k[0] for k in keys])
+    kb = numpy.hstack([k[1] for k in keys])
+    addr = numpy.repeat(numpy.arange(p0, p0+len(dets)), ka.shape[1])
+    return ka.ravel(), kb.ravel(), addr
+
+def _connected_pairs(dets, norb, nelec, max_memory=2000):
+    '''Pairs (bra > ket) of the determinants which are coupled by single or
+    double excitations'''
+    neleca, nelecb = _unpack_nelec(nelec)
+    ndet = len(dets)
+    nelec_tot = neleca + nelecb
+    if ndet < 2 or nelec_tot < 1:
+        return numpy.zeros(0, dtype=numpy.int64), numpy.zeros(0, dtype=numpy.int64)
+    if nelec_tot == 1:
+        # one electron, all determinants are coupled by single excitations
+        bra, ket = numpy.tril_indices(ndet, -1)
+        return bra, ket
+
+# The keys of the same group must be handled in one batch.  Partition the
+# keys by a hash value to bound the memory footprint.  Half of max_memory
+# holds the keys of one batch, which are generated for chunks of detblk
+# determinants.
+    nkey = nelec_tot * (nelec_tot-1) // 2
+    nbatch = int(ndet * nkey * 48 / (max_memory*.5e6)) + 1
+    detblk = max(1, int(max_memory*.25e6 / (nkey*48)))
+    pairs = []
+    for ibatch in range(nbatch):
+        kas = []
+        kbs = []
+        addrs = []
+        for p0 in range(0, ndet, detblk):
+            p1 = min(ndet, p0+detblk)
+            ka, kb, addr = _hole_keys(dets[p0:p1], norb, neleca, nelecb, p0)
+            if nbatch > 1:
+                mask = ((ka ^ (kb * numpy.uint64(2654435761))) %
+                        numpy.uint64(nbatch)) == numpy.uint64(ibatch)
+                ka = ka[mask]
+                kb = kb[mask]
+                addr = addr[mask]
+            kas.append(ka)
+            kbs.append(kb)
+            addrs.append(addr)
+        ka = numpy.hstack(kas)
+        kb = numpy.hstack(kbs)
+        addr = numpy.hstack(addrs)
+        kas = kbs = addrs = None
+        order = numpy.lexsort((kb, ka))
+        ka = ka[order]
+        kb = kb[order]
+        addr = addr[order]
+        newgroup = numpy.ones(ka.size, dtype=bool)
+        newgroup[1:] = (ka[1:] != ka[:-1]) | (kb[1:] != kb[:-1])
+        starts = numpy.where(newgroup)[0]
+        sizes = numpy.diff(numpy.append(starts, ka.size))
+        for g in numpy.unique(sizes[sizes > 1]):
+            g0 = starts[sizes == g]
+            ii, jj = numpy.triu_indices(g, 1)
+            p = addr[g0[:,None]+ii].ravel()
+            q = addr[g0[:,None]+jj].ravel()
+            pairs.append(numpy.maximum(p,q) * ndet + numpy.minimum(p,q))
+        ka = kb = addr = None
+    if pairs:
+        pairs = numpy.unique(numpy.hstack(pairs))
+    else:
+        pairs = numpy.zeros(0, dtype=numpy.int64)
+    return pairs // ndet, pairs % ndet
+
+def make_hamiltonian(h1e, eri, dets, norb, nelec, hdiag=None,
+                     max_memory=2000):
+    '''Hamiltonian of the selected determinants as a scipy.sparse.csr_matrix
+    '''
+    eri = pyscf.ao2mo.restore(1, eri, norb)
+    if hdiag is None:
+        hdiag = make_hdiag(h1e, eri, dets, norb, nelec)
+    vjk = (numpy.einsum('aikk->aik', eri), numpy.einsum('akki->aik', eri))
+    bra, ket = _connected_pairs(dets, norb, nelec, max_memory)
+    hval = numpy.empty(bra.size)
+    blksize = max(1, int(max_memory*1e6/8/(norb*6+20)))
+    for p0 in range(0, bra.size, blksize):
+        p1 = min(bra.size, p0+blksize)
+        hval[p0:p1] = _offdiag_elements(h1e, eri, vjk, dets,
+                                        bra[p0:p1], ket[p0:p1], norb)
+    mask = abs(hval) > 1e-14
+    bra = bra[mask]
+    ket = ket[mask]
+    hval = hval[mask]
+    ndet = len(dets)
+    diag = numpy.arange(ndet)
+    h = scipy.sparse.coo_matrix((numpy.hstack((hval, hval, hdiag)),
+                                 (numpy.hstack((bra, ket, diag)),
+                                  numpy.hstack((ket, bra, diag)))),
+                                shape=(ndet,ndet))
+    return h.tocsr()
+
+
+###############################################################
+# Heat-bath selection
+###############################################################
+
+def _heat_bath_tables(eri, norb):
+    '''Double excitation integrals sorted by magnitude.  For each pair of
+    occupied orbitals, the excitations (i->a, j->b) are ordered so that the
+    heat-bath screening only needs to scan the leading part of each row.
+    '''
+    # same spin, i < j -> a < b
+    ii, jj = numpy.triu_indices(norb, 1)
+    aa, bb = ii, jj
+    v = (eri[aa[None,:],ii[:,None],bb[None,:],jj[:,None]] -
+         eri[aa[None,:],jj[:,None],bb[None,:],ii[:,None]])
+    redundant = ((aa[None,:] == ii[:,None]) | (aa[None,:] == jj[:,None]) |
+                 (bb[None,:] == ii[:,None]) | (bb[None,:] == jj[:,None]))
+    v[redundant] = 0
+    order = numpy.argsort(-abs(v), axis=1)
+    rows = numpy.arange(len(ii))[:,None]
+    same = (ii, jj, abs(v[rows,order]), aa[order], bb[order], v[rows,order])
+
+    # opposite spin, i(alpha) -> a(alpha), j(beta) -> b(beta)
+    ii, jj = numpy.indices((norb,norb)).reshape(2,-1)
+    aa, bb = ii, jj
+    v = eri[aa[None,:],ii[:,None],bb[None,:],jj[:,None]].copy()
+    redundant = (aa[None,:] == ii[:,None]) | (bb[None,:] == jj[:,None])
+    v[redundant] = 0
+    order = numpy.argsort(-abs(v), axis=1)
+    rows = numpy.arange(len(ii))[:,None]
+    oppo = (ii, jj, abs(v[rows,order]), aa[order], bb[order], v[rows,order])
+    return same, oppo
+
+def _expand(sel, counts):
+    '''For each selected item, generate the offsets 0..counts-1'''
+    total = counts.sum()
+    owner = numpy.repeat(sel, counts)
+    offsets = numpy.arange(total) - numpy.repeat(numpy.cumsum(counts)-counts, counts)
+    return owner, offsets
+
+def _excitations(h1e, eri, vjk, tables, dets, civec, norb, nelec, cutoff,
+                 nbatch=1, ibatch=0):
+    '''Determinants connected to the given determinants with the heat-bath
+    criterion |H_{ai} c_i| > cutoff.
+
+    Returns:
+        new_dets : (n,2) array of the connected determinants (may be
+        duplicated).  hc : (n,nroots) array of the contributions H_{ai} c_i.
+    '''
+    neleca, nelecb = _unpack_nelec(nelec)
+    civec = numpy.asarray(civec).reshape(-1,len(dets))
+    cmax = abs(civec).max(axis=0)
+    vj, vk = vjk
+    same, oppo = tables
+    stra = dets[:,0]
+    strb = dets[:,1]
+    outa = []
+    outb = []
+    outh = []
+
+    def collect(new_a, new_b, owner, hval):
+        if nbatch > 1:
+            mask = ((new_a ^ (new_b * numpy.uint64(2654435761))) %
+                    numpy.uint64(nbatch)) == numpy.uint64(ibatch)
+            new_a = new_a[mask]
+            new_b = new_b[mask]
+            owner = owner[mask]
+            hval = hval[mask]
+        outa.append(new_a)
+        outb.append(new_b)
+        outh.append(hval[:,None] * civec[:,owner].T)
+
+    # singles
+    occ_bound = (abs(vj) + abs(vk)).sum(axis=2)
+    for i in range(norb):
+        for a in range(norb):
+            if a == i:
+                continue
+            bound = abs(h1e[a,i]) + occ_bound[a,i]
+            for s, (strs, stro) in enumerate(((stra, strb), (strb, stra))):
+                if (neleca, nelecb)[s] == 0:
+                    continue
+                sel = numpy.where((cmax*bound > cutoff) &
+                                  (strs & _bit(i) != 0) &
+                                  (strs & _bit(a) == 0))[0]
+                if sel.size == 0:
+                    continue
+                hval = _single_excitation(h1e, vj, vk, strs[sel], stro[sel],
+                                          i, a, norb)
+                keep = abs(hval) * cmax[sel] > cutoff
+                sel = sel[keep]
+                new = strs[sel] ^ _bit(i) | _bit(a)
+                if s == 0:
+                    collect(new, strb[sel], sel, hval[keep])
+                else:
+                    collect(stra[sel], new, sel, hval[keep])
+
+    # same-spin doubles
+    ii, jj, absv, aa, bb, vv = same
+    for k in range(len(ii)):
+        i, j = ii[k], jj[k]
+        if absv[k,0] == 0:
+            continue
+        for s, strs in enumerate((stra, strb)):
+            if (neleca, nelecb)[s] < 2:
+                continue
+            sel = numpy.where((strs & _bit(i) != 0) & (strs & _bit(j) != 0) &
+                              (cmax*absv[k,0] > cutoff))[0]
+            if sel.size == 0:
+                continue
+            counts = numpy.searchsorted(-absv[k], -cutoff/cmax[sel])
+            owner, offs = _expand(sel, counts)
+            a = aa[k,offs]
+            b = bb[k,offs]
+            ostr = strs[owner]
+            keep = (ostr & _bit(a) == 0) & (ostr & _bit(b) == 0)
+            owner = owner[keep]
+            a = a[keep]
+            b = b[keep]
+            ostr = ostr[keep]
+            sign = _parity_single(ostr, i, a)
+            new = ostr ^ _bit(i) | _bit(a)
+            sign *= _parity_single(new, j, b)
+            new = new ^ _bit(j) | _bit(b)
+            hval = sign * vv[k,offs[keep]]
+            if s == 0:
+                collect(new, strb[owner], owner, hval)
+            else:
+                collect(stra[owner], new, owner, hval)
+
+    # opposite-spin doubles
+    if neleca > 0 and nelecb > 0:
+        ii, jj, absv, aa, bb, vv = oppo
+        for k in range(len(ii)):
+            i, j = ii[k], jj[k]
+            if absv[k,0] == 0:
+                continue
+            sel = numpy.where((stra & _bit(i) != 0) & (strb & _bit(j) != 0) &
+                              (cmax*absv[k,0] > cutoff))[0]
+            if sel.size == 0:
+                continue
+            counts = numpy.searchsorted(-absv[k], -cutoff/cmax[sel])
+            owner, offs = _expand(sel, counts)
+            a = aa[k,offs]
+            b = bb[k,offs]
+            sa = stra[owner]
+            sb = strb[owner]
+            keep = (sa & _bit(a) == 0) & (sb & _bit(b) == 0)
+            owner = owner[keep]
+            a = a[keep]
+            b = b[keep]
+            sa = sa[keep]
+            sb = sb[keep]
+            sign = _parity_single(sa, i, a) * _parity_single(sb, j, b)
+            hval = sign * vv[k,offs[keep]]
+            collect(sa ^ _bit(i) | _bit(a), sb ^ _bit(j) | _bit(b), owner, hval)
+
+    nroots = civec.shape[0]
+    if outa:
+        new_dets = numpy.vstack((numpy.hstack(outa), numpy.hstack(outb))).T
+        hc = numpy.vstack(outh)
+    else:
+        new_dets = numpy.zeros((0,2), dtype=numpy.uint64)
+        hc = numpy.zeros((0,nroots))
+    return numpy.ascontiguousarray(new_dets), hc
+
+def select_dets(h1e, eri, dets, civec, norb, nelec, cutoff, tables=None):
+    '''New determinants (not in dets) selected by the heat-bath criterion'''
+    eri = pyscf.ao2mo.restore(1, eri, norb)
+    if tables is None:
+        tables = _heat_bath_tables(eri, norb)
+    vjk = (numpy.einsum('aikk->aik', eri), numpy.einsum('akki->aik', eri))
+    new_dets = _excitations(h1e, eri, vjk, tables, dets, civec, norb, nelec,
+                            cutoff)[0]
+    if len(new_dets) == 0:
+        return new_dets
+    new_dets = _unique_dets(new_dets)[0]
+    return new_dets[_search_dets(_sort_dets(dets)[0], new_dets) < 0]
+
+def enpt2(h1e, eri, civec, norb, nelec, e_var, cutoff=1e-8, max_memory=2000,
+          tables=None, verbose=logger.NOTE):
+    '''Epstein-Nesbet second order correction to the variational energy
+
+    .. math::
+
+        E^{(2)} = \sum_a \frac{(\sum_i^{|H_{ai} c_i| > \epsilon_2} H_{ai} c_i)^2}
+                              {E_{var} - H_{aa}}
+
+    Args:
+        civec : SCIvector or a list of SCIvector
+            Variational wavefunction(s) on the same determinants.
+        e_var : float or a list of floats
+            Variational energy of each state.
+
+    Returns:
+        The second order energy correction of each state.
+    '''
+    if isinstance(verbose, logger.Logger):
+        log = verbose
+    else:
+        log = logger.Logger(sys.stdout, verbose)
+    if isinstance(civec, SCIvector):
+        dets = civec._dets
+    else:
+        dets = civec[0]._dets
+    e_var = numpy.asarray(e_var).ravel()
+    civec = numpy.asarray(civec).reshape(-1,len(dets))
+    nroots = civec.shape[0]
+    eri = pyscf.ao2mo.restore(1, eri, norb)
+    if tables is None:
+        tables = _heat_bath_tables(eri, norb)
+    vjk = (numpy.einsum('aikk->aik', eri), numpy.einsum('akki->aik', eri))
+    sorted_dets = _sort_dets(dets)[0]
+
+# The contributions to the same external determinant must be summed before
+# squaring.  The external space is partitioned by a hash value, so that only
+# one part of the external determinants is held in memory.  The excitations
+# are generated for chunks of the variational determinants.  The first pass
+# determines the chunks and the size of the external space.
+    ndet = len(dets)
+    budget = max(1, max_memory * .25e6)
+    def excitations(p0, p1, nbatch=1, ibatch=0):
+        return _excitations(h1e, eri, vjk, tables, dets[p0:p1], civec[:,p0:p1],
+                            norb, nelec, cutoff, nbatch, ibatch)
+    def e2_of(parts):
+        if not parts:
+            return numpy.zeros(nroots)
+        ext = numpy.vstack([x[0] for x in parts])
+        hc = numpy.vstack([x[1] for x in parts])
+        e2 = numpy.zeros(nroots)
+        if len(ext) > 0:
+            ext, inverse = _unique_dets(ext)
+            num = numpy.zeros((len(ext),nroots))
+            for k in range(nroots):
+                num[:,k] = numpy.bincount(inverse, weights=hc[:,k],
+                                          minlength=len(ext))
+            mask = _search_dets(sorted_dets, ext) < 0
+            ext = ext[mask]
+            num = num[mask]
+            hdiag = make_hdiag(h1e, eri, ext, norb, nelec)
+            for k in range(nroots):
+                e2[k] = (num[:,k]**2 / (e_var[k] - hdiag)).sum()
+        return e2
+
+    neleca, nelecb = _unpack_nelec(nelec)
+    nvira = norb - neleca
+    nvirb = norb - nelecb
+    nexc = (neleca*nvira + nelecb*nvirb + neleca*nvira*nelecb*nvirb +
+            neleca*(neleca-1)*nvira*(nvira-1)//4 +
+            nelecb*(nelecb-1)*nvirb*(nvirb-1)//4)
+    detblk = max(1, int(budget / ((16+nroots*8)*max(1,nexc))))
+    chunks = []
+    kept = []
+    total = 0
+    p0 = 0
+    while p0 < ndet:
+        p1 = min(ndet, p0+detblk)
+        ext, hc = excitations(p0, p1)
+        nbytes = ext.nbytes + hc.nbytes
+        chunks.append((p0, p1))
+        total += nbytes
+        if kept is not None and total <= budget:
+            kept.append((ext, hc))
+        else:
+            kept = None
+        ext = hc = None
+        detblk = min(detblk*4, max(1, int(budget*(p1-p0)/max(nbytes,1))))
+        p0 = p1
+
+    if kept is not None:
+        e2 = e2_of(kept)
+    else:
+        nbatch = int(total / budget) + 1
+        log.debug('ENPT2 external space is split into %d batches, '
+                  '%d determinant chunks', nbatch, len(chunks))
+        e2 = numpy.zeros(nroots)
+        for ibatch in range(nbatch):
+            e2 += e2_of([excitations(p0, p1, nbatch, ibatch)
+                         for p0, p1 in chunks])
+    return e2
+
+
+###############################################################
+# Density matrices
+###############################################################
+
+def _des_keys(dets, coeff, norb, nelec, spin):
+    '''Apply one (spin=0 alpha, 1 beta) annihilation operator.
+    Returns the N-1 strings, the orbital and the signed coefficients.
+    '''
+    neleca, nelecb = _unpack_nelec(nelec)
+    stra = dets[:,0]
+    strb = dets[:,1]
+    if spin == 0:
+        if neleca == 0:
+            return None
+        occ = _str2occlst(stra, norb, neleca)
+        bit = _bit(occ)
+        ka = stra[:,None] ^ bit
+        kb = numpy.repeat(strb[:,None], neleca, axis=1)
+        sign = _parity_des(stra[:,None], occ)
+    else:
+        if nelecb == 0:
+            return None
+        occ = _str2occlst(strb, norb, nelecb)
+        bit = _bit(occ)
+        ka = numpy.repeat(stra[:,None], nelecb, axis=1)
+        kb = strb[:,None] ^ bit
+        sign = _parity_des(strb[:,None], occ) * (-1)**neleca
+    val = sign * coeff[:,None]
+    keys = numpy.vstack((ka.ravel(), kb.ravel())).T
+    return keys, occ.ravel(), val.ravel()
+
+def _des_des_keys(dets, coeff, norb, nelec, spin):
+    '''Apply two annihilation operators  a_r a_p (a_p first).  spin = 0 for
+    (alpha,alpha), 1 for (alpha,beta) and 2 for (beta,beta).
+    Returns the N-2 strings, the compound orbital index p*norb+r and the
+    signed coefficients.
+    '''
+    neleca, nelecb = _unpack_nelec(nelec)
+    stra = dets[:,0]
+    strb = dets[:,1]
+    if spin == 0 or spin == 2:
+        # a_r a_p on beta strings passes the alpha electrons twice
+        if spin == 0:
+            strs, nocc = stra, neleca
+        else:
+            strs, nocc = strb, nelecb
+        if nocc < 2:
+            return None
+        occ = _str2occlst(strs, norb, nocc)
+        ip, ir = numpy.where(~numpy.eye(nocc, dtype=bool))
+        p = occ[:,ip]
+        r = occ[:,ir]
+        sign = _parity_des(strs[:,None], p)
+        k = strs[:,None] ^ _bit(p)
+        sign *= _parity_des(k, r)
+        k = k ^ _bit(r)
+        if spin == 0:
+            ka, kb = k, numpy.repeat(strb[:,None], len(ip), axis=1)
+        else:
+            ka, kb = numpy.repeat(stra[:,None], len(ip), axis=1), k
+    else:
+        if neleca < 1 or nelecb < 1:
+            return None
+        occa = _str2occlst(stra, norb, neleca)
+        occb = _str2occlst(strb, norb, nelecb)
+        p = occa.repeat(nelecb, axis=1)
+        r = numpy.tile(occb, (1,neleca))
+        sign =(_parity_des(stra[:,None], p) * _parity_des(strb[:,None], r)
+               * (-1)**(neleca-1))
+        ka = stra[:,None] ^ _bit(p)
+        kb = strb[:,None] ^ _bit(r)
+    val = sign * coeff[:,None]
+    keys = numpy.vstack((ka.ravel(), kb.ravel())).T
+    return keys, (p*norb+r).ravel(), val.ravel()
+
+def _contract_des(bra_res, ket_res, ncol):
+    '''sum_K <K|op|bra>^* <K|op'|ket> for the operator strings generated by
+    _des_keys or _des_des_keys'''
+    if bra_res is None or ket_res is None:
+        return numpy.zeros((ncol,ncol))
+    nbra = len(bra_res[0])
+    keys, inverse = _unique_dets(numpy.vstack((bra_res[0], ket_res[0])))
+    nkey = len(keys)
+    xbra = scipy.sparse.csr_matrix((bra_res[2], (inverse[:nbra], bra_res[1])),
+                                   shape=(nkey,ncol))
+    xket = scipy.sparse.csr_matrix((ket_res[2], (inverse[nbra:], ket_res[1])),
+                                   shape=(nkey,ncol))
+    return numpy.asarray(xbra.T.dot(xket).todense())
+
+def _civec_dets(civec):
+    return numpy.asarray(civec).ravel(), civec._dets
+
+def trans_rdm1s(cibra, ciket, norb, nelec, link_index=None):
+    '''Spin separated transition 1-particle density matrices
+    <bra|p^+ q|ket>, (alpha,beta)
+    '''
+    cbra, dbra = _civec_dets(cibra)
+    cket, dket = _civec_dets(ciket)
+    dm1 = []
+    for spin in (0, 1):
+        dm1.append(_contract_des(_des_keys(dbra, cbra, norb, nelec, spin),
+                                 _des_keys(dket, cket, norb, nelec, spin),
+                                 norb))
+    return dm1[0], dm1[1]
+
+def trans_rdm1(cibra, ciket, norb, nelec, link_index=None):
+    '''Spin traced transition 1-particle density matrices'''
+    rdm1a, rdm1b = trans_rdm1s(cibra, ciket, norb, nelec, link_index)
+    return rdm1a + rdm1b
+
+def make_rdm1s(civec, norb, nelec, link_index=None):
+    '''Spin separated 1-particle density matrices, (alpha,beta)'''
+    return trans_rdm1s(civec, civec, norb, nelec, link_index)
+
+def make_rdm1(civec, norb, nelec, link_index=None):
+    '''Spin-traced 1-particle density matrix'''
+    rdm1a, rdm1b = make_rdm1s(civec, norb, nelec, link_index)
+    return rdm1a + rdm1b
+
+def trans_rdm12s(cibra, ciket, norb, nelec, link_index=None, reorder=True):
+    r'''Spin separated transition 1- and 2-particle density matrices.
+    (alpha,beta) for 1-particle density matrices.  (alpha,alpha,alpha,alpha),
+    (alpha,alpha,beta,beta), (beta,beta,alpha,alpha), (beta,beta,beta,beta)
+    for 2-particle density matrices.
+
+    The 2pdm is :math:`\langle p^\dagger r^\dagger s q\rangle` stored as
+    [p,q,r,s], the same to the reordered 2pdm of direct_spin1.
+    '''
+    cbra, dbra = _civec_dets(cibra)
+    cket, dket = _civec_dets(ciket)
+    dm1a, dm1b = trans_rdm1s(cibra, ciket, norb, nelec)
+    dm2 = []
+    for spin in (0, 1, 2):
+        dm2.append(_contract_des(_des_des_keys(dbra, cbra, norb, nelec, spin),
+                                 _des_des_keys(dket, cket, norb, nelec, spin),
+                                 norb*norb))
+    dm2 = [x.reshape((norb,)*4).transpose(0,2,1,3) for x in dm2]
+    dm2aa, dm2ab, dm2bb = dm2
+    # <p_b^+ r_a^+ s_a q_b> = <r_a^+ p_b^+ q_b s_a>
+    dm2ba = dm2ab.transpose(2,3,0,1)
+    return (dm1a, dm1b), (dm2aa, dm2ab, dm2ba, dm2bb)
+
+def trans_rdm12(cibra, ciket, norb, nelec, link_index=None, reorder=True):
+    '''Spin traced transition 1- and 2-particle density matrices.'''
+    (dm1a, dm1b), (dm2aa, dm2ab, dm2ba, dm2bb) = \
+            trans_rdm12s(cibra, ciket, norb, nelec, link_index, reorder)
+    return dm1a+dm1b, dm2aa+dm2ab+dm2ba+dm2bb
+
+def make_rdm12s(civec, norb, nelec, link_index=None, reorder=True):
+    r'''Spin separated 1- and 2-particle density matrices,
+    (alpha,beta) for 1-particle density matrices.
+    (alpha,alpha,alpha,alpha), (alpha,alpha,beta,beta),
+    (beta,beta,beta,beta) for 2-particle density matrices.
+
+    The 2pdm is :math:`\langle p^\dagger r^\dagger s q\rangle` stored as
+    [p,q,r,s], the same to the reordered 2pdm of direct_spin1.
+    '''
+    dm1, dm2 = trans_rdm12s(civec, civec, norb, nelec, link_index, reorder)
+    return dm1, (dm2[0], dm2[1], dm2[3])
+
+def make_rdm12(civec, norb, nelec, link_index=None, reorder=True):
+    '''Spin traced 1- and 2-particle density matrices.'''
+    (dm1a, dm1b), (dm2aa, dm2ab, dm2bb) = \
+            make_rdm12s(civec, norb, nelec, link_index, reorder)
+    return dm1a+dm1b, dm2aa+dm2ab+dm2ab.transpose(2,3,0,1)+dm2bb
+
+def spin_square(civec, norb, nelec):
+    '''<S^2> and the spin multiplicity 2S+1 of the selected CI wavefunction
+    '''
+    neleca, nelecb = _unpack_nelec(nelec)
+    cvec, dets = _civec_dets(civec)
+    dm2ab = _contract_des(_des_des_keys(dets, cvec, norb, nelec, 1),
+                          _des_des_keys(dets, cvec, norb, nelec, 1),
+                          norb*norb).reshape((norb,)*4)
+    # dm2ab[p,r,q,s] = <p_a^+ r_b^+ s_b q_a> before reordering
+    # S^2 = Sz^2 + Sz + S_-S_+,  S_-S_+ = N_b - \sum_{pq} <p_a^+ q_b^+ p_b q_a>
+    sz = (neleca-nelecb) * .5
+    norm = numpy.dot(cvec, cvec)
+    ss = (sz**2 + sz + nelecb) * norm - numpy.einsum('pqqp->', dm2ab)
+    s = numpy.sqrt(ss+.25) - .5
+    return ss, s*2+1
+
+
+###############################################################
+# SHCI driver
+###############################################################
+
+def get_init_guess(dets, nroots, hdiag):
+    '''Unit vectors on the determinants of lowest diagonal energies'''
+    ci0 = []
+    for addr in numpy.argsort(hdiag)[:nroots]:
+        x = numpy.zeros(len(dets))
+        x[addr] = 1
+        ci0.append(x)
+    return ci0
+
+def _hf_det(norb, nelec):
+    neleca, nelecb = _unpack_nelec(nelec)
+    return numpy.array([[(1<<neleca)-1, (1<<nelecb)-1]], dtype=numpy.uint64)
+
+def _diagonalize(myci, h, hdiag, ci0, nroots, **kwargs):
+    ndet = h.shape[0]
+    if ndet <= myci.pspace_size or ndet <= nroots:
+        e, c = scipy.linalg.eigh(h.toarray())
+        nroots = min(nroots, ndet)
+        e = e[:nroots]
+        c = [c[:,k] for k in range(nroots)]
+    else:
+        precond = direct_spin1.make_diag_precond(hdiag, None, None, None,
+                                                 myci.level_shift)
+        hop = lambda x: h.dot(x)
+        e, c = myci.eig(hop, ci0, precond, nroots=nroots, **kwargs)
+        if nroots == 1:
+            e = [e]
+            c = [c]
+    return numpy.asarray(e), c
+
+def kernel_float_space(myci, h1e, eri, norb, nelec, ci0=None, verbose=None,
+                       **kwargs):
+    '''Iteratively select determinants and diagonalize the Hamiltonian in the
+    selected space.
+
+    Returns:
+        (e, civec) for nroots == 1, or lists of e and civec for nroots > 1.
+    '''
+    if isinstance(verbose, logger.Logger):
+        log = verbose
+    else:
+        log = logger.Logger(myci.stdout, myci.verbose)
+    cput0 = (time.clock(), time.time())
+    neleca, nelecb = _unpack_nelec(nelec)
+    nelec = (neleca, nelecb)
+    assert(norb <= 64)
+    # e and civec are produced by the selection cycles
+    assert(myci.max_cycle_select > 0)
+    nroots = myci.nroots
+    eri = pyscf.ao2mo.restore(1, eri, norb)
+    tables = _heat_bath_tables(eri, norb)
+    max_memory = kwargs.get('max_memory', myci.max_memory)
+
+    if ci0 is None:
+        dets = _hf_det(norb, nelec)
+        ci0 = [numpy.ones(1)]
+    else:
+        if isinstance(ci0, SCIvector):
+            ci0 = [ci0]
+        dets = ci0[0]._dets
+        ci0 = [numpy.asarray(x).ravel() for x in ci0]
+    if nroots > 1 and len(dets) < nroots * 4:
+        # the first selection from a single determinant does not provide
+        # enough determinants for the excited states
+        dets = numpy.vstack((dets, select_dets(h1e, eri, dets, ci0, norb,
+                                               nelec, 0, tables)))
+        ci0 = [numpy.append(x, numpy.zeros(len(dets)-x.size)) for x in ci0]
+
+    e_last = None
+    for icycle in range(myci.max_cycle_select):
+        new_dets = select_dets(h1e, eri, dets, ci0, norb, nelec,
+                               myci.select_cutoff, tables)
+        if icycle > 0 and len(new_dets) <= len(dets) * myci.select_tol:
+            log.debug('SHCI selection converged, %d new determinants', len(new_dets))
+            break
+        dets = numpy.vstack((dets, new_dets))
+        if myci.max_ndet is not None and len(dets) > myci.max_ndet:
+            log.warn('SHCI space truncated to max_ndet = %d', myci.max_ndet)
+            dets = dets[:myci.max_ndet]
+        ndet = len(dets)
+        hdiag = make_hdiag(h1e, eri, dets, norb, nelec)
+        h = make_hamiltonian(h1e, eri, dets, norb, nelec, hdiag, max_memory)
+        x0 = [numpy.append(x, numpy.zeros(ndet-x.size)) for x in ci0]
+        if len(x0) < nroots:
+            x0 = x0 + get_init_guess(dets, nroots, hdiag)[len(x0):]
+        e, ci0 = _diagonalize(myci, h, hdiag, x0, nroots)
+        log.info('SHCI cycle %d  ndet = %d  nnz(H) = %d  E = %s',
+                 icycle, ndet, h.nnz, str(e))
+        if e_last is not None and numpy.all(abs(e - e_last) < myci.conv_tol):
+            break
+        e_last = e
+
+    # sort the determinants so that the wavefunction can be searched
+    dets, order = _sort_dets(dets)
+    civec = [as_SCIvector(c[order], dets) for c in ci0]
+    log.timer('SHCI variational space', *cput0)
+
+    if myci.pt2_cutoff is not None and myci.pt2_cutoff > 0:
+        cput1 = (time.clock(), time.time())
+        myci.e_pt2 = enpt2(h1e, eri, civec, norb, nelec, e, myci.pt2_cutoff,
+                           max_memory, tables, log)
+        log.info('SHCI ENPT2 correction = %s', str(myci.e_pt2))
+        log.timer('SHCI ENPT2', *cput1)
+        if nroots == 1:
+            myci.e_pt2 = myci.e_pt2[0]
+    if nroots == 1:
+        return e[0], civec[0]
+    else:
+        return e, civec
+
+def _sort_dets(dets):
+    order = numpy.lexsort((dets[:,1], dets[:,0]))
+    return numpy.ascontiguousarray(dets[order]), order
+
+def kernel_fixed_space(myci, h1e, eri, norb, nelec, ci0, **kwargs):
+    '''Diagonalize the Hamiltonian in the determinant space of ci0'''
+    neleca, nelecb = _unpack_nelec(nelec)
+    nelec = (neleca, nelecb)
+    if isinstance(ci0, SCIvector):
+        ci0 = [ci0]
+    dets = ci0[0]._dets
+    eri = pyscf.ao2mo.restore(1, eri, norb)
+    max_memory = kwargs.get('max_memory', myci.max_memory)
+    hdiag = make_hdiag(h1e, eri, dets, norb, nelec)
+    h = make_hamiltonian(h1e, eri, dets, norb, nelec, hdiag, max_memory)
+    x0 = [numpy.asarray(x).ravel() for x in ci0]
+    e, c = _diagonalize(myci, h, hdiag, x0, len(x0), **kwargs)
+    civec = [as_SCIvector(x, dets) for x in c]
+    if len(civec) == 1:
+        return e[0], civec[0]
+    else:
+        return e, civec
+
+
+class SCI(direct_spin1.FCISolver):
+    '''Heat-bath selected CI solver.  It can be assigned to CASCI/CASSCF
+    .fcisolver
+
+    Attributes:
+        select_cutoff : float
+            Heat-bath threshold epsilon_1 for the variational space.  A
+            determinant is added if |H_{ai} c_i| > select_cutoff.  Default is
+            5e-4.
+        pt2_cutoff : float
+            Heat-bath threshold epsilon_2 for the Epstein-Nesbet PT2
+            correction.  The correction is not computed if pt2_cutoff is None
+            or 0.  Default is None.
+        max_cycle_select : int
+            Max number of selection cycles, at least 1.  Default is 30.
+        select_tol : float
+            Selection is converged when the number of new determinants is less
+            than select_tol * ndet.  Default is 1e-3.
+        max_ndet : int
+            Upper limit of the number of determinants.  Default is None.
+
+    Saved results
+
+        e_pt2 : float or list of floats
+            ENPT2 correction of the last kernel call.
+
+    Examples:
+
+    >>> mc = mcscf.CASSCF(mf, 30, 10)
+    >>> mc.fcisolver = fci.selected_ci.SCI(mol)
+    >>> mc.fcisolver.select_cutoff = 1e-4
+    >>> mc.kernel()
+    '''
+    def __init__(self, mol=None):
+        direct_spin1.FCISolver.__init__(self, mol)
+        self.select_cutoff = 5e-4
+        self.pt2_cutoff = None
+        self.max_cycle_select = 30
+        self.select_tol = 1e-3
+        self.max_ndet = None
+        self.conv_tol = 1e-9
+        self.pspace_size = 400
+
+##################################################
+# don't modify the following attributes, they are not input options
+        self.e_pt2 = None
+        self._keys = set(self.__dict__.keys())
+
+    def dump_flags(self, verbose=None):
+        direct_spin1.FCISolver.dump_flags(self, verbose)
+        if verbose is None: verbose = self.verbose
+        log = logger.Logger(self.stdout, verbose)
+        log.info('select_cutoff = %g', self.select_cutoff)
+        log.info('pt2_cutoff = %s', self.pt2_cutoff)
+        log.info('max_cycle_select = %d', self.max_cycle_select)
+        log.info('select_tol = %g', self.select_tol)
+        log.info('max_ndet = %s', self.max_ndet)
+
+    def make_hdiag(self, h1e, eri, dets, norb, nelec=None):
+        return make_hdiag(h1e, eri, dets, norb, nelec)
+
+    def make_hamiltonian(self, h1e, eri, dets, norb, nelec):
+        return make_hamiltonian(h1e, eri, dets, norb, nelec,
+                                max_memory=self.max_memory)
+
+    def kernel(self, h1e, eri, norb, nelec, ci0=None, **kwargs):
+        if self.verbose > logger.QUIET:
+            pyscf.gto.mole.check_sanity(self, self._keys, self.stdout)
+        if not (isinstance(ci0, SCIvector) or
+                (isinstance(ci0, (list, tuple)) and len(ci0) > 0 and
+                 isinstance(ci0[0], SCIvector))):
+            ci0 = None
+        return kernel_float_space(self, h1e, eri, norb, nelec, ci0, **kwargs)
+
+    def approx_kernel(self, h1e, eri, norb, nelec, ci0=None, **kwargs):
+        '''Solve the CI problem in the determinant space of ci0.  It is
+        called by the CASSCF micro iterations.'''
+        if ci0 is None:
+            return self.kernel(h1e, eri, norb, nelec, **kwargs)
+        return kernel_fixed_space(self, h1e, eri, norb, nelec, ci0, **kwargs)
+
+    def enpt2(self, h1e, eri, civec, norb, nelec, e_var, cutoff=None):
+        if cutoff is None:
+            cutoff = self.pt2_cutoff
+        self.e_pt2 = enpt2(h1e, eri, civec, norb, nelec, e_var, cutoff,
+                           self.max_memory, verbose=self.verbose)
+        if isinstance(civec, SCIvector):
+            self.e_pt2 = self.e_pt2[0]
+        return self.e_pt2
+
+    def energy(self, h1e, eri, civec, norb, nelec, link_index=None):
+        h = make_hamiltonian(h1e, eri, civec._dets, norb, nelec,
+                             max_memory=self.max_memory)
+        c = numpy.asarray(civec).ravel()
+        return numpy.dot(c, h.dot(c))
+
+    def spin_square(self, civec, norb, nelec):
+        if isinstance(civec, SCIvector):
+            return spin_square(civec, norb, nelec)
+        else:
+            ss = [spin_square(c, norb, nelec) for c in civec]
+            return [x[0] for x in ss], [x[1] for x in ss]
+
+    def make_rdm1s(self, civec, norb, nelec, link_index=None):
+        return make_rdm1s(civec, norb, nelec, link_index)
+
+    def make_rdm1(self, civec, norb, nelec, link_index=None):
+        return make_rdm1(civec, norb, nelec, link_index)
+
+    def make_rdm12s(self, civec, norb, nelec, link_index=None, reorder=True):
+        return make_rdm12s(civec, norb, nelec, link_index, reorder)
+
+    def make_rdm12(self, civec, norb, nelec, link_index=None, reorder=True):
+        return make_rdm12(civec, norb, nelec, link_index, reorder)
+
+    def make_rdm2(self, civec, norb, nelec, link_index=None, reorder=True):
+        return make_rdm12(civec, norb, nelec, link_index, reorder)[1]
+
+    def trans_rdm1s(self, cibra, ciket, norb, nelec, link_index=None):
+        return trans_rdm1s(cibra, ciket, norb, nelec, link_index)
+
+    def trans_rdm1(self, cibra, ciket, norb, nelec, link_index=None):
+        return trans_rdm1(cibra, ciket, norb, nelec, link_index)
+
+    def trans_rdm12s(self, cibra, ciket, norb, nelec, link_index=None,
+                     reorder=True):
+        return trans_rdm12s(cibra, ciket, norb, nelec, link_index, reorder)
+
+    def trans_rdm12(self, cibra, ciket, norb, nelec, link_index=None,
+                    reorder=True):
+        return trans_rdm12(cibra, ciket, norb, nelec, link_index, reorder)
+
+SelectedCI = SCI
+
+
+if __name__ == '__main__':
+    from functools import reduce
+    from pyscf import gto
+    from pyscf import scf
+    from pyscf import ao2mo
+
+    mol = gto.Mole()
+    mol.verbose = 0
+    mol.output = None
+    mol.atom = [
+        ['H', ( 1.,-1.    , 0.   )],
+        ['H', ( 0.,-1.    ,-1.   )],
+        ['H', ( 1.,-0.5   ,-1.   )],
+        ['H', ( 0.,-0.    ,-1.   )],
+        ['H', ( 1.,-0.5   , 0.   )],
+        ['H', ( 0., 1.    , 1.   )],
+    ]
+    mol.basis = {'H': 'sto-3g'}
+    mol.build()
+
+    m = scf.RHF(mol)
+    ehf = m.scf()
+
+    norb = m.mo_coeff.shape[1]
+    nelec = mol.nelectron
+    h1e = reduce(numpy.dot, (m.mo_coeff.T, m.get_hcore(), m.mo_coeff))
+    eri = ao2mo.incore.full(m._eri, m.mo_coeff)
+
+    myci = SCI(mol)
+    myci.select_cutoff = 1e-3
+    myci.pt2_cutoff = 1e-8
+    e, civec = myci.kernel(h1e, eri, norb, nelec)
+    efci = direct_spin1.kernel(h1e, eri, norb, nelec)[0]
+    print(e, e+myci.e_pt2, efci)
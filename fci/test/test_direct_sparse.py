@@ -0,0 +1,89 @@
+#!/usr/bin/env python
+
+import unittest
+import numpy
+from pyscf import fci
+from pyscf.fci import direct_sparse
+
+nsite = 6
+h1e = direct_sparse.hubbard_h1e(nsite, t=1.)
+numpy.random.seed(2)
+vppp = numpy.random.random((nsite,nsite))
+vppp = vppp + vppp.T
+
+def dense_eri(v):
+    eri = numpy.zeros((nsite,)*4)
+    for i in range(nsite):
+        for j in range(nsite):
+            eri[i,i,j,j] = v[i,j]
+    return eri
+
+def hop_dense(h1e, eri, ci, nelec):
+    h2e = fci.direct_spin1.absorb_h1e(h1e, eri, nsite, nelec, .5)
+    return fci.direct_spin1.contract_2e(h2e, ci, nsite, nelec)
+
+class KnowValues(unittest.TestCase):
+    def test_hubbard(self):
+        e, c = direct_sparse.kernel(h1e, 4., nsite, (3,3), tol=1e-12)
+        self.assertAlmostEqual(e, -3.668706178846, 8)
+        ss = fci.spin_op.spin_square0(c, nsite, (3,3))[0]
+        self.assertAlmostEqual(ss, 0, 7)
+
+    def test_ppp_contract(self):
+        nelec = (3,2)
+        na = fci.cistring.num_strings(nsite, 3)
+        nb = fci.cistring.num_strings(nsite, 2)
+        ci0 = numpy.random.random((na,nb))
+        ref = hop_dense(h1e, dense_eri(vppp), ci0, nelec)
+        hc = (direct_sparse.contract_1e(h1e, vppp, ci0, nsite, nelec) +
+              direct_sparse.contract_2e(vppp, ci0, nsite, nelec))
+        self.assertAlmostEqual(abs(hc-ref).max(), 0, 9)
+
+    def test_sparse_list(self):
+        nelec = (3,2)
+        eri = dense_eri(vppp)
+        for i in range(nsite-1):
+            eri[i,i+1,i+1,i] = eri[i+1,i,i,i+1] = .1
+            eri[i,i+1,i,i+1] = eri[i+1,i,i+1,i] = .1
+            eri[i,i,i,i+1] = eri[i,i,i+1,i] = .05
+            eri[i,i+1,i,i] = eri[i+1,i,i,i] = .05
+        erisp = direct_sparse.sparse_eri(eri, nsite)
+        na = fci.cistring.num_strings(nsite, 3)
+        nb = fci.cistring.num_strings(nsite, 2)
+        ci0 = numpy.random.random((na,nb))
+        ref = hop_dense(h1e, eri, ci0, nelec)
+        hc = (direct_sparse.contract_1e(h1e, erisp, ci0, nsite, nelec) +
+              direct_sparse.contract_2e(erisp, ci0, nsite, nelec))
+        self.assertAlmostEqual(abs(hc-ref).max(), 0, 9)
+
+        hdiag = direct_sparse.make_hdiag(h1e, erisp, nsite, nelec)
+        ref = fci.direct_spin1.make_hdiag(h1e, eri, nsite, nelec)
+        self.assertAlmostEqual(abs(hdiag-ref).max(), 0, 9)
+
+        e, c = direct_sparse.kernel(h1e, erisp, nsite, nelec, tol=1e-12)
+        eref = fci.direct_spin1.kernel(h1e, eri, nsite, nelec, tol=1e-12)[0]
+        self.assertAlmostEqual(e, eref, 8)
+        self.assertAlmostEqual(direct_sparse.energy(h1e, erisp, c, nsite,
+                                                    nelec), e, 8)
+
+    def test_absorb_h1e(self):
+        nelec = (3,2)
+        eri = dense_eri(vppp)
+        for i in range(nsite-1):
+            eri[i,i+1,i+1,i] = eri[i+1,i,i,i+1] = .1
+            eri[i,i+1,i,i+1] = eri[i+1,i,i+1,i] = .1
+        erisp = direct_sparse.sparse_eri(eri, nsite)
+        na = fci.cistring.num_strings(nsite, 3)
+        nb = fci.cistring.num_strings(nsite, 2)
+        ci0 = numpy.random.random((na,nb))
+        cis = direct_sparse.FCISolver()
+        for v, vref in ((vppp, dense_eri(vppp)), (erisp, eri)):
+            h2e = cis.absorb_h1e(h1e, v, nsite, nelec, .5)
+            hc = cis.contract_2e(h2e, ci0, nsite, nelec)
+            ref = hop_dense(h1e, vref, ci0, nelec)
+            self.assertAlmostEqual(abs(hc-ref).max(), 0, 9)
+
+
+if __name__ == "__main__":
+    print("Full Tests for FCI with sparse interaction")
+    unittest.main()
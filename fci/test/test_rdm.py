@@ -41,6 +41,34 @@ class KnowValues(unittest.TestCase):
         dm3 = fci.rdm.make_dm123('FCI3pdm_kern_sf', ci1, ci1, norb, (5,3))[2]
         self.assertTrue(numpy.allclose(dm3ref, dm3))
 
+    def test_dm3_slices(self):
+        numpy.random.seed(2)
+        na = fci.cistring.num_strings(norb, 5)
+        nb = fci.cistring.num_strings(norb, 3)
+        ci1 = numpy.random.random((na,nb))
+        dm3 = fci.rdm.make_dm123('FCI3pdm_kern_sf', ci1, ci1, norb, (5,3))[2]
+        for p, dm3p in fci.rdm.make_dm3_slices(ci1, norb, (5,3)):
+            self.assertTrue(numpy.allclose(dm3[p], dm3p))
+
+    def test_rdm12_sa(self):
+        numpy.random.seed(2)
+        na = fci.cistring.num_strings(norb, 4)
+        nb = fci.cistring.num_strings(norb, 2)
+        cis = [numpy.random.random((na,nb)) for i in range(3)]
+        weights = (.5, .3, .2)
+        dm1ref = 0
+        dm2ref = 0
+        for c, w in zip(cis, weights):
+            dm1, dm2 = fci.direct_spin1.make_rdm12(c, norb, (4,2))
+            dm1ref += dm1 * w
+            dm2ref += dm2 * w
+        dm1, dm2 = fci.rdm.make_rdm12_sa(cis, weights, norb, (4,2))
+        dm1, dm2 = fci.rdm.reorder_rdm(dm1, dm2)
+        self.assertTrue(numpy.allclose(dm1ref, dm1))
+        self.assertTrue(numpy.allclose(dm2ref, dm2))
+        dm1 = fci.rdm.make_rdm1_sa(cis, weights, norb, (4,2))
+        self.assertTrue(numpy.allclose(dm1ref, dm1))
+
     def test_dm4(self):
         dm4ref = make_dm4_o0(ci0, norb, nelec)
         dm4 = fci.rdm.make_dm1234('FCI4pdm_kern_sf', ci0, ci0, norb, nelec)[3]
@@ -0,0 +1,119 @@
+#!/usr/bin/env python
+
+import unittest
+from functools import reduce
+import numpy
+from pyscf import gto
+from pyscf import scf
+from pyscf import ao2mo
+from pyscf import mcscf
+from pyscf import fci
+from pyscf.fci import selected_ci
+
+mol = gto.Mole()
+mol.verbose = 0
+mol.output = None
+mol.atom = [
+    ['H', ( 1.,-1.    , 0.   )],
+    ['H', ( 0.,-1.    ,-1.   )],
+    ['H', ( 1.,-0.5   ,-1.   )],
+    ['H', ( 0.,-0.5   ,-1.   )],
+    ['H', ( 0.,-0.5   ,-0.   )],
+    ['H', ( 0.,-0.    ,-1.   )],
+    ['H', ( 1.,-0.5   , 0.   )],
+    ['H', ( 0., 1.    , 1.   )],
+]
+mol.basis = {'H': 'sto-3g'}
+mol.charge = 1
+mol.spin = 1
+mol.build()
+
+m = scf.RHF(mol)
+m.conv_tol = 1e-15
+ehf = m.scf()
+
+norb = m.mo_coeff.shape[1]
+nelec = (mol.nelectron//2+1, mol.nelectron//2)
+h1e = reduce(numpy.dot, (m.mo_coeff.T, m.get_hcore(), m.mo_coeff))
+g2e = ao2mo.incore.general(m._eri, (m.mo_coeff,)*4, compact=False)
+g2e = g2e.reshape([norb]*4)
+efci = fci.direct_spin1.kernel(h1e, g2e, norb, nelec, tol=1e-12)[0]
+
+def finger(a):
+    return numpy.dot(a.ravel(), numpy.cos(numpy.arange(a.size)))
+
+class KnowValues(unittest.TestCase):
+    def test_full_space(self):
+        myci = selected_ci.SCI()
+        myci.select_cutoff = 0
+        myci.conv_tol = 1e-12
+        e, c = myci.kernel(h1e, g2e, norb, nelec)
+        self.assertAlmostEqual(e, efci, 8)
+        self.assertEqual(len(c._dets), 3920)
+
+    def test_selected_energy(self):
+        myci = selected_ci.SCI()
+        myci.select_cutoff = 5e-3
+        e, c = myci.kernel(h1e, g2e, norb, nelec)
+        self.assertTrue(len(c._dets) < 3920)
+        self.assertTrue(e > efci - 1e-9)
+        self.assertAlmostEqual(e, efci, 2)
+        e2 = myci.enpt2(h1e, g2e, c, norb, nelec, e)
+        self.assertTrue(e2 < 0)
+        self.assertTrue(abs(e+e2-efci) < abs(e-efci))
+
+    def test_small_memory(self):
+        myci = selected_ci.SCI()
+        myci.select_cutoff = 5e-3
+        e, c = myci.kernel(h1e, g2e, norb, nelec)
+        dets = c._dets
+        bra, ket = selected_ci._connected_pairs(dets, norb, nelec)
+        bra1, ket1 = selected_ci._connected_pairs(dets, norb, nelec,
+                                                  max_memory=1)
+        self.assertTrue(numpy.all(bra == bra1))
+        self.assertTrue(numpy.all(ket == ket1))
+        e2 = myci.enpt2(h1e, g2e, c, norb, nelec, e)
+        myci.max_memory = 4
+        e2small = myci.enpt2(h1e, g2e, c, norb, nelec, e)
+        self.assertAlmostEqual(e2small, e2, 12)
+
+    def test_rdm(self):
+        myci = selected_ci.SCI()
+        myci.select_cutoff = 1e-3
+        e, c = myci.kernel(h1e, g2e, norb, nelec)
+        dm1, dm2 = myci.make_rdm12(c, norb, nelec)
+        self.assertAlmostEqual(abs(dm1-numpy.einsum('pqrr->pq', dm2)
+                                   /(sum(nelec)-1)).max(), 0, 9)
+        eref = (numpy.einsum('pq,pq', h1e, dm1)
+                + numpy.einsum('pqrs,pqrs', g2e, dm2) * .5)
+        self.assertAlmostEqual(eref, e, 9)
+        ss = myci.spin_square(c, norb, nelec)[0]
+        self.assertAlmostEqual(ss, .75, 7)
+
+    def test_casscf(self):
+        mc = mcscf.CASSCF(m, 4, 4)
+        eref = mc.mc1step()[0]
+        mc = mcscf.CASSCF(m, 4, 4)
+        mc.fcisolver = selected_ci.SCI(mol)
+        mc.fcisolver.select_cutoff = 0
+        e = mc.mc1step()[0]
+        self.assertAlmostEqual(e, eref, 8)
+
+    def test_state_average(self):
+        mc = mcscf.addons.state_average_(mcscf.CASSCF(m, 4, 4), (.5,.5))
+        eref = mc.mc1step()[0]
+        mc = mcscf.CASSCF(m, 4, 4)
+        mc.fcisolver = selected_ci.SCI(mol)
+        mc.fcisolver.select_cutoff = 0
+        mc = mcscf.addons.state_average_(mc, (.5,.5))
+        e = mc.mc1step()[0]
+        self.assertAlmostEqual(e, eref, 8)
+        dm1, dm2 = mc.fcisolver.make_rdm12(mc.ci, 4, mc.nelecas)
+        dm1ref = (selected_ci.make_rdm1(mc.ci[0], 4, mc.nelecas) * .5 +
+                  selected_ci.make_rdm1(mc.ci[1], 4, mc.nelecas) * .5)
+        self.assertAlmostEqual(abs(dm1-dm1ref).max(), 0, 9)
+
+
+if __name__ == "__main__":
+    print("Full Tests for selected CI")
+    unittest.main()
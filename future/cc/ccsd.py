@@ -11,6 +11,7 @@ import numpy
 import h5py
 from pyscf import lib
 from pyscf.lib import logger
+from pyscf.scf import _vhf
 import pyscf.ao2mo
 
 libcc = lib.load_library('libcc')
@@ -20,13 +21,26 @@ BLKMIN = 4
 
 # default max_memory = 2000 MB
 def kernel(cc, eris, t1=None, t2=None, max_cycle=50, tol=1e-8, tolnormt=1e-6,
-           max_memory=2000, verbose=logger.INFO):
+           max_memory=2000, verbose=logger.INFO, restart=None):
+    '''CCSD iterations.  If cc.chkfile is set, t1, t2 and the DIIS subspace
+    are saved in the background every cc.chk_cycle iterations.  restart is
+    the name of such a chkfile, to continue the iterations from the saved
+    state.
+
+    If cc.single_prec_tol is set, the amplitudes are updated in single
+    precision until norm(t1,t2) is less than cc.single_prec_tol.  Then the
+    iterations continue in double precision till convergence.  A restart
+    resumes in the precision in which the saved iterations stopped.
+    '''
     cput0 = (time.clock(), time.time())
     if isinstance(verbose, logger.Logger):
         log = verbose
     else:
         log = logger.Logger(cc.stdout, verbose)
 
+    if restart is not None:
+        chk = lib.chkfile.load(restart, 'ccsd')
+        t1, t2 = chk['t1'], chk['t2']
     if t1 is None and t2 is None:
         t1, t2 = cc.init_amps(eris)[1:]
     elif t1 is None:
@@ -34,6 +48,20 @@ def kernel(cc, eris, t1=None, t2=None, max_cycle=50, tol=1e-8, tolnormt=1e-6,
     elif t2 is None:
         t2 = cc.init_amps(eris)[2]
 
+    single_prec = bool(cc.single_prec_tol)
+    normt_old = None
+    if restart is not None and single_prec:
+# Continue in double precision if the saved iterations have switched
+        single_prec = bool(chk.get('single_prec', True))
+        normt_old = chk.get('normt_old', None)
+    if single_prec:
+        t1 = numpy.asarray(t1, dtype=numpy.float32)
+        t2 = numpy.asarray(t2, dtype=numpy.float32)
+        eris_f32 = _ERIS_f32(eris)
+    else:
+        t1 = numpy.asarray(t1, dtype=numpy.double)
+        t2 = numpy.asarray(t2, dtype=numpy.double)
+
     nocc, nvir = t1.shape
     unit = _memory_usage_inloop(nocc, nvir)*1e6/8
     max_memory = max_memory - lib.current_memory()[0]
@@ -41,6 +69,8 @@ def kernel(cc, eris, t1=None, t2=None, max_cycle=50, tol=1e-8, tolnormt=1e-6,
     blksize = max(BLKMIN, int(blksize))
     log.debug('block size = %d, nocc = %d is divided into %d blocks',
               blksize, nocc, int((nocc+blksize-1)//blksize))
+# The intermediates of single precision take half of the memory
+    blksize_f32 = blksize * 2
     cput0 = log.timer('CCSD initialization', *cput0)
     eold = 0
     eccsd = 0
@@ -50,23 +80,107 @@ def kernel(cc, eris, t1=None, t2=None, max_cycle=50, tol=1e-8, tolnormt=1e-6,
     else:
         adiis = lambda t1,t2,*args: (t1,t2)
 
+    istep0 = 0
+    if restart is not None:
+        istep0 = int(chk['istep']) + 1
+        eold, eccsd = chk['eold'], chk['e_corr']
+        if cc.diis and 'diis' in chk:
+            adiis.restore(chk['diis'])
+        chk = None
+        log.info('Restart CCSD from %s at cycle %d', restart, istep0)
+
     conv = False
-    for istep in range(max_cycle):
-        t1new, t2new = cc.update_amps(t1, t2, eris, blksize)
+    writer = None
+    for istep in range(istep0, max_cycle):
+        if single_prec:
+            t1new, t2new = cc.update_amps(t1, t2, eris_f32, blksize_f32)
+        else:
+            t1new, t2new = cc.update_amps(t1, t2, eris, blksize)
         normt = numpy.linalg.norm(t1new-t1) + numpy.linalg.norm(t2new-t2)
         t1, t2 = t1new, t2new
         t1new = t2new = None
         if cc.diis:
+# The DIIS vectors in the DIIS file are copied by the writer thread
+            if writer is not None:
+                writer.join()
+                writer = None
             t1, t2 = cc.diis(t1, t2, istep, normt, eccsd-eold, adiis)
         eold, eccsd = eccsd, energy(cc, t1, t2, eris, blksize)
         log.info('istep = %d  E(CCSD) = %.15g  dE = %.9g  norm(t1,t2) = %.6g',
                  istep, eccsd, eccsd - eold, normt)
         cput0 = log.timer('CCSD iter', *cput0)
-        if abs(eccsd-eold) < tol and normt < tolnormt:
+        if single_prec:
+# Switch to double precision when the single precision iterations reach the
+# threshold or stop improving the amplitudes
+            if (normt < cc.single_prec_tol or
+                (normt_old is not None and normt > normt_old)):
+                log.info('Switch to double precision at cycle %d', istep)
+                single_prec = False
+                eris_f32 = None
+                t1 = numpy.asarray(t1, dtype=numpy.double)
+                t2 = numpy.asarray(t2, dtype=numpy.double)
+                if cc.diis:
+                    adiis = lib.diis.DIIS(cc, cc.diis_file)
+                    adiis.space = cc.diis_space
+            normt_old = normt
+        elif abs(eccsd-eold) < tol and normt < tolnormt:
             conv = True
+        if cc.chkfile and (conv or istep+1 == max_cycle or
+                           (istep+1) % cc.chk_cycle == 0):
+            if writer is not None:
+                writer.join()
+            writer = _dump_chk(cc.chkfile, istep, eccsd, eold, t1, t2, adiis,
+                               single_prec, normt_old)
+        if conv:
             break
+    if writer is not None:
+        writer.join()
     return conv, eccsd, t1, t2
 
+def _dump_chk(chkfile, istep, eccsd, eold, t1, t2, adiis,
+              single_prec=False, normt_old=None):
+    '''Save the state of CCSD iterations in a background thread.  The arrays
+    are not modified by the iterations afterwards, so they are not copied.
+    The DIIS vectors held in the DIIS file are copied to chkfile by HDF5
+    in the thread.  The thread should be joined before the next DIIS update.
+    '''
+    import threading
+    state = {'istep': istep, 'e_corr': eccsd, 'eold': eold, 't1': t1, 't2': t2,
+             'single_prec': single_prec}
+    if normt_old is not None:
+        state['normt_old'] = normt_old
+    if isinstance(adiis, lib.diis.DIIS):
+        state['diis'] = adiis.snapshot()
+    writer = threading.Thread(target=lib.chkfile.dump,
+                              args=(chkfile, 'ccsd', state))
+    writer.start()
+    return writer
+
+class _ERIS_f32:
+    '''Single precision view of the integrals of eris.  The integral blocks
+    are converted to float32 when they are read from eris.'''
+    def __init__(self, eris):
+        self._eris = eris
+        self.fock = numpy.asarray(eris.fock, dtype=numpy.float32)
+
+    def __getattr__(self, key):
+        val = getattr(self._eris, key)
+        if key != 'mo_coeff' and hasattr(val, 'shape') and hasattr(val, 'dtype'):
+            val = _Float32Array(val)
+        return val
+
+class _Float32Array:
+    def __init__(self, a):
+        self._a = a
+        self.shape = a.shape
+        self.dtype = numpy.dtype(numpy.float32)
+
+    def __getitem__(self, idx):
+        return numpy.asarray(self._a[idx], dtype=numpy.float32)
+
+    def __array__(self, dtype=None):
+        return numpy.asarray(self._a[:], dtype=(dtype or numpy.float32))
+
 
 def update_amps(cc, t1, t2, eris, blksize=BLKMIN):
     time0 = time.clock(), time.time()
@@ -113,8 +227,8 @@ def update_amps(cc, t1, t2, eris, blksize=BLKMIN):
     #: t2new += numpy.einsum('ka,ijbk->jiba', -t1, tmp)
         #: eris_vvov = eris_ovvv.transpose(1,2,0,3).copy()
         eris_vvov = _cp(eris_ovvv.transpose(1,2,0,3).reshape(nvir*nvir,-1))
-        tmp = numpy.empty((nocc,nocc,p1-p0,nvir))
-        taubuf = numpy.empty((blksize,nocc,nvir,nvir))
+        tmp = numpy.empty((nocc,nocc,p1-p0,nvir), dtype=t1.dtype)
+        taubuf = numpy.empty((blksize,nocc,nvir,nvir), dtype=t1.dtype)
         for j0, j1 in prange(0, nocc, blksize):
             tau = make_tau(t2[j0:j1], t1[j0:j1], t1, 1, out=taubuf[:j1-j0])
             #: tmp[j0:j1] += numpy.einsum('ijcd,cdkb->ijkb', tau, eris_vvov)
@@ -254,7 +368,7 @@ def update_amps(cc, t1, t2, eris, blksize=BLKMIN):
         eris_oOvV = _cp(eris_oOVv.transpose(0,1,3,2).reshape(-1,nvir**2))
         #==== mem usage blksize*(nocc*nvir**2*4)
 
-        taubuf = numpy.empty((blksize,nocc,nvir,nvir))
+        taubuf = numpy.empty((blksize,nocc,nvir,nvir), dtype=t1.dtype)
         for j0, j1 in prange(0, nocc, blksize):
             tau = make_tau(t2[j0:j1], t1[j0:j1], t1, 1, out=taubuf[:j1-j0])
             #: woooo[p0:p1,:,j0:j1] += numpy.einsum('ijab,klab->ijkl', eris_oOvV, tau)
@@ -309,7 +423,7 @@ def update_amps(cc, t1, t2, eris, blksize=BLKMIN):
     lib.dot(ft_ij.T, t2.reshape(nocc,-1),-1, t2new.reshape(nocc,-1), 1)
 
     #: t2new = t2new + t2new.transpose(1,0,3,2)
-    t2new_tril = numpy.empty((nocc*(nocc+1)//2,nvir,nvir))
+    t2new_tril = numpy.empty((nocc*(nocc+1)//2,nvir,nvir), dtype=t1.dtype)
     ij = 0
     for i in range(nocc):
         for j in range(i+1):
@@ -330,7 +444,7 @@ def update_amps(cc, t1, t2, eris, blksize=BLKMIN):
         p0 += i+1
     time1 = log.timer_debug1('g2/dijab', *time1)
 
-    t2new = numpy.empty((nocc,nocc,nvir,nvir))
+    t2new = numpy.empty((nocc,nocc,nvir,nvir), dtype=t1.dtype)
     ij = 0
     for i in range(nocc):
         for j in range(i):
@@ -404,6 +518,17 @@ http://sunqm.net/pyscf/code-rule.html#api-rules for the details of API conventio
         self.diis_start_energy_diff = 1e9
 
         self.frozen = frozen
+# Contract tau with the AO integrals on the fly instead of storing vvvv.
+# None: use the AO-direct contraction when vvvv does not fit in max_memory.
+        self.direct = None
+# HDF5 file to save t1, t2 and the DIIS subspace every chk_cycle iterations.
+# ccsd(restart=chkfile) continues the iterations from the saved state.
+        self.chkfile = None
+        self.chk_cycle = 1
+# Update the amplitudes in single precision (float32) until norm(t1,t2) is
+# less than single_prec_tol, then switch to double precision.  None or 0
+# to iterate in double precision only.
+        self.single_prec_tol = None
 
 ##################################################
 # don't modify the following attributes, they are not input options
@@ -453,6 +578,7 @@ http://sunqm.net/pyscf/code-rule.html#api-rules for the details of API conventio
         #log.info('diis_file = %s', self.diis_file)
         log.info('diis_start_cycle = %d', self.diis_start_cycle)
         log.info('diis_start_energy_diff = %g', self.diis_start_energy_diff)
+        log.info('single_prec_tol = %s', self.single_prec_tol)
 
     def init_amps(self, eris):
         time0 = time.clock(), time.time()
@@ -477,16 +603,17 @@ http://sunqm.net/pyscf/code-rule.html#api-rules for the details of API conventio
         return self.emp2, t1, t2
 
 
-    def kernel(self, t1=None, t2=None, mo_coeff=None):
-        return self.ccsd(t1, t2, mo_coeff)
-    def ccsd(self, t1=None, t2=None, mo_coeff=None):
+    def kernel(self, t1=None, t2=None, mo_coeff=None, restart=None):
+        return self.ccsd(t1, t2, mo_coeff, restart)
+    def ccsd(self, t1=None, t2=None, mo_coeff=None, restart=None):
         eris = self.ao2mo(mo_coeff)
         cput0 = (time.clock(), time.time())
         self._conv, self.ecc, self.t1, self.t2 = \
                 kernel(self, eris, t1, t2, max_cycle=self.max_cycle,
                        tol=self.conv_tol,
                        tolnormt=self.conv_tol_normt,
-                       max_memory=self.max_memory, verbose=self.verbose)
+                       max_memory=self.max_memory, verbose=self.verbose,
+                       restart=restart)
         if self._conv:
             logger.info(self, 'CCSD converged')
         else:
@@ -505,7 +632,7 @@ http://sunqm.net/pyscf/code-rule.html#api-rules for the details of API conventio
         from pyscf.cc import ccsd_lambda
         if t1 is None: t1 = self.t1
         if t2 is None: t2 = self.t2
-        if eris is None: eris = _ERIS(self, mo_coeff)
+        if eris is None: eris = self.ao2mo(mo_coeff)
         conv, self.l1, self.l2 = \
                 ccsd_lambda.kernel(self, eris, t1, t2, l1, l2,
                                    tol=self.conv_tol_normt,
@@ -513,6 +640,31 @@ http://sunqm.net/pyscf/code-rule.html#api-rules for the details of API conventio
                                    verbose=self.verbose)
         return conv, self.l1, self.l2
 
+    def ccsd_t(self, t1=None, t2=None, eris=None, nthreads=1):
+        '''(T) correction of CCSD(T)'''
+        from pyscf.cc import ccsd_t
+        if t1 is None: t1 = self.t1
+        if t2 is None: t2 = self.t2
+        if eris is None: eris = self.ao2mo()
+        return ccsd_t.kernel(self, eris, t1, t2, self.max_memory, nthreads,
+                             self.verbose)
+
+    def ipccsd(self, nroots=1, eris=None, imds=None):
+        '''EOM-IP-CCSD.  imds of eom_rccsd.make_imds can be shared by
+        ipccsd, eaccsd and eeccsd'''
+        from pyscf.cc import eom_rccsd
+        return eom_rccsd.ipccsd(self, nroots, eris, imds)
+
+    def eaccsd(self, nroots=1, eris=None, imds=None):
+        '''EOM-EA-CCSD'''
+        from pyscf.cc import eom_rccsd
+        return eom_rccsd.eaccsd(self, nroots, eris, imds)
+
+    def eeccsd(self, nroots=1, eris=None, imds=None):
+        '''EOM-EE-CCSD for singlet excited states'''
+        from pyscf.cc import eom_rccsd
+        return eom_rccsd.eeccsd(self, nroots, eris, imds)
+
     def make_rdm1(self, t1=None, t2=None, l1=None, l2=None):
         '''1-particle density matrix in MO space'''
         from pyscf.cc import ccsd_rdm
@@ -533,6 +685,17 @@ http://sunqm.net/pyscf/code-rule.html#api-rules for the details of API conventio
         if l1 is None: l1, l2 = self.solve_lambda(t1, t2)[1:]
         return ccsd_rdm.make_rdm2(self, t1, t2, l1, l2)
 
+    def iter_rdm2(self, t1=None, t2=None, l1=None, l2=None, blksize=None):
+        '''2-particle density matrix in MO space, generated slab by slab as
+        (p0, p1, dm2[p0:p1])'''
+        from pyscf.cc import ccsd_rdm
+        if t1 is None: t1 = self.t1
+        if t2 is None: t2 = self.t2
+        if l1 is None: l1 = self.l1
+        if l2 is None: l2 = self.l2
+        if l1 is None: l1, l2 = self.solve_lambda(t1, t2)[1:]
+        return ccsd_rdm.iter_rdm2(self, t1, t2, l1, l2, blksize)
+
     def ao2mo(self, mo_coeff=None):
         #nocc = self.nocc()
         #nmo = self.nmo()
@@ -556,11 +719,13 @@ http://sunqm.net/pyscf/code-rule.html#api-rules for the details of API conventio
         return _ERIS(self, mo_coeff)
 
     def add_wvvVV_(self, t1, t2, eris, t2new_tril, blksize=BLKMIN):
+        if eris.vvvv is None:
+            return _add_vvvv_direct_(self, t1, t2, eris, t2new_tril)
         time0 = time.clock(), time.time()
         nocc, nvir = t1.shape
         #: tau = t2 + numpy.einsum('ia,jb->ijab', t1, t1)
         #: t2new += numpy.einsum('ijcd,acdb->ijab', tau, vvvv)
-        tau = numpy.empty((nocc*(nocc+1)//2,nvir,nvir))
+        tau = numpy.empty((nocc*(nocc+1)//2,nvir,nvir), dtype=t1.dtype)
         p0 = 0
         for i in range(nocc):
             tau[p0:p0+i+1] = t2[i,:i+1] \
@@ -569,7 +734,7 @@ http://sunqm.net/pyscf/code-rule.html#api-rules for the details of API conventio
         time0 = logger.timer_debug1(self, 'vvvv-tau', *time0)
 
         p0 = 0
-        outbuf = numpy.empty((nvir,nvir,nvir))
+        outbuf = numpy.empty((nvir,nvir,nvir), dtype=t1.dtype)
         for a in range(nvir):
             buf = unpack_tril(eris.vvvv[p0:p0+a+1], out=outbuf[:a+1])
             #: t2new_tril[i,:i+1, a] += numpy.einsum('xcd,cdb->xb', tau[:,:a+1], buf)
@@ -589,7 +754,7 @@ http://sunqm.net/pyscf/code-rule.html#api-rules for the details of API conventio
         return t2new_tril
     def add_wvvVV(self, t1, t2, eris, blksize=BLKMIN):
         nocc, nvir = t1.shape
-        t2new_tril = numpy.zeros((nocc*(nocc+1)//2,nvir,nvir))
+        t2new_tril = numpy.zeros((nocc*(nocc+1)//2,nvir,nvir), dtype=t1.dtype)
         return self.add_wvvVV_(t1, t2, eris, t2new_tril, blksize)
 
     def update_amps(self, t1, t2, eris, blksize=BLKMIN):
@@ -633,12 +798,23 @@ class _ERIS:
         nocc = cc.nocc()
         nmo = cc.nmo()
         nvir = nmo - nocc
-        mem_incore, mem_outcore, mem_basic = _mem_usage(nocc, nvir)
         mem_now = pyscf.lib.current_memory()[0]
+        def incore_fits(direct):
+            return _mem_usage(nocc, nvir, direct)[0]+mem_now < cc.max_memory
+        avail_incore = method == 'incore' and cc._scf._eri is not None
 
         log = logger.Logger(cc.stdout, cc.verbose)
-        if (method == 'incore' and cc._scf._eri is not None and
-            (mem_incore+mem_now < cc.max_memory) or cc.mol.incore_anyway):
+        if cc.direct is None:
+# The outcore storage keeps vvvv on disk.  The AO-direct contraction is only
+# chosen when the incore integrals fit in max_memory without vvvv.
+            direct = ((avail_incore and incore_fits(True) or
+                       cc.mol.incore_anyway) and not incore_fits(False))
+        else:
+            direct = cc.direct
+        if direct:
+            log.debug('vvvv is contracted in AO basis (integral-direct)')
+
+        if (avail_incore and incore_fits(direct)) or cc.mol.incore_anyway:
             eri1 = pyscf.ao2mo.incore.full(cc._scf._eri, mo_coeff)
             #:eri1 = pyscf.ao2mo.restore(1, eri1, nmo)
             #:self.oooo = eri1[:nocc,:nocc,:nocc,:nocc].copy()
@@ -659,7 +835,10 @@ class _ERIS:
             self.oovv = numpy.empty((nocc,nocc,nvir,nvir))
             self.ovov = numpy.empty((nocc,nvir,nocc,nvir))
             self.ovvv = numpy.empty((nocc,nvir,nvir_pair))
-            self.vvvv = numpy.empty((nvir_pair,nvir_pair))
+            if direct:
+                self.vvvv = None
+            else:
+                self.vvvv = numpy.empty((nvir_pair,nvir_pair))
             ij = 0
             outbuf = numpy.empty((nmo,nmo,nmo))
             for i in range(nocc):
@@ -678,7 +857,8 @@ class _ERIS:
                     self.ovvv[j,i-nocc] = lib.pack_tril(buf[j,nocc:,nocc:])
                     ij += 1
                 for j in range(nocc, i+1):
-                    self.vvvv[ij1] = lib.pack_tril(buf[j,nocc:,nocc:])
+                    if self.vvvv is not None:
+                        self.vvvv[ij1] = lib.pack_tril(buf[j,nocc:,nocc:])
                     ij += 1
                     ij1 += 1
         else:
@@ -696,14 +876,18 @@ class _ERIS:
             self.ovov = self.feri1.create_dataset('ovov', (nocc,nvir,nocc,nvir), 'f8')
             self.ovvv = self.feri1.create_dataset('ovvv', (nocc,nvir,nvpair), 'f8')
 
-            pyscf.ao2mo.full(cc.mol, orbv, _tmpfile2.name, verbose=log)
-            self.feri2 = h5py.File(_tmpfile2.name, 'r')
-            self.vvvv = self.feri2['eri_mo']
-            time1 = log.timer_debug1('transforming vvvv', *time0)
+            if direct:
+                self.vvvv = None
+                time1 = time0
+            else:
+                pyscf.ao2mo.full(cc.mol, orbv, _tmpfile2.name, verbose=log)
+                self.feri2 = h5py.File(_tmpfile2.name, 'r')
+                self.vvvv = self.feri2['eri_mo']
+                time1 = log.timer_debug1('transforming vvvv', *time0)
 
             tmpfile3 = tempfile.NamedTemporaryFile()
             pyscf.ao2mo.general(cc.mol, (orbo,mo_coeff,mo_coeff,mo_coeff),
-                                tmpfile3.name, verbose=log)
+                                tmpfile3.name, verbose=log, file_format='raw')
             time1 = log.timer_debug1('transforming oppp', *time1)
             with pyscf.ao2mo.load(tmpfile3.name) as eri1:
                 outbuf = numpy.empty((nmo,nmo,nmo))
@@ -721,9 +905,61 @@ class _ERIS:
     def __del__(self):
         if hasattr(self, 'feri1'):
             self.feri1.close()
+        if hasattr(self, 'feri2'):
             self.feri2.close()
 
 
+def _add_vvvv_direct_(mycc, t1, t2, eris, t2new_tril):
+    '''t2new_tril[ij,a,b] += sum_cd tau[ij,c,d] (ac|bd) without vvvv.
+    tau of each pair ij is transformed to AO basis, contracted with the AO
+    integrals as an exchange-type matrix K[mu,la] = sum (mu nu|la si) D[nu,si]
+    and transformed back to MO basis.
+    '''
+    time0 = time.clock(), time.time()
+    mol = mycc.mol
+    nocc, nvir = t1.shape
+    orbv = eris.mo_coeff[:,nocc:]
+    nao = orbv.shape[0]
+    npair = nocc*(nocc+1)//2
+    tau = numpy.empty((npair,nvir,nvir), dtype=numpy.result_type(t1, t2))
+    p0 = 0
+    for i in range(nocc):
+        tau[p0:p0+i+1] = t2[i,:i+1] \
+                       + numpy.einsum('a,jb->jab', t1[i], t1[:i+1])
+        p0 += i + 1
+
+    mem_now = lib.current_memory()[0]
+    max_memory = max(0, mycc.max_memory - mem_now)
+# AO tau and K matrices for a block of pairs, and the buffer of direct_mapdm
+# and the transposed AO tau for the prescreen
+    blksize = max(1, min(npair, int(max_memory*.9e6/8/(nao**2*4))))
+    logger.debug1(mycc, 'AO-direct vvvv, %d pairs per block', blksize)
+    vhfopt = _VHFOptTau(mol, 'cint2e_sph', 'CVHFnrs8_prescreen',
+                        'CVHFsetnr_direct_scf', 'CVHFsetnr_direct_scf_dm')
+    vhfopt.direct_scf_tol = mycc._scf.direct_scf_tol
+    for p0, p1 in prange(0, npair, blksize):
+        dms = [reduce(numpy.dot, (orbv, tau[k], orbv.T)) for k in range(p0, p1)]
+        vk = _vhf.direct_mapdm('cint2e_sph', 's8', 'jk->s1il', dms, 1,
+                               mol._atm, mol._bas, mol._env, vhfopt)
+        dms = None
+        vk = vk.reshape(-1,nao,nao)
+        for k in range(p0, p1):
+            t2new_tril[k] += reduce(numpy.dot, (orbv.T, vk[k-p0], orbv))
+        vk = None
+        time0 = logger.timer_debug1(mycc, 'vvvv AO-direct [%d:%d]'%(p0,p1), *time0)
+    return t2new_tril
+
+class _VHFOptTau(_vhf.VHFOpt):
+    '''The s8 prescreen reads dm_cond[i,j] or dm_cond[j,i] only, which
+    assumes symmetric density matrices.  tau[ij] in AO basis is not
+    symmetric, dm_cond is taken from both tau and tau.T.
+    '''
+    def set_dm_(self, dm, atm, bas, env):
+        dm = numpy.asarray(dm)
+        dm = dm.reshape(-1,dm.shape[-2],dm.shape[-1])
+        dm = numpy.vstack((dm, dm.transpose(0,2,1)))
+        _vhf.VHFOpt.set_dm_(self, dm, atm, bas, env)
+
 # assume nvir > nocc, minimal requirements on memory in loop of update_amps
 def _memory_usage_inloop(nocc, nvir):
     v = max(nvir**3*2+nvir*nocc**2*2,
@@ -731,13 +967,18 @@ def _memory_usage_inloop(nocc, nvir):
             nocc*nvir**2*9)
     return v*8/1e6
 # assume nvir > nocc, minimal requirements on memory
-def _mem_usage(nocc, nvir):
+# direct: vvvv is not stored
+def _mem_usage(nocc, nvir, direct=False):
     basic = _memory_usage_inloop(nocc, nvir)*1e6/8 + nocc**4
     basic = max(basic, nocc*(nocc+1)//2*nvir**2) + (nocc*nvir)**2*2
     basic = basic * 8/1e6
     nmo = nocc + nvir
+    if direct:
+        vvvv = 0
+    else:
+        vvvv = nvir**4/4
     incore = (max((nmo*(nmo+1)//2)**2*2*8/1e6, basic) +
-              (nocc*nvir**3/2 + nvir**4/4 + nocc**2*nvir**2*2 +
+              (nocc*nvir**3/2 + vvvv + nocc**2*nvir**2*2 +
                nocc**3*nvir*2)*8/1e6)
     outcore = basic
     return incore, outcore, basic
@@ -805,9 +1046,14 @@ def unpack_tril(tril, out=None):
     count = tril.shape[0]
     nd = int(numpy.sqrt(tril.shape[1]*2))
     if out is None:
-        mat = numpy.empty((count,nd,nd))
+        mat = numpy.empty((count,nd,nd), dtype=tril.dtype)
     else:
         mat = out
+    if tril.dtype != numpy.double:
+        idx, idy = numpy.tril_indices(nd)
+        mat[:,idx,idy] = tril
+        mat[:,idy,idx] = tril
+        return mat
     libcc.CCunpack_tril(ctypes.c_int(count), ctypes.c_int(nd),
                         tril.ctypes.data_as(ctypes.c_void_p),
                         mat.ctypes.data_as(ctypes.c_void_p))
@@ -816,7 +1062,7 @@ def unpack_tril(tril, out=None):
 def make_tau(t2, t1a, t1b, fac=1, out=None):
     nocc = t1a.shape[0]
     if out is None:
-        tau = numpy.empty(t2.shape)
+        tau = numpy.empty(t2.shape, dtype=t2.dtype)
     else:
         tau = out
     for i in range(nocc):
@@ -827,7 +1073,7 @@ def make_tau(t2, t1a, t1b, fac=1, out=None):
 def make_theta(t2, out=None):
     nocc = t2.shape[0]
     if out is None:
-        theta = numpy.empty(t2.shape)
+        theta = numpy.empty(t2.shape, dtype=t2.dtype)
     else:
         theta = out
     for i in range(nocc):
@@ -49,7 +49,7 @@ def gamma2_outcore(cc, t1, t2, l1, l2, filename, blksize=ccsd.BLKMIN):
     fsave.create_dataset('dooov', (nocc,nocc,nocc,nvir), 'f8')
 
     _tmpfile = tempfile.NamedTemporaryFile()
-    fswap = h5py.File(_tmpfile.name)
+    fswap = h5py.File(_tmpfile.name, 'w')
     mOvOv = fswap.create_dataset('mOvOv', (nocc,nvir,nocc,nvir), 'f8')
     mOVov = fswap.create_dataset('mOVov', (nocc,nvir,nocc,nvir), 'f8')
 
@@ -226,65 +226,127 @@ def make_rdm2(cc, t1, t2, l1, l2, d1=None, d2=None):
     else:
         doo, dvv = d1
     if d2 is None:
-        doovv, dvvvv, doooo, dovov, dovvo, dvovv, dooov = \
-                gamma2_intermediates(cc, t1, t2, l1, l2)
-    else:
-        doovv, dvvvv, doooo, dovov, dovvo, dvovv, dooov = d2
+        d2 = gamma2_intermediates(cc, t1, t2, l1, l2)
     nocc, nvir = t1.shape
     nmo = nocc + nvir
+    doo = doo + doo.T
+    dvv = dvv + dvv.T
 
     dm2 = numpy.empty((nmo,nmo,nmo,nmo))
+    _rdm2_slab(doo, dvv, d2, nocc, nvir, 0, nocc, out=dm2[:nocc])
+    _rdm2_slab(doo, dvv, d2, nocc, nvir, nocc, nmo, out=dm2[nocc:])
+    return dm2
 
-    dm2[:nocc,nocc:,:nocc,nocc:] = \
-            (doovv.transpose(0,2,1,3)+doovv.transpose(1,3,0,2))
-    dm2[nocc:,:nocc,nocc:,:nocc] = \
-            (doovv.transpose(2,0,3,1)+doovv.transpose(3,1,2,0))
-
-    dm2[:nocc,:nocc,nocc:,nocc:] = \
-            (dovov.transpose(0,2,3,1)+dovov.transpose(2,0,1,3))
-    dm2[nocc:,nocc:,:nocc,:nocc] = \
-            (dovov.transpose(3,1,0,2)+dovov.transpose(1,3,2,0))
-    dm2[:nocc,nocc:,nocc:,:nocc] = \
-            (dovvo.transpose(0,2,1,3)+dovvo.transpose(3,1,2,0))
-    dm2[nocc:,:nocc,:nocc,nocc:] = \
-            (dovvo.transpose(1,3,0,2)+dovvo.transpose(2,0,3,1))
-
-    dm2[nocc:,nocc:,nocc:,nocc:] = \
-            (dvvvv.transpose(0,2,1,3)+dvvvv.transpose(2,0,3,1)) * 2
-
-    dm2[:nocc,:nocc,:nocc,:nocc] = \
-            (doooo.transpose(0,2,1,3)+doooo.transpose(2,0,3,1)) * 2
-
-    dm2[nocc:,nocc:,:nocc,nocc:] = dvovv.transpose(0,2,1,3)
-    dm2[:nocc,nocc:,nocc:,nocc:] = dvovv.transpose(1,3,0,2)
-    dm2[nocc:,nocc:,nocc:,:nocc] = dvovv.transpose(2,0,3,1)
-    dm2[nocc:,:nocc,nocc:,nocc:] = dvovv.transpose(3,1,2,0)
+def iter_rdm2(cc, t1, t2, l1, l2, blksize=None):
+    '''Generate the 2-RDM (in Chemist's notation) slab by slab.  It yields
+    (p0, p1, dm2[p0:p1]).  The gamma2 intermediates are held in a temporary
+    HDF5 file, and only one slab of size blksize*nmo**3 is held in memory.
 
-    dm2[:nocc,:nocc,:nocc,nocc:] = dooov.transpose(0,2,1,3)
-    dm2[:nocc,nocc:,:nocc,:nocc] = dooov.transpose(1,3,0,2)
-    dm2[:nocc,:nocc,nocc:,:nocc] = dooov.transpose(2,0,3,1)
-    dm2[nocc:,:nocc,:nocc,:nocc] = dooov.transpose(3,1,2,0)
+    Examples:
 
+    >>> for p0, p1, dm2 in iter_rdm2(mycc, t1, t2, l1, l2):
+    ...     e2 += numpy.einsum('pqrs,pqrs', dm2, eri[p0:p1]) * .5
+    '''
+    nocc, nvir = t1.shape
+    nmo = nocc + nvir
+    doo, dvv = gamma1_intermediates(cc, t1, t2, l1, l2)
     doo = doo + doo.T
     dvv = dvv + dvv.T
-    for i in range(nocc):
-        dm2[i,i,:nocc,:nocc] += doo * 2
-        dm2[:nocc,:nocc,i,i] += doo * 2
-        dm2[i,i,nocc:,nocc:] += dvv * 2
-        dm2[nocc:,nocc:,i,i] += dvv * 2
-        dm2[:nocc,i,i,:nocc] -= doo
-        dm2[i,:nocc,:nocc,i] -= doo
-        dm2[nocc:,i,i,nocc:] -= dvv
-        dm2[i,nocc:,nocc:,i] -= dvv
-
-    for i in range(nocc):
-        for j in range(nocc):
-            dm2[i,i,j,j] += 4
-            dm2[i,j,j,i] -= 2
+    if blksize is None:
+        mem_now = lib.current_memory()[0]
+        max_memory = max(0, cc.max_memory - mem_now)
+        blksize = max(1, int(max_memory*.3e6/8/nmo**3))
 
+    _tmpfile = tempfile.NamedTemporaryFile()
+    gamma2_outcore(cc, t1, t2, l1, l2, _tmpfile.name)
+    with h5py.File(_tmpfile.name, 'r') as f:
+        d2 = (f['doovv'], f['dvvvv'], f['doooo'], f['dovov'],
+              f['dovvo'], f['dvovv'], f['dooov'])
+        for p0, p1 in ccsd.prange(0, nocc, blksize):
+            yield p0, p1, _rdm2_slab(doo, dvv, d2, nocc, nvir, p0, p1)
+        for p0, p1 in ccsd.prange(nocc, nmo, blksize):
+            yield p0, p1, _rdm2_slab(doo, dvv, d2, nocc, nvir, p0, p1)
+
+def make_rdm2_outcore(cc, t1, t2, l1, l2, filename, dataname='dm2',
+                      blksize=None):
+    '''Write the 2-RDM (in Chemist's notation) to the dataset dataname of
+    the HDF5 file filename without holding the full array in memory.'''
+    nocc, nvir = t1.shape
+    nmo = nocc + nvir
+    feri = h5py.File(filename, 'a')
+    if dataname in feri:
+        del(feri[dataname])
+    dm2 = feri.create_dataset(dataname, (nmo,nmo,nmo,nmo), 'f8')
+    for p0, p1, buf in iter_rdm2(cc, t1, t2, l1, l2, blksize):
+        dm2[p0:p1] = buf
+    feri.close()
+    return filename
+
+def _rdm2_slab(doo, dvv, d2, nocc, nvir, p0, p1, out=None):
+    '''dm2[p0:p1] from the symmetrized gamma1 (doo, dvv) and the gamma2
+    intermediates d2, which can be numpy arrays or HDF5 datasets.  [p0:p1]
+    should be within the occupied or within the virtual orbitals.'''
+    doovv, dvvvv, doooo, dovov, dovvo, dvovv, dooov = d2
+    nmo = nocc + nvir
+    if out is None:
+        dm2 = numpy.empty((p1-p0,nmo,nmo,nmo))
+    else:
+        dm2 = out
+
+    if p1 <= nocc:
+        i0, i1 = p0, p1
+        dm2[:,:nocc,:nocc,:nocc] = \
+                (doooo[i0:i1].transpose(0,2,1,3) +
+                 doooo[:,:,i0:i1].transpose(2,0,3,1)) * 2
+        dm2[:,:nocc,:nocc,nocc:] = dooov[i0:i1].transpose(0,2,1,3)
+        dm2[:,:nocc,nocc:,:nocc] = dooov[:,:,i0:i1].transpose(2,0,3,1)
+        dm2[:,:nocc,nocc:,nocc:] = \
+                (dovov[i0:i1].transpose(0,2,3,1) +
+                 dovov[:,:,i0:i1].transpose(2,0,1,3))
+        dm2[:,nocc:,:nocc,:nocc] = dooov[:,i0:i1].transpose(1,3,0,2)
+        dm2[:,nocc:,:nocc,nocc:] = \
+                (doovv[i0:i1].transpose(0,2,1,3) +
+                 doovv[:,i0:i1].transpose(1,3,0,2))
+        dm2[:,nocc:,nocc:,:nocc] = \
+                (dovvo[i0:i1].transpose(0,2,1,3) +
+                 dovvo[:,:,:,i0:i1].transpose(3,1,2,0))
+        dm2[:,nocc:,nocc:,nocc:] = dvovv[:,i0:i1].transpose(1,3,0,2)
+
+        for i in range(nocc):
+            dm2[:,:nocc,i,i] += doo[i0:i1] * 2
+            dm2[:,i,i,:nocc] -= doo[i0:i1]
+        for k, i in enumerate(range(i0, i1)):
+            dm2[k,i,:nocc,:nocc] += doo * 2
+            dm2[k,i,nocc:,nocc:] += dvv * 2
+            dm2[k,:nocc,:nocc,i] -= doo
+            dm2[k,nocc:,nocc:,i] -= dvv
+            for j in range(nocc):
+                dm2[k,i,j,j] += 4
+                dm2[k,j,j,i] -= 2
+    else:
+        a0, a1 = p0 - nocc, p1 - nocc
+        dm2[:,:nocc,:nocc,:nocc] = dooov[:,:,:,a0:a1].transpose(3,1,2,0)
+        dm2[:,:nocc,:nocc,nocc:] = \
+                (dovvo[:,a0:a1].transpose(1,3,0,2) +
+                 dovvo[:,:,a0:a1].transpose(2,0,3,1))
+        dm2[:,:nocc,nocc:,:nocc] = \
+                (doovv[:,:,a0:a1].transpose(2,0,3,1) +
+                 doovv[:,:,:,a0:a1].transpose(3,1,2,0))
+        dm2[:,:nocc,nocc:,nocc:] = dvovv[:,:,:,a0:a1].transpose(3,1,2,0)
+        dm2[:,nocc:,:nocc,:nocc] = \
+                (dovov[:,:,:,a0:a1].transpose(3,1,0,2) +
+                 dovov[:,a0:a1].transpose(1,3,2,0))
+        dm2[:,nocc:,:nocc,nocc:] = dvovv[a0:a1].transpose(0,2,1,3)
+        dm2[:,nocc:,nocc:,:nocc] = dvovv[:,:,a0:a1].transpose(2,0,3,1)
+        dm2[:,nocc:,nocc:,nocc:] = \
+                (dvvvv[a0:a1].transpose(0,2,1,3) +
+                 dvvvv[:,:,a0:a1].transpose(2,0,3,1)) * 2
+
+        for i in range(nocc):
+            dm2[:,nocc:,i,i] += dvv[a0:a1] * 2
+            dm2[:,i,i,nocc:] -= dvv[a0:a1]
     return dm2
 
-
 if __name__ == '__main__':
     from pyscf import gto
     from pyscf import scf
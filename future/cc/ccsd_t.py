@@ -0,0 +1,193 @@
+#!/usr/bin/env python
+#
+# Author: Qiming Sun <osirpt.sun@gmail.com>
+#
+
+'''
+RHF-CCSD(T) for real integrals
+
+Ref: A. P. Rendell, T. J. Lee, A. Komornicki, Chem. Phys. Lett. 178, 462 (1991)
+
+    W_ijk^abc = P_ijk^abc [ sum_d (ia|bd) t_kj^cd - sum_l (kc|jl) t_il^ab ]
+    V_ijk^abc = W_ijk^abc + (jb|kc) t_i^a + (ia|kc) t_j^b + (ia|jb) t_k^c
+    E(T) = 1/3 sum (4 W^abc + W^bca + W^cab) (V^abc - V^cba) / D_ijk^abc
+
+P_ijk^abc sums over the 6 simultaneous permutations of (ia), (jb), (kc).
+Only the virtual triples a >= b >= c are computed.  Canonical orbitals
+are assumed.
+'''
+
+import time
+import numpy
+import pyscf.lib as lib
+from pyscf.lib import logger
+from pyscf.cc import ccsd
+
+# t2 as ijab
+
+def kernel(mycc, eris, t1=None, t2=None, max_memory=2000, nthreads=1,
+           verbose=logger.INFO):
+    '''(T) correction.  The virtual orbitals are divided into blocks.  For
+    each block triple A >= B >= C, the (ia|bd) slabs of the three blocks
+    are read from eris.ovvv and the triples (a,b,c) of the block triple are
+    evaluated on a pool of nthreads threads.
+    '''
+    cpu0 = (time.clock(), time.time())
+    if isinstance(verbose, logger.Logger):
+        log = verbose
+    else:
+        log = logger.Logger(mycc.stdout, verbose)
+
+    if t1 is None: t1 = mycc.t1
+    if t2 is None: t2 = mycc.t2
+    nocc, nvir = t1.shape
+    mo_e = eris.fock.diagonal()
+    e_occ = mo_e[:nocc]
+    e_vir = mo_e[nocc:]
+    eijk = e_occ[:,None,None] + e_occ[None,:,None] + e_occ[None,None,:]
+
+    # t2T[a,b,j,i] = t2[i,j,a,b]
+    t2T = numpy.asarray(t2.transpose(2,3,1,0), order='C')
+    # vvoo[a,b,i,j] = (ia|jb)
+    vvoo = numpy.asarray(numpy.asarray(eris.ovov).transpose(1,3,0,2), order='C')
+    # vooo[a,k,j,l] = (ka|jl)
+    vooo = numpy.asarray(numpy.asarray(eris.ovoo).transpose(1,0,2,3), order='C')
+
+    mem_now = lib.current_memory()[0]
+    max_memory = max(0, max_memory - mem_now)
+    unit = nocc*nvir**2*8/1e6
+    blksize = int((max_memory*.9 - nthreads*nocc**3*20*8/1e6) / (3*unit))
+    blksize = max(1, min(nvir, blksize))
+    vblks = list(ccsd.prange(0, nvir, blksize))
+    nblk = len(vblks)
+    _perf_model(log, nocc, nvir, blksize, nthreads)
+
+    def load_slab(p0, p1):
+        # vvov[a,b,i,d] = (ia|bd) for a in [p0:p1]
+        ovvv = numpy.asarray(eris.ovvv[:,p0:p1], order='C')
+        ovvv = ccsd.unpack_tril(ovvv.reshape(-1,ovvv.shape[2]))
+        ovvv = ovvv.reshape(nocc,p1-p0,nvir,nvir)
+        return numpy.asarray(ovvv.transpose(1,2,0,3), order='C')
+
+    def contract(slabs, a, b, c):
+        def vvov(p, q):
+            s0, s = slabs[p]
+            return s[p-s0,q]
+        def get_x(p, q, r):
+            x = numpy.dot(vvov(p,q), t2T[r].reshape(nvir,-1))
+            x = x.reshape(nocc,nocc,nocc)
+            y = numpy.dot(vooo[r].reshape(-1,nocc), t2T[p,q])
+            x -= y.reshape(nocc,nocc,nocc).transpose(2,1,0)
+            return x
+        w = (get_x(a, b, c) +
+             get_x(a, c, b).transpose(0,2,1) +
+             get_x(c, a, b).transpose(1,2,0) +
+             get_x(c, b, a).transpose(2,1,0) +
+             get_x(b, c, a).transpose(2,0,1) +
+             get_x(b, a, c).transpose(1,0,2))
+        v = (numpy.einsum('i,jk->ijk', t1[:,a], vvoo[b,c]) +
+             numpy.einsum('j,ik->ijk', t1[:,b], vvoo[a,c]) +
+             numpy.einsum('k,ij->ijk', t1[:,c], vvoo[a,b]))
+        v += w
+        y = w * 4 + w.transpose(2,0,1) + w.transpose(1,2,0)
+        # The permutations of (a,b,c) are folded in by relabeling i,j,k
+        z = (v * 3 - v.transpose(2,1,0) - v.transpose(1,0,2)
+             - v.transpose(0,2,1))
+        d3 = eijk - e_vir[a] - e_vir[b] - e_vir[c]
+        if a == c:
+            fac = 1./9
+        elif a == b or b == c:
+            fac = 1./3
+        else:
+            fac = 2./3
+        return numpy.einsum('ijk,ijk', y, z/d3) * fac
+
+    def task(args):
+        slabs, a, b0, b1, c0, c1 = args
+        et = 0
+        for b in range(b0, min(b1, a+1)):
+            for c in range(c0, min(c1, b+1)):
+                et += contract(slabs, a, b, c)
+        return et
+
+    if nthreads > 1:
+        from multiprocessing.pool import ThreadPool
+        pool = ThreadPool(nthreads)
+    et = 0
+    for ia, (a0, a1) in enumerate(vblks):
+        slab_a = (a0, load_slab(a0, a1))
+        for ib, (b0, b1) in enumerate(vblks[:ia+1]):
+            if ib == ia:
+                slab_b = slab_a
+            else:
+                slab_b = (b0, load_slab(b0, b1))
+            for ic, (c0, c1) in enumerate(vblks[:ib+1]):
+                if ic == ib:
+                    slab_c = slab_b
+                else:
+                    slab_c = (c0, load_slab(c0, c1))
+                slabs = {}
+                for s0, s in (slab_a, slab_b, slab_c):
+                    for p in range(s0, s0+s.shape[0]):
+                        slabs[p] = (s0, s)
+                tasks = [(slabs, a, b0, b1, c0, c1) for a in range(a0, a1)]
+                if nthreads > 1:
+                    et += sum(pool.map(task, tasks))
+                else:
+                    et += sum([task(x) for x in tasks])
+                slab_c = None
+            slab_b = None
+        slab_a = None
+        log.debug('(T) virtual block [%d/%d]', ia+1, nblk)
+    if nthreads > 1:
+        pool.close()
+        pool.join()
+    log.timer('CCSD(T)', *cpu0)
+    log.note('CCSD(T) correction = %.15g', et)
+    return et
+
+def _perf_model(log, nocc, nvir, blksize, nthreads):
+    '''Print the estimated cost of the (T) correction.  The time is
+    extrapolated from a DGEMM of the size used in the inner loop.'''
+    ntriple = nvir*(nvir+1)*(nvir+2) // 6
+    flops = ntriple * 6 * (2*nocc**3*nvir + 2*nocc**4)
+    nblk = (nvir+blksize-1) // blksize
+    # slab A once, slab B for each (A,B), slab C for each (A,B,C)
+    nslab = nblk + nblk*(nblk-1)//2 + nblk*(nblk-1)*(nblk-2)//6
+    io = nslab * blksize * nocc * nvir**2 * 8 / 1e6
+    a = numpy.random.random((nocc,nvir))
+    b = numpy.random.random((nvir,nocc*nocc))
+    t0 = time.time()
+    for i in range(20):
+        numpy.dot(a, b)
+    dt = max(time.time() - t0, 1e-9)
+    rate = 20 * 2*nocc**3*nvir / dt
+    log.info('(T) nocc = %d  nvir = %d  %d virtual triples', nocc, nvir,
+             ntriple)
+    log.info('(T) virtual block size = %d (%d blocks), reading %.8g MB of ovvv',
+             blksize, nblk, io)
+    log.info('(T) %.4g GFLOP, estimated %.4g s with %d thread(s) at %.4g GFLOPS',
+             flops/1e9, flops/rate/nthreads, nthreads, rate/1e9)
+    return flops, io
+
+
+if __name__ == '__main__':
+    from pyscf import gto
+    from pyscf import scf
+
+    mol = gto.Mole()
+    mol.verbose = 4
+    mol.atom = [
+        [8 , (0. , 0.     , 0.)],
+        [1 , (0. , -0.757 , 0.587)],
+        [1 , (0. , 0.757  , 0.587)]]
+
+    mol.basis = 'cc-pvdz'
+    mol.build()
+    rhf = scf.RHF(mol)
+    rhf.scf()
+
+    mcc = ccsd.CCSD(rhf)
+    mcc.conv_tol = 1e-12
+    mcc.ccsd()
+    print(kernel(mcc, mcc.ao2mo()))
@@ -0,0 +1,212 @@
+#!/usr/bin/env python
+#
+# Author: Qiming Sun <osirpt.sun@gmail.com>
+#
+
+'''
+Density fitting RCCSD
+
+All MO integrals are assembled from the 3-center integrals (L|pq).  The
+(ac|bd) integrals are not stored.  They are generated from (L|ab) for one
+block of virtual orbitals at a time when the ladder term is contracted.
+'''
+
+import time
+import tempfile
+from functools import reduce
+import numpy
+import h5py
+from pyscf import lib
+from pyscf.lib import logger
+from pyscf import df
+from pyscf.cc import ccsd
+
+
+class CCSD(ccsd.CCSD):
+    '''Density fitting CCSD
+
+    Attributes:
+        auxbasis : str
+            Auxiliary basis to fit the MO integrals.  Default is the
+            auxbasis of the SCF object, or 'weigend'
+    '''
+    def __init__(self, mf, frozen=[], mo_energy=None, mo_coeff=None, mo_occ=None):
+        ccsd.CCSD.__init__(self, mf, frozen, mo_energy, mo_coeff, mo_occ)
+        if hasattr(mf, 'auxbasis'):
+            self.auxbasis = mf.auxbasis
+        else:
+            self.auxbasis = 'weigend'
+        self._keys = self._keys.union(['auxbasis'])
+
+    def ao2mo(self, mo_coeff=None):
+        return _ERIS(self, mo_coeff)
+
+    def add_wvvVV_(self, t1, t2, eris, t2new_tril, blksize=ccsd.BLKMIN):
+        return _add_vvvv_df_(self, t1, t2, eris, t2new_tril)
+
+
+class _ERIS:
+    def __init__(self, cc, mo_coeff=None):
+        moidx = numpy.ones(cc.mo_energy.size, dtype=bool)
+        if isinstance(cc.frozen, (int, numpy.integer)):
+            moidx[:cc.frozen] = False
+        elif len(cc.frozen) > 0:
+            moidx[numpy.asarray(cc.frozen)] = False
+        if mo_coeff is None:
+            self.mo_coeff = mo_coeff = cc.mo_coeff[:,moidx]
+            self.fock = numpy.diag(cc.mo_energy[moidx])
+        else:  # If mo_coeff is not canonical orbital
+            self.mo_coeff = mo_coeff = mo_coeff[:,moidx]
+            dm = cc._scf.make_rdm1(cc.mo_coeff, cc.mo_occ)
+            fockao = cc._scf.get_hcore() + cc._scf.get_veff(cc.mol, dm)
+            self.fock = reduce(numpy.dot, (mo_coeff.T, fockao, mo_coeff))
+
+        nocc = cc.nocc()
+        nmo = cc.nmo()
+        nvir = nmo - nocc
+        nvir_pair = nvir * (nvir+1) // 2
+        log = logger.Logger(cc.stdout, cc.verbose)
+        time0 = time.clock(), time.time()
+
+        cderi_file = tempfile.NamedTemporaryFile()
+        df.outcore.general(cc.mol, (mo_coeff,mo_coeff), cderi_file.name,
+                           auxbasis=cc.auxbasis, verbose=log)
+        time1 = log.timer_debug1('Integral transformation (L|pq)', *time0)
+
+        with df.load(cderi_file) as fLpq:
+            naoaux = fLpq.shape[0]
+            mem_now = lib.current_memory()[0]
+            mem_incore = (nocc*nvir**3/2 + nocc**2*nvir**2*2 +
+                          nocc**3*nvir*2 + nocc**4 + naoaux*nvir_pair)*8/1e6
+            if mem_incore+mem_now < cc.max_memory or cc.mol.incore_anyway:
+                def empty(key, shape):
+                    return numpy.empty(shape)
+            else:
+                self._tmpfile1 = tempfile.NamedTemporaryFile()
+                self.feri1 = h5py.File(self._tmpfile1.name, 'w')
+                def empty(key, shape):
+                    return self.feri1.create_dataset(key, shape, 'f8')
+            self.Loo = numpy.empty((naoaux,nocc,nocc))
+            self.Lov = numpy.empty((naoaux,nocc,nvir))
+            self.Lvv = empty('Lvv', (naoaux,nvir_pair))
+            self.vvvv = None
+
+            vtril = numpy.tril_indices(nvir)
+            max_memory = max(0, cc.max_memory - lib.current_memory()[0])
+            auxblk = max(1, int(max_memory*.5e6/8/(nmo**2*2)))
+            for p0, p1 in ccsd.prange(0, naoaux, auxblk):
+                buf = ccsd.unpack_tril(numpy.asarray(fLpq[p0:p1], order='C'))
+                self.Loo[p0:p1] = buf[:,:nocc,:nocc]
+                self.Lov[p0:p1] = buf[:,:nocc,nocc:]
+                self.Lvv[p0:p1] = buf[:,nocc:,nocc:][:,vtril[0],vtril[1]]
+                buf = None
+        time1 = log.timer_debug1('sorting (L|pq)', *time1)
+
+        Loo = self.Loo.reshape(naoaux,-1)
+        Lov = self.Lov.reshape(naoaux,-1)
+        self.oooo = empty('oooo', (nocc,nocc,nocc,nocc))
+        self.ooov = empty('ooov', (nocc,nocc,nocc,nvir))
+        self.ovoo = empty('ovoo', (nocc,nvir,nocc,nocc))
+        self.oovv = empty('oovv', (nocc,nocc,nvir,nvir))
+        self.ovov = empty('ovov', (nocc,nvir,nocc,nvir))
+        self.ovvv = empty('ovvv', (nocc,nvir,nvir_pair))
+        self.oooo[:] = numpy.dot(Loo.T, Loo).reshape(nocc,nocc,nocc,nocc)
+        buf = numpy.dot(Loo.T, Lov).reshape(nocc,nocc,nocc,nvir)
+        self.ooov[:] = buf
+        self.ovoo[:] = buf.transpose(2,3,0,1)
+        self.ovov[:] = numpy.dot(Lov.T, Lov).reshape(nocc,nvir,nocc,nvir)
+        buf = None
+
+# oovv and ovvv of a block of occupied orbitals, reading (L|ab) in aux blocks
+        max_memory = max(0, cc.max_memory - lib.current_memory()[0])
+        occblk = int(max_memory*.5e6/8/(nocc*nvir**2*2 + nvir*nvir_pair))
+        occblk = max(1, min(nocc, occblk))
+        auxblk = max(1, int(max_memory*.4e6/8/nvir_pair))
+        for i0, i1 in ccsd.prange(0, nocc, occblk):
+            ovvv = numpy.zeros(((i1-i0)*nvir,nvir_pair))
+            oovv = numpy.zeros(((i1-i0)*nocc,nvir_pair))
+            for p0, p1 in ccsd.prange(0, naoaux, auxblk):
+                Lvv = numpy.asarray(self.Lvv[p0:p1])
+                ovvv += numpy.dot(self.Lov[p0:p1,i0:i1].reshape(p1-p0,-1).T, Lvv)
+                oovv += numpy.dot(self.Loo[p0:p1,i0:i1].reshape(p1-p0,-1).T, Lvv)
+                Lvv = None
+            self.ovvv[i0:i1] = ovvv.reshape(i1-i0,nvir,nvir_pair)
+            self.oovv[i0:i1] = ccsd.unpack_tril(oovv).reshape(i1-i0,nocc,nvir,nvir)
+            ovvv = oovv = None
+        log.timer_debug1('DF-CCSD integrals', *time0)
+
+    def __del__(self):
+        if hasattr(self, 'feri1'):
+            self.feri1.close()
+
+
+def _add_vvvv_df_(mycc, t1, t2, eris, t2new_tril):
+    '''t2new_tril[ij,a,b] += sum_cd tau[ij,c,d] (ac|bd).  (ac|bd) of a block
+    of a are generated from eris.Lvv and discarded after the contraction.
+    '''
+    time0 = time.clock(), time.time()
+    nocc, nvir = t1.shape
+    npair = nocc*(nocc+1)//2
+    tau = numpy.empty((npair,nvir,nvir), dtype=t1.dtype)
+    p0 = 0
+    for i in range(nocc):
+        tau[p0:p0+i+1] = t2[i,:i+1] \
+                       + numpy.einsum('a,jb->jab', t1[i], t1[:i+1])
+        p0 += i + 1
+    tau = tau.reshape(npair,nvir*nvir)
+    time0 = logger.timer_debug1(mycc, 'vvvv-tau', *time0)
+
+    naoaux = eris.Lvv.shape[0]
+    mem_now = lib.current_memory()[0]
+    max_memory = max(0, mycc.max_memory - mem_now)
+    if naoaux*nvir**2*8/1e6 < max_memory*.4:
+        Lvv = ccsd.unpack_tril(numpy.asarray(eris.Lvv, order='C'))
+        auxblk = naoaux
+        max_memory -= naoaux*nvir**2*8/1e6
+    else:
+        Lvv = None
+        auxblk = max(1, int(max_memory*.4e6/8/nvir**2))
+        max_memory *= .6
+# (ac|bd) and its transposed copy for a block of a
+    blksize = max(1, min(nvir, int(max_memory*.9e6/8/(nvir**3*2))))
+    logger.debug1(mycc, 'DF vvvv, virtual block size %d, aux block size %d',
+                  blksize, auxblk)
+    for p0, p1 in ccsd.prange(0, nvir, blksize):
+        #: vvvv[a,c,b,d] = (ac|bd) for a in [p0:p1]
+        vvvv = numpy.zeros(((p1-p0)*nvir,nvir*nvir), dtype=t1.dtype)
+        for q0, q1 in ccsd.prange(0, naoaux, auxblk):
+            if Lvv is None:
+                buf = ccsd.unpack_tril(numpy.asarray(eris.Lvv[q0:q1], order='C'))
+            else:
+                buf = Lvv
+            vvvv += numpy.dot(buf[:,p0:p1].reshape(q1-q0,-1).T,
+                              buf.reshape(q1-q0,-1))
+            buf = None
+        vvvv = vvvv.reshape(p1-p0,nvir,nvir,nvir).transpose(1,3,0,2)
+        vvvv = numpy.asarray(vvvv, order='C').reshape(nvir*nvir,-1)
+        #: t2new_tril[:,a,b] += numpy.einsum('xcd,acbd->xab', tau, vvvv)
+        t2new_tril[:,p0:p1] += numpy.dot(tau, vvvv).reshape(npair,p1-p0,nvir)
+        vvvv = None
+        time0 = logger.timer_debug1(mycc, 'DF vvvv [%d:%d]'%(p0,p1), *time0)
+    return t2new_tril
+
+
+if __name__ == '__main__':
+    from pyscf import gto
+    from pyscf import scf
+
+    mol = gto.Mole()
+    mol.verbose = 0
+    mol.atom = [
+        [8 , (0. , 0.     , 0.)],
+        [1 , (0. , -0.757 , 0.587)],
+        [1 , (0. , 0.757  , 0.587)]]
+
+    mol.basis = 'cc-pvdz'
+    mol.build()
+    mf = scf.RHF(mol)
+    mf.scf()
+
+    mcc = CCSD(mf)
+    mcc.conv_tol = 1e-12
+    print(mcc.ccsd()[0])
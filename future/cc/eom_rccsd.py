@@ -0,0 +1,552 @@
+#!/usr/bin/env python
+#
+# Author: Qiming Sun <osirpt.sun@gmail.com>
+#
+
+'''
+Spin-adapted EOM-CCSD for RHF reference
+
+EOM-IP (doublets), EOM-EA (doublets) and EOM-EE (singlets).  The
+intermediates of the similarity transformed Hamiltonian are computed once
+(class _IMDS) and shared by all roots, and by the IP, EA and EE solvers if
+the same _IMDS object is passed to them.  The large intermediates Wvvvv,
+Wvvvo and Wvovv are stored on disk when they do not fit in max_memory.
+The sigma vectors of all new trial vectors of a Davidson iteration are
+computed in one pass over the intermediates.  Converged roots are locked.
+
+The excitation operators are
+
+    IP: R = sum_i r1[i] a_{i,beta} + sum_ijb r2[i,j,b] E_{bj} a_{i,beta}
+    EA: R = sum_a r1[a] a^+_{a,alpha} + sum_jab r2[j,a,b] E_{bj} a^+_{a,alpha}
+    EE: R = sum_ia r1[i,a] E_{ai} + 1/2 sum_ijab r2[i,j,a,b] E_{ai} E_{bj}
+
+E_{ai} is the singlet excitation operator.  Spin-orbital intermediates
+follow J. F. Stanton, J. Gauss, J. Chem. Phys. 103, 3561 (1995).
+
+Usage::
+
+    imds = eom_rccsd.make_imds(mycc)
+    eip, vip = eom_rccsd.ipccsd(mycc, nroots=4, imds=imds)
+    eea, vea = eom_rccsd.eaccsd(mycc, nroots=4, imds=imds)
+'''
+
+import time
+import tempfile
+import numpy
+import h5py
+import pyscf.lib as lib
+from pyscf.lib import logger
+import pyscf.ao2mo
+from pyscf.cc import ccsd
+
+einsum = numpy.einsum
+
+
+def ipccsd(mycc, nroots=1, eris=None, imds=None, tol=1e-7, max_cycle=50,
+           max_space=None, verbose=None):
+    '''EOM-IP-CCSD ionization energies and the eigenvectors (r1,r2 packed
+    by :func:`amplitudes_to_vector_ip`)'''
+    if imds is None:
+        imds = make_imds(mycc, eris)
+    imds.make_ip()
+    nocc, nvir = imds.t1.shape
+    foo = imds.Foo.diagonal()
+    fvv = imds.Fvv.diagonal()
+    diag = amplitudes_to_vector_ip(-foo, fvv - foo[:,None,None] - foo[:,None])
+    matvec = lambda xs: ipccsd_matvec(imds, xs)
+    return _kernel(mycc, 'IP', matvec, diag, nroots, None, tol, max_cycle,
+                   max_space, verbose)
+
+def eaccsd(mycc, nroots=1, eris=None, imds=None, tol=1e-7, max_cycle=50,
+           max_space=None, verbose=None):
+    '''EOM-EA-CCSD electron affinities and the eigenvectors (r1,r2 packed
+    by :func:`amplitudes_to_vector_ea`)'''
+    if imds is None:
+        imds = make_imds(mycc, eris)
+    imds.make_ea()
+    foo = imds.Foo.diagonal()
+    fvv = imds.Fvv.diagonal()
+    diag = amplitudes_to_vector_ea(fvv, fvv[:,None] + fvv - foo[:,None,None])
+    matvec = lambda xs: eaccsd_matvec(imds, xs)
+    return _kernel(mycc, 'EA', matvec, diag, nroots, None, tol, max_cycle,
+                   max_space, verbose)
+
+def eeccsd(mycc, nroots=1, eris=None, imds=None, tol=1e-7, max_cycle=50,
+           max_space=None, verbose=None):
+    '''EOM-EE-CCSD singlet excitation energies and the eigenvectors (r1,r2
+    packed by :func:`amplitudes_to_vector_ee`)'''
+    if imds is None:
+        imds = make_imds(mycc, eris)
+    imds.make_ee()
+    nocc, nvir = imds.t1.shape
+    foo = imds.Foo.diagonal()
+    fvv = imds.Fvv.diagonal()
+    eia = fvv - foo[:,None]
+    diag = amplitudes_to_vector_ee(eia, eia[:,None,:,None] + eia[None,:,None,:])
+    # r2[i,j,a,b] = r2[j,i,b,a]; only one of the two elements is used as guess
+    idx = numpy.arange(nocc*nocc*nvir*nvir).reshape(nocc,nocc,nvir,nvir)
+    partner = amplitudes_to_vector_ee(numpy.arange(nocc*nvir),
+                                      idx.transpose(1,0,3,2) + nocc*nvir)
+    matvec = lambda xs: eeccsd_matvec(imds, xs)
+    return _kernel(mycc, 'EE', matvec, diag, nroots, partner, tol, max_cycle,
+                   max_space, verbose)
+
+def _kernel(mycc, label, matvec, diag, nroots, partner, tol, max_cycle,
+            max_space, verbose):
+    cput0 = (time.clock(), time.time())
+    if verbose is None:
+        verbose = mycc.verbose
+    if isinstance(verbose, logger.Logger):
+        log = verbose
+    else:
+        log = logger.Logger(mycc.stdout, verbose)
+    if max_space is None:
+        max_space = nroots * 4 + 10
+
+    guess = []
+    for p in numpy.argsort(diag):
+        if partner is None or partner[p] >= p:
+            x = numpy.zeros_like(diag)
+            x[p] = 1
+            if partner is not None:
+                x[partner[p]] = 1
+            guess.append(x)
+        if len(guess) == nroots:
+            break
+
+    def precond(r, e0, x0):
+        d = diag - e0
+        d[abs(d)<1e-8] = 1e-8
+        return r / d
+
+    conv, e, v = lib.davidson_nosym(matvec, guess, precond, tol=tol,
+                                    max_cycle=max_cycle, max_space=max_space,
+                                    nroots=nroots, verbose=log)
+    for i, ei in enumerate(e):
+        if conv[i]:
+            log.note('EOM-%s-CCSD root %d  E = %.15g', label, i, ei)
+        else:
+            log.warn('EOM-%s-CCSD root %d not converged  E = %.15g',
+                     label, i, ei)
+    log.timer('EOM-%s-CCSD'%label, *cput0)
+    return e, v
+
+
+def make_imds(mycc, eris=None, t1=None, t2=None):
+    if eris is None:
+        eris = mycc.ao2mo()
+    if t1 is None: t1 = mycc.t1
+    if t2 is None: t2 = mycc.t2
+    return _IMDS(mycc, eris, t1, t2)
+
+class _IMDS:
+    '''Intermediates of the similarity transformed Hamiltonian.  The
+    spin-orbital intermediates are represented by the alpha-beta-alpha-beta
+    blocks, e.g.  Woooo[m,n,i,j] = W(m_a n_b i_a j_b).  Wovov[m,b,j,e] is
+    the exchange block -W(m_a b_b e_b j_a) of Wovvo.  All integrals are
+    in Mulliken notation, e.g. Woovv[m,n,e,f] = (me|nf).
+    '''
+    def __init__(self, mycc, eris, t1, t2):
+        self.verbose = mycc.verbose
+        self.stdout = mycc.stdout
+        self.max_memory = mycc.max_memory
+        self.mol = mycc.mol
+        self.eris = eris
+        self.t1 = t1
+        self.t2 = t2
+        self._made_shared = False
+        self._made_ip = False
+        self._made_ea = False
+
+    def _empty(self, key, shape, incore):
+        if incore:
+            return numpy.zeros(shape)
+        else:
+            if not hasattr(self, '_feri'):
+                self._tmpfile = tempfile.NamedTemporaryFile()
+                self._feri = h5py.File(self._tmpfile.name, 'w')
+            return self._feri.create_dataset(key, shape, 'f8')
+
+    def __del__(self):
+        if hasattr(self, '_feri'):
+            self._feri.close()
+
+    def _vblksize(self, unit):
+        mem_now = lib.current_memory()[0]
+        max_memory = max(0, self.max_memory - mem_now)
+        nvir = self.t1.shape[1]
+        return max(1, min(nvir, int(max_memory*.4e6/8/unit)))
+
+    def _make_shared(self):
+        if self._made_shared:
+            return self
+        cput0 = (time.clock(), time.time())
+        log = logger.Logger(self.stdout, self.verbose)
+        t1, t2, eris = self.t1, self.t2, self.eris
+        nocc, nvir = t1.shape
+        fock = eris.fock
+        foo = fock[:nocc,:nocc]
+        fov = fock[:nocc,nocc:]
+        fvv = fock[nocc:,nocc:]
+        ovov = numpy.asarray(eris.ovov)
+        ooov = numpy.asarray(eris.ooov)
+        ovoo = numpy.asarray(eris.ovoo)
+        oovv = numpy.asarray(eris.oovv)
+        oooo = numpy.asarray(eris.oooo)
+        tau = t2 + einsum('ia,jb->ijab', t1, t1)
+        #: Lovov[m,e,n,f] = 2(me|nf) - (mf|ne)
+        Lovov = ovov * 2 - ovov.transpose(0,3,2,1)
+
+        self.Woovv = ovov.transpose(0,2,1,3)
+        self.Fov = fov + einsum('nf,menf->me', t1, Lovov)
+        self.Foo = foo + numpy.dot(fov, t1.T)
+        self.Foo += einsum('ne,mine->mi', t1, ooov*2 - ooov.transpose(2,1,0,3))
+        self.Foo += einsum('inef,menf->mi', tau, Lovov)
+        self.Fvv = fvv - numpy.dot(t1.T, fov)
+        self.Fvv -= einsum('mnaf,menf->ae', tau, Lovov)
+
+        self.Wooov = ooov.transpose(0,2,1,3) + einsum('if,mfne->mnie', t1, ovov)
+        self.Woooo = oooo.transpose(0,2,1,3) + einsum('ijef,menf->mnij', tau, ovov)
+        self.Woooo += einsum('je,mine->mnij', t1, ooov)
+        self.Woooo += einsum('ie,njme->mnij', t1, ooov)
+
+        #: W1ovvo[m,b,e,j] = (me|bj) + sum_nf (2(me|nf)-(mf|ne)) t2[j,n,b,f]
+        #:                 - (me|nf) t2[j,n,f,b]
+        self.W1ovvo = ovov.transpose(0,3,1,2) + einsum('jnbf,menf->mbej', t2, Lovov)
+        self.W1ovvo -= einsum('jnfb,menf->mbej', t2, ovov)
+        #: W1ovov[m,b,j,e] = (mj|be) - sum_nf (mf|ne) t2[j,n,f,b]
+        self.W1ovov = oovv.transpose(0,2,1,3) - einsum('jnfb,mfne->mbje', t2, ovov)
+        self.Wovvo = self.W1ovvo - einsum('nb,menj->mbej', t1, ovoo)
+        self.Wovvo -= einsum('nb,menj->mbej', t1, einsum('jf,menf->menj', t1, ovov))
+        self.Wovov = self.W1ovov - einsum('nb,mjne->mbje', t1, ooov)
+        self.Wovov -= einsum('nb,mjne->mbje', t1, einsum('jf,mfne->mjne', t1, ovov))
+
+        mem_now = lib.current_memory()[0]
+        incore = (nocc*nvir**3*8/1e6 + mem_now < self.max_memory*.5)
+        self.Wvovv = self._empty('Wvovv', (nvir,nocc,nvir,nvir), incore)
+        occblk = self._oblksize()
+        for p0, p1 in ccsd.prange(0, nocc, occblk):
+            ovvv = _unpack_ovvv(eris, p0, p1)
+            #: Fvv[a,e] += sum_mf t1[m,f] (2(mf|ae) - (me|af))
+            self.Fvv += einsum('mf,mfae->ae', t1[p0:p1], ovvv) * 2
+            self.Fvv -= einsum('mf,meaf->ae', t1[p0:p1], ovvv)
+            self.Wovvo[p0:p1] += einsum('jf,mebf->mbej', t1, ovvv)
+            self.Wovov[p0:p1] += einsum('jf,mfbe->mbje', t1, ovvv)
+            #: Wvovv[a,m,e,f] = (ae|mf) - sum_n t1[n,a] (ne|mf)
+            self.Wvovv[:,p0:p1] = ovvv.transpose(2,0,3,1) \
+                    - einsum('na,nemf->amef', t1, ovov[:,:,p0:p1])
+            ovvv = None
+        self._made_shared = True
+        log.timer('EOM-CCSD shared intermediates', *cput0)
+        return self
+
+    def _oblksize(self):
+        nocc, nvir = self.t1.shape
+        mem_now = lib.current_memory()[0]
+        max_memory = max(0, self.max_memory - mem_now)
+        return max(1, min(nocc, int(max_memory*.2e6/8/(nvir**3*2))))
+
+    def make_ip(self):
+        if self._made_ip:
+            return self
+        self._make_shared()
+        cput0 = (time.clock(), time.time())
+        log = logger.Logger(self.stdout, self.verbose)
+        t1, t2, eris = self.t1, self.t2, self.eris
+        nocc, nvir = t1.shape
+        ooov = numpy.asarray(eris.ooov)
+        ovoo = numpy.asarray(eris.ovoo)
+        tau = t2 + einsum('ia,jb->ijab', t1, t1)
+
+        #: Wovoo[m,b,i,j] = (mi|bj) + ...
+        Wovoo = ovoo.transpose(2,1,3,0) + einsum('me,ijeb->mbij', self.Fov, t2)
+        Wovoo -= einsum('nb,mnij->mbij', t1, self.Woooo)
+        Wovoo += einsum('mine,jnbe->mbij', ooov, t2*2 - t2.transpose(1,0,2,3))
+        Wovoo -= einsum('meni,jnbe->mbij', ovoo, t2)
+        Wovoo -= einsum('menj,ineb->mbij', ovoo, t2)
+        Wovoo += einsum('ie,mbej->mbij', t1, self.W1ovvo)
+        Wovoo += einsum('je,mbie->mbij', t1, self.W1ovov)
+        for p0, p1 in ccsd.prange(0, nocc, self._oblksize()):
+            ovvv = _unpack_ovvv(eris, p0, p1)
+            #: Wovoo[m,b,i,j] += sum_ef (me|bf) tau[i,j,e,f]
+            Wovoo[p0:p1] += numpy.dot(ovvv.transpose(0,2,1,3).reshape((p1-p0)*nvir,-1),
+                                      tau.reshape(nocc*nocc,-1).T).reshape(p1-p0,nvir,nocc,nocc)
+            ovvv = None
+        self.Wovoo = Wovoo
+        self._made_ip = True
+        log.timer('EOM-IP-CCSD intermediates', *cput0)
+        return self
+
+    def make_ea(self):
+        if self._made_ea:
+            return self
+        self._make_shared()
+        cput0 = (time.clock(), time.time())
+        log = logger.Logger(self.stdout, self.verbose)
+        t1, t2, eris = self.t1, self.t2, self.eris
+        nocc, nvir = t1.shape
+        ovov = numpy.asarray(eris.ovov)
+        ovoo = numpy.asarray(eris.ovoo)
+        tau = t2 + einsum('ia,jb->ijab', t1, t1)
+        vvvv = self._get_vvvv_source()
+
+        mem_now = lib.current_memory()[0]
+        incore = ((nvir**4+nocc*nvir**3)*8/1e6 + mem_now < self.max_memory*.5)
+        self.Wvvvv = self._empty('Wvvvv', (nvir,nvir,nvir,nvir), incore)
+        self.Wvvvo = self._empty('Wvvvo', (nvir,nvir,nvir,nocc), incore)
+        ovov1 = ovov.transpose(0,2,1,3).reshape(nocc*nocc,-1)
+        t2mix = t2 * 2 - t2.transpose(1,0,2,3)
+        occblk = self._oblksize()
+        blksize = self._vblksize(nvir**3*4 + nocc*nvir**3)
+        log.debug1('Wvvvv, Wvvvo virtual block size %d', blksize)
+        for p0, p1 in ccsd.prange(0, nvir, blksize):
+            #: Wvvvv[a,b,e,f] = (ae|bf) - t1[m,a] (me|bf) - t1[m,b] (mf|ae)
+            #:                + tau[m,n,a,b] (me|nf)
+            w = vvvv(p0, p1).transpose(0,2,1,3)
+            w = numpy.asarray(w, order='C')
+            w += numpy.dot(tau[:,:,p0:p1].reshape(nocc*nocc,-1).T,
+                           ovov1).reshape(p1-p0,nvir,nvir,nvir)
+            #: Wvvvo[a,b,e,i] = (ae|bi) + ...
+            wvo = einsum('meni,mnab->abei', ovoo, tau[:,:,p0:p1])
+            wvo -= einsum('me,miab->abei', self.Fov, t2[:,:,p0:p1])
+            wvo -= einsum('ma,mbei->abei', t1[:,p0:p1], self.W1ovvo)
+            wvo -= einsum('mb,maie->abei', t1, self.W1ovov[:,p0:p1])
+            for q0, q1 in ccsd.prange(0, nocc, occblk):
+                ovvv = _unpack_ovvv(eris, q0, q1)
+                w -= einsum('ma,mebf->abef', t1[q0:q1,p0:p1], ovvv)
+                w -= einsum('mb,mfae->abef', t1[q0:q1], ovvv[:,:,p0:p1])
+                wvo[:,:,:,q0:q1] += ovvv[:,:,p0:p1].transpose(2,1,3,0)
+                #: wvo -= einsum('mebf,miaf->abei', ovvv, t2[q0:q1,:,p0:p1])
+                tmp = numpy.dot(ovvv.transpose(1,2,0,3).reshape(nvir*nvir,-1),
+                                t2[q0:q1,:,p0:p1].transpose(0,3,1,2).reshape((q1-q0)*nvir,-1))
+                wvo -= tmp.reshape(nvir,nvir,nocc,p1-p0).transpose(3,1,0,2)
+                #: wvo -= einsum('meaf,imbf->abei', ovvv[:,:,p0:p1], t2[:,q0:q1])
+                tmp = numpy.dot(ovvv[:,:,p0:p1].transpose(1,2,0,3).reshape(nvir*(p1-p0),-1),
+                                t2[:,q0:q1].transpose(1,3,0,2).reshape((q1-q0)*nvir,-1))
+                wvo -= tmp.reshape(nvir,p1-p0,nocc,nvir).transpose(1,3,0,2)
+                #: wvo += einsum('mfae,imbf->abei', ovvv[:,:,p0:p1], t2mix[:,q0:q1])
+                tmp = numpy.dot(ovvv[:,:,p0:p1].transpose(2,3,0,1).reshape((p1-p0)*nvir,-1),
+                                t2mix[:,q0:q1].transpose(1,3,0,2).reshape((q1-q0)*nvir,-1))
+                wvo += tmp.reshape(p1-p0,nvir,nocc,nvir).transpose(0,3,1,2)
+                ovvv = tmp = None
+            #: wvo += einsum('abef,if->abei', w, t1)
+            wvo += numpy.dot(w.reshape(-1,nvir), t1.T).reshape(p1-p0,nvir,nvir,nocc)
+            self.Wvvvv[p0:p1] = w
+            self.Wvvvo[p0:p1] = wvo
+            w = wvo = None
+            log.debug1('Wvvvv, Wvvvo [%d:%d]', p0, p1)
+        self._made_ea = True
+        log.timer('EOM-EA-CCSD intermediates', *cput0)
+        return self
+
+    def make_ee(self):
+        self.make_ip()
+        self.make_ea()
+        return self
+
+    def _get_vvvv_source(self):
+        '''function(p0,p1) => (ae|bf) as an array [a,e,b,f] for a in [p0:p1]'''
+        eris = self.eris
+        nocc, nvir = self.t1.shape
+        if hasattr(eris, 'Lvv'):
+            naoaux = eris.Lvv.shape[0]
+            def get_vvvv(p0, p1):
+                mem_now = lib.current_memory()[0]
+                max_memory = max(0, self.max_memory - mem_now)
+                auxblk = max(1, int(max_memory*.2e6/8/nvir**2))
+                vvvv = numpy.zeros(((p1-p0)*nvir,nvir*nvir))
+                for q0, q1 in ccsd.prange(0, naoaux, auxblk):
+                    buf = ccsd.unpack_tril(numpy.asarray(eris.Lvv[q0:q1], order='C'))
+                    vvvv += numpy.dot(buf[:,p0:p1].reshape(q1-q0,-1).T,
+                                      buf.reshape(q1-q0,-1))
+                    buf = None
+                return vvvv.reshape(p1-p0,nvir,nvir,nvir)
+            return get_vvvv
+
+        if eris.vvvv is None:
+# The integral-direct CCSD does not store vvvv.  Transform it once here
+            if not hasattr(self, '_vvvvfile'):
+                log = logger.Logger(self.stdout, self.verbose)
+                self._vvvvfile = tempfile.NamedTemporaryFile()
+                orbv = eris.mo_coeff[:,nocc:]
+                pyscf.ao2mo.full(self.mol, orbv, self._vvvvfile.name, verbose=log)
+            vvvv = h5py.File(self._vvvvfile.name, 'r')['eri_mo']
+        else:
+            vvvv = eris.vvvv
+
+        def get_vvvv(p0, p1):
+            e = numpy.arange(nvir)
+            idx = numpy.empty((p1-p0,nvir), dtype=int)
+            for a in range(p0, p1):
+                hi = numpy.maximum(a, e)
+                idx[a-p0] = hi*(hi+1)//2 + numpy.minimum(a, e)
+            uniq, inv = numpy.unique(idx.ravel(), return_inverse=True)
+            buf = numpy.asarray(vvvv[list(uniq)], order='C')
+            buf = ccsd.unpack_tril(buf)
+            return buf[inv].reshape(p1-p0,nvir,nvir,nvir)
+        return get_vvvv
+
+def _unpack_ovvv(eris, p0, p1):
+    '''(me|bf) as an array [m,e,b,f] for m in [p0:p1]'''
+    ovvv = numpy.asarray(eris.ovvv[p0:p1], order='C')
+    nvir = ovvv.shape[1]
+    ovvv = ccsd.unpack_tril(ovvv.reshape((p1-p0)*nvir,-1))
+    return ovvv.reshape(p1-p0,nvir,nvir,nvir)
+
+
+def ipccsd_matvec(imds, xs):
+    '''Sigma vectors of EOM-IP for the list of trial vectors xs'''
+    nocc, nvir = imds.t1.shape
+    nvec = len(xs)
+    r1 = numpy.empty((nvec,nocc))
+    r2 = numpy.empty((nvec,nocc,nocc,nvir))
+    for k, x in enumerate(xs):
+        r1[k], r2[k] = vector_to_amplitudes_ip(x, nocc, nvir)
+
+    Hr1 = -einsum('mi,xm->xi', imds.Foo, r1)
+    Hr1 += einsum('me,xmie->xi', imds.Fov, r2)
+    Hr1 -= einsum('me,xime->xi', imds.Fov, r2) * 2
+    Hr1 += einsum('mnie,xmne->xi', imds.Wooov*2 - imds.Wooov.transpose(1,0,2,3), r2)
+
+    Hr2 = einsum('be,xije->xijb', imds.Fvv, r2)
+    Hr2 -= einsum('mi,xmjb->xijb', imds.Foo, r2)
+    Hr2 -= einsum('mj,ximb->xijb', imds.Foo, r2)
+    Hr2 += einsum('mbij,xm->xijb', imds.Wovoo, r1)
+    Hr2 += einsum('mnij,xmnb->xijb', imds.Woooo, r2)
+    Hr2 -= einsum('mbie,xmje->xijb', imds.Wovov, r2)
+    Hr2 -= einsum('mbje,xime->xijb', imds.Wovov, r2)
+    Hr2 += einsum('mbej,xime->xijb', imds.Wovvo, r2*2 - r2.transpose(0,2,1,3))
+    tmp = einsum('mnef,xmnf->xe', imds.Woovv*2 - imds.Woovv.transpose(1,0,2,3), r2)
+    Hr2 -= einsum('xe,ijeb->xijb', tmp, imds.t2)
+    return [amplitudes_to_vector_ip(Hr1[k], Hr2[k]) for k in range(nvec)]
+
+def eaccsd_matvec(imds, xs):
+    '''Sigma vectors of EOM-EA for the list of trial vectors xs'''
+    nocc, nvir = imds.t1.shape
+    nvec = len(xs)
+    r1 = numpy.empty((nvec,nvir))
+    r2 = numpy.empty((nvec,nocc,nvir,nvir))
+    for k, x in enumerate(xs):
+        r1[k], r2[k] = vector_to_amplitudes_ea(x, nocc, nvir)
+
+    Hr1 = einsum('ac,xc->xa', imds.Fvv, r1)
+    Hr1 += einsum('ld,xlad->xa', imds.Fov, r2*2 - r2.transpose(0,1,3,2))
+
+    Hr2 = einsum('ac,xjcb->xjab', imds.Fvv, r2)
+    Hr2 += einsum('bc,xjac->xjab', imds.Fvv, r2)
+    Hr2 -= einsum('lj,xlab->xjab', imds.Foo, r2)
+    Hr2 += einsum('lbdj,xlad->xjab', imds.Wovvo, r2*2 - r2.transpose(0,1,3,2))
+    Hr2 -= einsum('lbjd,xlad->xjab', imds.Wovov, r2)
+    Hr2 -= einsum('lajd,xldb->xjab', imds.Wovov, r2)
+    tmp = einsum('klcd,xlcd->xk', imds.Woovv*2 - imds.Woovv.transpose(0,1,3,2), r2)
+    Hr2 -= einsum('xk,kjab->xjab', tmp, imds.t2)
+
+    r2T = r2.reshape(nvec*nocc,nvir*nvir)
+    blksize = imds._vblksize(nvir**3*2 + nocc*nvir**2*(nvec+2))
+    for p0, p1 in ccsd.prange(0, nvir, blksize):
+        wvovv = numpy.asarray(imds.Wvovv[p0:p1])
+        Hr1[:,p0:p1] += einsum('alcd,xlcd->xa', wvovv*2 - wvovv.transpose(0,1,3,2), r2)
+        Hr2[:,:,p0:p1] += einsum('abcj,xc->xjab', numpy.asarray(imds.Wvvvo[p0:p1]), r1)
+        #: Hr2[:,:,p0:p1] += einsum('abcd,xjcd->xjab', Wvvvv[p0:p1], r2)
+        wvvvv = numpy.asarray(imds.Wvvvv[p0:p1]).reshape(-1,nvir*nvir)
+        Hr2[:,:,p0:p1] += numpy.dot(r2T, wvvvv.T).reshape(nvec,nocc,p1-p0,nvir)
+        wvovv = wvvvv = None
+    return [amplitudes_to_vector_ea(Hr1[k], Hr2[k]) for k in range(nvec)]
+
+def eeccsd_matvec(imds, xs):
+    '''Sigma vectors of singlet EOM-EE for the list of trial vectors xs'''
+    nocc, nvir = imds.t1.shape
+    nvec = len(xs)
+    t2 = imds.t2
+    r1 = numpy.empty((nvec,nocc,nvir))
+    r2 = numpy.empty((nvec,nocc,nocc,nvir,nvir))
+    for k, x in enumerate(xs):
+        r1[k], r2[k] = vector_to_amplitudes_ee(x, nocc, nvir)
+    r2mix = r2 * 2 - r2.transpose(0,2,1,3,4)
+
+    Hr1 = einsum('ae,xie->xia', imds.Fvv, r1)
+    Hr1 -= einsum('mi,xma->xia', imds.Foo, r1)
+    Hr1 += einsum('me,ximae->xia', imds.Fov, r2mix)
+    Hr1 += einsum('maei,xme->xia', imds.Wovvo*2 - imds.Wovov.transpose(0,1,3,2), r1)
+    Hr1 -= einsum('mnie,xmnae->xia', imds.Wooov*2 - imds.Wooov.transpose(1,0,2,3), r2)
+
+    #: Hr2 = Y[i,j,a,b] + Y[j,i,b,a]
+    Y = einsum('be,xijae->xijab', imds.Fvv, r2)
+    Y -= einsum('mj,ximab->xijab', imds.Foo, r2)
+    tmp = einsum('mnef,xmnbf->xeb', imds.Woovv*2 - imds.Woovv.transpose(1,0,2,3), r2)
+    Y -= einsum('ijae,xeb->xijab', t2, tmp)
+    tmp = einsum('mnef,xjnef->xmj', imds.Woovv*2 - imds.Woovv.transpose(0,1,3,2), r2)
+    Y -= einsum('imab,xmj->xijab', t2, tmp)
+    Y -= einsum('mbij,xma->xijab', imds.Wovoo, r1)
+    tmp = einsum('mnie,xme->xni', imds.Wooov - imds.Wooov.transpose(1,0,2,3)*2, r1)
+    Y += einsum('xni,njab->xijab', tmp, t2)
+    Y += einsum('mbej,ximae->xijab', imds.Wovvo, r2mix)
+    Y -= einsum('mbje,ximae->xijab', imds.Wovov, r2)
+    Y -= einsum('mbie,xmjae->xijab', imds.Wovov, r2)
+    Y += einsum('mnij,xmnab->xijab', imds.Woooo, r2) * .5
+
+    r2T = r2.reshape(nvec*nocc*nocc,nvir*nvir)
+    blksize = imds._vblksize(nvir**3*2 + nocc**2*nvir**2*(nvec+2))
+    for p0, p1 in ccsd.prange(0, nvir, blksize):
+        wvovv = numpy.asarray(imds.Wvovv[p0:p1])
+        Hr1[:,:,p0:p1] += einsum('amef,ximef->xia', wvovv*2 - wvovv.transpose(0,1,3,2), r2)
+        tmp = einsum('amfe,xme->xaf', wvovv*2 - wvovv.transpose(0,1,3,2), r1)
+        Y[:,:,:,p0:p1] += einsum('xaf,ijfb->xijab', tmp, t2)
+        Y[:,:,:,p0:p1] += einsum('abej,xie->xijab', numpy.asarray(imds.Wvvvo[p0:p1]), r1)
+        #: Y[:,:,:,p0:p1] += .5 * einsum('abef,xijef->xijab', Wvvvv[p0:p1], r2)
+        wvvvv = numpy.asarray(imds.Wvvvv[p0:p1]).reshape(-1,nvir*nvir)
+        Y[:,:,:,p0:p1] += numpy.dot(r2T, wvvvv.T).reshape(nvec,nocc,nocc,p1-p0,nvir) * .5
+        wvovv = wvvvv = tmp = None
+    Hr2 = Y + Y.transpose(0,2,1,4,3)
+    return [amplitudes_to_vector_ee(Hr1[k], Hr2[k]) for k in range(nvec)]
+
+
+def amplitudes_to_vector_ip(r1, r2):
+    return numpy.hstack((r1.ravel(), r2.ravel()))
+
+def vector_to_amplitudes_ip(vector, nocc, nvir):
+    r1 = vector[:nocc].copy()
+    r2 = vector[nocc:].reshape(nocc,nocc,nvir).copy()
+    return r1, r2
+
+def amplitudes_to_vector_ea(r1, r2):
+    return numpy.hstack((r1.ravel(), r2.ravel()))
+
+def vector_to_amplitudes_ea(vector, nocc, nvir):
+    r1 = vector[:nvir].copy()
+    r2 = vector[nvir:].reshape(nocc,nvir,nvir).copy()
+    return r1, r2
+
+def amplitudes_to_vector_ee(r1, r2):
+    return numpy.hstack((r1.ravel(), r2.ravel()))
+
+def vector_to_amplitudes_ee(vector, nocc, nvir):
+    nov = nocc * nvir
+    r1 = vector[:nov].reshape(nocc,nvir).copy()
+    r2 = vector[nov:].reshape(nocc,nocc,nvir,nvir).copy()
+    return r1, r2
+
+
+if __name__ == '__main__':
+    from pyscf import gto
+    from pyscf import scf
+
+    mol = gto.Mole()
+    mol.verbose = 0
+    mol.atom = [
+        [8 , (0. , 0.     , 0.)],
+        [1 , (0. , -0.757 , 0.587)],
+        [1 , (0. , 0.757  , 0.587)]]
+
+    mol.basis = 'cc-pvdz'
+    mol.build()
+    mf = scf.RHF(mol)
+    mf.scf()
+
+    mcc = ccsd.CCSD(mf)
+    mcc.conv_tol = 1e-12
+    mcc.ccsd()
+    imds = make_imds(mcc)
+    print(ipccsd(mcc, nroots=3, imds=imds)[0])
+    print(eaccsd(mcc, nroots=3, imds=imds)[0])
+    print(eeccsd(mcc, nroots=3, imds=imds)[0])
@@ -4,6 +4,8 @@
 #         Qiming Sun <osirpt.sun@gmail.com>
 #
 
+import os
+import shutil
 import ctypes
 import _ctypes
 import time
@@ -28,28 +30,44 @@ NUMERICAL_ZERO = 1e-14
 # h2e is the CAS space 2e integrals in  notation # a' -> p # b' -> q # c' -> r
 # d' -> s
 
-def make_a16(h1e, h2e, dms, civec, norb, nelec, link_index=None):
-    dm3 = dms['3']
-    #dm4 = dms['4']
+def _get_f3(h2e, dms, civec, norb, nelec, link_index=None):
     if 'f3ca' in dms and 'f3ac' in dms:
-        f3ca = dms['f3ca']
-        f3ac = dms['f3ac']
+        return dms['f3ca'], dms['f3ac']
+    if isinstance(nelec, (int, numpy.integer)):
+        neleca = nelecb = nelec//2
     else:
-        if isinstance(nelec, (int, numpy.integer)):
-            neleca = nelecb = nelec//2
-        else:
-            neleca, nelecb = nelec
-        if link_index is None:
-            link_indexa = fci.cistring.gen_linkstr_index(range(norb), neleca)
-            link_indexb = fci.cistring.gen_linkstr_index(range(norb), nelecb)
-        else:
-            link_indexa, link_indexb = link_index
-        eri = h2e.transpose(0,2,1,3)
-        f3ca = _contract4pdm('NEVPTkern_cedf_aedf', eri, civec, norb, nelec,
-                             (link_indexa,link_indexb))
-        f3ac = _contract4pdm('NEVPTkern_aedf_ecdf', eri, civec, norb, nelec,
-                             (link_indexa,link_indexb))
+        neleca, nelecb = nelec
+    if link_index is None:
+        link_indexa = fci.cistring.gen_linkstr_index(range(norb), neleca)
+        link_indexb = fci.cistring.gen_linkstr_index(range(norb), nelecb)
+    else:
+        link_indexa, link_indexb = link_index
+    eri = h2e.transpose(0,2,1,3)
+    f3ca = _contract4pdm('NEVPTkern_cedf_aedf', eri, civec, norb, nelec,
+                         (link_indexa,link_indexb))
+    f3ac = _contract4pdm('NEVPTkern_aedf_ecdf', eri, civec, norb, nelec,
+                         (link_indexa,link_indexb))
+    return f3ca, f3ac
+
+# f3ca[r0:r1], f3ac[r0:r1], taken from dms if they were precomputed
+def _get_f3_block(h2e, dms, civec, norb, nelec, r0, r1):
+    if 'f3ca' in dms and 'f3ac' in dms:
+        return numpy.asarray(dms['f3ca'][r0:r1]), numpy.asarray(dms['f3ac'][r0:r1])
+    eri = h2e.transpose(0,2,1,3)
+    f3ca = _contract4pdm_slice('NEVPTkern_cedf_aedf', eri, civec, norb, nelec,
+                               r0, r1)
+    f3ac = _contract4pdm_slice('NEVPTkern_aedf_ecdf', eri, civec, norb, nelec,
+                               r0, r1)
+    return f3ca, f3ac
+
+def make_a16(h1e, h2e, dms, civec, norb, nelec, link_index=None):
+    f3ca, f3ac = _get_f3(h2e, dms, civec, norb, nelec, link_index)
+    return _a16_block(h1e, h2e, numpy.asarray(dms['3']),
+                      numpy.asarray(f3ca), numpy.asarray(f3ac))
 
+# a16[:,:,r0:r1] from the slices dm3[r0:r1], f3ca[r0:r1] and f3ac[r0:r1]
+def _a16_block(h1e, h2e, dm3, f3ca, f3ac):
+    norb = h1e.shape[0]
     a16 = -numpy.einsum('ib,rpqiac->pqrabc', h1e, dm3)
     a16 += numpy.einsum('ia,rpqbic->pqrabc', h1e, dm3)
     a16 -= numpy.einsum('ci,rpqbai->pqrabc', h1e, dm3)
@@ -76,28 +94,15 @@ def make_a16(h1e, h2e, dms, civec, norb, nelec, link_index=None):
     return a16
 
 def make_a22(h1e, h2e, dms, civec, norb, nelec, link_index=None):
-    dm2 = dms['2']
-    dm3 = dms['3']
-    #dm4 = dms['4']
-    if 'f3ca' in dms and 'f3ac' in dms:
-        f3ca = dms['f3ca']
-        f3ac = dms['f3ac']
-    else:
-        if isinstance(nelec, (int, numpy.integer)):
-            neleca = nelecb = nelec//2
-        else:
-            neleca, nelecb = nelec
-        if link_index is None:
-            link_indexa = fci.cistring.gen_linkstr_index(range(norb), neleca)
-            link_indexb = fci.cistring.gen_linkstr_index(range(norb), nelecb)
-        else:
-            link_indexa, link_indexb = link_index
-        eri = h2e.transpose(0,2,1,3)
-        f3ca = _contract4pdm('NEVPTkern_cedf_aedf', eri, civec, norb, nelec,
-                             (link_indexa,link_indexb))
-        f3ac = _contract4pdm('NEVPTkern_aedf_ecdf', eri, civec, norb, nelec,
-                             (link_indexa,link_indexb))
-
+    f3ca, f3ac = _get_f3(h2e, dms, civec, norb, nelec, link_index)
+    return _a22_block(h1e, h2e, numpy.asarray(dms['2']),
+                      numpy.asarray(dms['3']),
+                      numpy.asarray(f3ca), numpy.asarray(f3ac))
+
+# a22[:,:,k0:k1] from the slices dm2[k0:k1], dm3[k0:k1], f3ca[k0:k1] and
+# f3ac[k0:k1]
+def _a22_block(h1e, h2e, dm2, dm3, f3ca, f3ac):
+    norb = h1e.shape[0]
     a22 = -numpy.einsum('pb,kipjac->ijkabc', h1e, dm3)
     a22 -= numpy.einsum('pa,kibjpc->ijkabc', h1e, dm3)
     a22 += numpy.einsum('cp,kibjap->ijkabc', h1e, dm3)
@@ -179,6 +184,24 @@ def make_hdm3(dm1,dm2,dm3,hdm1,hdm2):
     return hdm3
 
 
+# hdm3[p0:p1] from the slice dm3[p0:p1].  dm3[b,q,a,p,c,r] is transformed to
+# dm3[p,a,r,c,q,b] using the hermiticity and the commutator of E^r_c and E^p_a
+def _hdm3_block(dm1,dm2,dm3,hdm1,hdm2,p0,p1):
+    delta = numpy.eye(dm1.shape[0])
+    hdm3 = - numpy.einsum('pb,qrac->pqrabc',delta[p0:p1],hdm2)\
+          - numpy.einsum('br,pqac->pqrabc',delta,hdm2[p0:p1])\
+          + numpy.einsum('bq,prac->pqrabc',delta,hdm2[p0:p1])*2.0\
+          + numpy.einsum('ap,bqcr->pqrabc',delta[:,p0:p1],dm2)*2.0\
+          - numpy.einsum('ap,cr,bq->pqrabc',delta[:,p0:p1],delta,dm1)*4.0\
+          + numpy.einsum('cr,bqap->pqrabc',delta,dm2[:,:,:,p0:p1])*2.0\
+          - numpy.einsum('parcqb->pqrabc',dm3)\
+          - numpy.einsum('cp,raqb->pqrabc',delta[:,p0:p1],dm2)\
+          + numpy.einsum('ar,pcqb->pqrabc',delta,dm2[p0:p1])\
+          + numpy.einsum('ar,pc,bq->pqrabc',delta,delta[p0:p1],dm1)*2.0\
+          - numpy.einsum('ar,bqcp->pqrabc',delta,dm2[:,:,:,p0:p1])
+    return hdm3
+
+
 def make_hdm2(dm1,dm2):
     delta = numpy.eye(dm2.shape[0])
     dm2 = numpy.einsum('ikjl->ijkl',dm2) -numpy.einsum('jk,il->ijkl',delta,dm1)
@@ -212,23 +235,29 @@ def make_k27(h1e,h2e,dm1,dm2):
 
 
 
-def make_a7(h1e,h2e,dm1,dm2,dm3):
+def make_a7(h1e,h2e,dm1,dm2,dm3,blksize=None):
     #This dm2 and dm3 need to be in the form of norm order
-    delta = numpy.eye(dm2.shape[0])
+    norb = dm1.shape[0]
+    delta = numpy.eye(norb)
     # a^+_ia^+_ja_ka^l =  E^i_lE^j_k -\delta_{j,l} E^i_k
     rm2 = numpy.einsum('iljk->ijkl',dm2) - numpy.einsum('ik,jl->ijkl',dm1,delta)
-    # E^{i,j,k}_{l,m,n} = E^{i,j}_{m,n}E^k_l -\delta_{k,m}E^{i,j}_{l,n}- \delta_{k,n}E^{i,j}_{m,l}
-    # = E^i_nE^j_mE^k_l -\delta_{j,n}E^i_mE^k_l -\delta_{k,m}E^{i,j}_{l,n} -\delta_{k,n}E^{i,j}_{m,l}
-    rm3 = numpy.einsum('injmkl->ijklmn',dm3)\
-        - numpy.einsum('jn,imkl->ijklmn',delta,dm2)\
-        - numpy.einsum('km,ijln->ijklmn',delta,rm2)\
-        - numpy.einsum('kn,ijml->ijklmn',delta,rm2)
-
-    a7 = -numpy.einsum('bi,pqia->pqab',h1e,rm2)\
-         -numpy.einsum('ai,pqbi->pqab',h1e,rm2)\
-         -numpy.einsum('kbij,pqkija->pqab',h2e,rm3) \
-         -numpy.einsum('kaij,pqkibj->pqab',h2e,rm3) \
-         -numpy.einsum('baij,pqij->pqab',h2e,rm2)
+    if blksize is None:
+        blksize = norb
+    a7 = numpy.empty((norb,)*4)
+    for p0, p1 in _prange(0, norb, blksize):
+        # E^{i,j,k}_{l,m,n} = E^{i,j}_{m,n}E^k_l -\delta_{k,m}E^{i,j}_{l,n}- \delta_{k,n}E^{i,j}_{m,l}
+        # = E^i_nE^j_mE^k_l -\delta_{j,n}E^i_mE^k_l -\delta_{k,m}E^{i,j}_{l,n} -\delta_{k,n}E^{i,j}_{m,l}
+        rm3 = numpy.einsum('injmkl->ijklmn',numpy.asarray(dm3[p0:p1]))\
+            - numpy.einsum('jn,imkl->ijklmn',delta,dm2[p0:p1])\
+            - numpy.einsum('km,ijln->ijklmn',delta,rm2[p0:p1])\
+            - numpy.einsum('kn,ijml->ijklmn',delta,rm2[p0:p1])
+
+        a7[p0:p1] = -numpy.einsum('bi,pqia->pqab',h1e,rm2[p0:p1])\
+                    -numpy.einsum('ai,pqbi->pqab',h1e,rm2[p0:p1])\
+                    -numpy.einsum('kbij,pqkija->pqab',h2e,rm3) \
+                    -numpy.einsum('kaij,pqkibj->pqab',h2e,rm3) \
+                    -numpy.einsum('baij,pqij->pqab',h2e,rm2[p0:p1])
+        rm3 = None
     return rm2, a7
 
 def make_a9(h1e,h2e,hdm1,hdm2,hdm3):
@@ -253,7 +282,7 @@ def make_a12(h1e,h2e,dm1,dm2,dm3):
     return a12
 
 def make_a13(h1e,h2e,dm1,dm2,dm3):
-    delta = numpy.eye(dm3.shape[0])
+    delta = numpy.eye(h1e.shape[0])
     a13 = -numpy.einsum('ia,qbip->pqab',h1e,dm2)
     a13 += numpy.einsum('pa,qb->pqab',h1e,dm1)*2.0
     a13 += numpy.einsum('bi,qiap->pqab',h1e,dm2)
@@ -295,20 +324,33 @@ def Sr(mc,ci,orbe, dms, eris=None, verbose=None):
         h1e_v = eris['h1eff'][nocc:,ncore:nocc] - numpy.einsum('mbbn->mn',h2e_v)
 
 
+    norb = mc.ncas
+    nvirt = h2e_v.shape[0]
     if hasattr(mc.fcisolver, 'nevpt_intermediate'):
         a16 = mc.fcisolver.nevpt_intermediate('A16',mc.ncas,mc.nelecas,ci)
-    else:
-        a16 = make_a16(h1e,h2e, dms, ci, mc.ncas, mc.nelecas)
-    a17 = make_a17(h1e,h2e,dm2,dm3)
-    a19 = make_a19(h1e,h2e,dm1,dm2)
-
-    ener = numpy.einsum('ipqr,pqrabc,iabc->i',h2e_v,a16,h2e_v)\
-        +  numpy.einsum('ipqr,pqra,ia->i',h2e_v,a17,h1e_v)*2.0\
-        +  numpy.einsum('ip,pa,ia->i',h1e_v,a19,h1e_v)
-
-    norm = numpy.einsum('ipqr,rpqbac,iabc->i',h2e_v,dm3,h2e_v)\
-        +  numpy.einsum('ipqr,rpqa,ia->i',h2e_v,dm2,h1e_v)*2.0\
-        +  numpy.einsum('ip,pa,ia->i',h1e_v,dm1,h1e_v)
+    v2 = h2e_v.reshape(nvirt,-1)
+
+    ener = numpy.einsum('ip,pa,ia->i',h1e_v,make_a19(h1e,h2e,dm1,dm2),h1e_v)
+    norm = numpy.einsum('ip,pa,ia->i',h1e_v,dm1,h1e_v)
+    for s0, s1 in _prange(0, norb, _f3_slabsize(mc, dms)):
+        if not hasattr(mc.fcisolver, 'nevpt_intermediate'):
+            f3ca, f3ac = _get_f3_block(h2e, dms, ci, norb, mc.nelecas, s0, s1)
+        for r0, r1 in _prange(s0, s1, _dm3_blksize(mc)):
+            dm3blk = numpy.asarray(dm3[r0:r1])
+            if hasattr(mc.fcisolver, 'nevpt_intermediate'):
+                a16blk = a16[:,:,r0:r1]
+            else:
+                a16blk = _a16_block(h1e, h2e, dm3blk, f3ca[r0-s0:r1-s0],
+                                    f3ac[r0-s0:r1-s0])
+            a17 = make_a17(h1e,h2e,dm2[r0:r1],dm3blk)
+            v1 = h2e_v[:,:,:,r0:r1].reshape(nvirt,-1)
+            ener += _trace_dot(v1, a16blk.reshape(v1.shape[1],-1), v2)
+            ener += numpy.einsum('ipqr,pqra,ia->i',h2e_v[:,:,:,r0:r1],a17,h1e_v)*2.0
+            a16blk = None
+            dm3blk = dm3blk.transpose(1,2,0,4,3,5).reshape(v1.shape[1],-1)
+            norm += _trace_dot(v1, dm3blk, v2)
+            norm += numpy.einsum('ipqr,rpqa,ia->i',h2e_v[:,:,:,r0:r1],dm2[r0:r1],h1e_v)*2.0
+        f3ca = f3ac = None
 
     return _norm_to_energy(norm, ener, orbe[mc.ncore+mc.ncas:])
 
@@ -336,27 +378,43 @@ def Si(mc, ci, orbe, dms, eris=None, verbose=None):
         h2e_v = eris['ppaa'][ncore:nocc,:ncore].transpose(0,2,1,3)
         h1e_v = eris['h1eff'][ncore:nocc,:ncore]
 
+    norb = mc.ncas
+    ncore = h2e_v.shape[2]
     if hasattr(mc.fcisolver, 'nevpt_intermediate'):
         #mc.fcisolver.make_a22(mc.ncas, state)
         a22 = mc.fcisolver.nevpt_intermediate('A22',mc.ncas,mc.nelecas,ci)
-    else:
-        a22 = make_a22(h1e,h2e, dms, ci, mc.ncas, mc.nelecas)
-    a23 = make_a23(h1e,h2e,dm1,dm2,dm3)
-    a25 = make_a25(h1e,h2e,dm1,dm2)
     delta = numpy.eye(mc.ncas)
-    dm3_h = numpy.einsum('abef,cd->abcdef',dm2,delta)*2\
-            - dm3.transpose(0,1,3,2,4,5)
-    dm2_h = numpy.einsum('ab,cd->abcd',dm1,delta)*2\
-            - dm2.transpose(0,1,3,2)
+    # h2e_v[q,p,i,r] -> v[i,p,q,r]
+    v = h2e_v.transpose(2,1,0,3)
+    v2 = v.reshape(ncore,-1)
     dm1_h = 2*delta- dm1.transpose(1,0)
 
-    ener = numpy.einsum('qpir,pqrabc,baic->i',h2e_v,a22,h2e_v)\
-        +  numpy.einsum('qpir,pqra,ai->i',h2e_v,a23,h1e_v)*2.0\
-        +  numpy.einsum('pi,pa,ai->i',h1e_v,a25,h1e_v)
-
-    norm = numpy.einsum('qpir,rpqbac,baic->i',h2e_v,dm3_h,h2e_v)\
-        +  numpy.einsum('qpir,rpqa,ai->i',h2e_v,dm2_h,h1e_v)*2.0\
-        +  numpy.einsum('pi,pa,ai->i',h1e_v,dm1_h,h1e_v)
+    ener = numpy.einsum('pi,pa,ai->i',h1e_v,make_a25(h1e,h2e,dm1,dm2),h1e_v)
+    norm = numpy.einsum('pi,pa,ai->i',h1e_v,dm1_h,h1e_v)
+    for s0, s1 in _prange(0, norb, _f3_slabsize(mc, dms)):
+        if not hasattr(mc.fcisolver, 'nevpt_intermediate'):
+            f3ca, f3ac = _get_f3_block(h2e, dms, ci, norb, mc.nelecas, s0, s1)
+        for r0, r1 in _prange(s0, s1, _dm3_blksize(mc)):
+            dm3blk = numpy.asarray(dm3[r0:r1])
+            if hasattr(mc.fcisolver, 'nevpt_intermediate'):
+                a22blk = a22[:,:,r0:r1]
+            else:
+                a22blk = _a22_block(h1e, h2e, dm2[r0:r1], dm3blk,
+                                    f3ca[r0-s0:r1-s0], f3ac[r0-s0:r1-s0])
+            a23 = make_a23(h1e,h2e,dm1[r0:r1],dm2[r0:r1],dm3blk)
+            v1 = v[:,:,:,r0:r1].reshape(ncore,-1)
+            ener += _trace_dot(v1, a22blk.reshape(v1.shape[1],-1), v2)
+            ener += numpy.einsum('qpir,pqra,ai->i',h2e_v[:,:,:,r0:r1],a23,h1e_v)*2.0
+            a22blk = None
+
+            dm3_h = numpy.einsum('abef,cd->abcdef',dm2[r0:r1],delta)*2\
+                    - dm3blk.transpose(0,1,3,2,4,5)
+            dm2_h = numpy.einsum('ab,cd->abcd',dm1[r0:r1],delta)*2\
+                    - dm2[r0:r1].transpose(0,1,3,2)
+            dm3_h = dm3_h.transpose(1,2,0,4,3,5).reshape(v1.shape[1],-1)
+            norm += _trace_dot(v1, dm3_h, v2)
+            norm += numpy.einsum('qpir,rpqa,ai->i',h2e_v[:,:,:,r0:r1],dm2_h,h1e_v)*2.0
+        f3ca = f3ac = None
 
     return _norm_to_energy(norm, ener, -orbe[:mc.ncore])
 
@@ -465,7 +523,7 @@ def Srs(mc,orbe, dms, eris=None, verbose=None):
         h2e_v = eris['papa'][nocc:,:,nocc:].transpose(0,2,1,3)
 
 # a7 is very sensitive to the accuracy of HF orbital and CI wfn
-    rm2, a7 = make_a7(h1e,h2e,dm1,dm2,dm3)
+    rm2, a7 = make_a7(h1e,h2e,dm1,dm2,dm3,_dm3_blksize(mc))
     norm = 0.5*numpy.einsum('rsqp,rsba,pqba->rs',h2e_v,h2e_v,rm2)
     h = 0.5*numpy.einsum('rsqp,rsba,pqab->rs',h2e_v,h2e_v,a7)
     diff = orbe[mc.ncore+mc.ncas:,None] + orbe[None,mc.ncore+mc.ncas:]
@@ -499,13 +557,17 @@ def Sij(mc,orbe, dms, eris, verbose=None):
         hdm2 = dms['h2']
     else:
         hdm2 = make_hdm2(dm1,dm2)
-    if 'h3' in dms:
-        hdm3 = dms['h3']
-    else:
-        hdm3 = make_hdm3(dm1,dm2,dm3,hdm1,hdm2)
 
 # a9 is very sensitive to the accuracy of HF orbital and CI wfn
-    a9 = make_a9(h1e,h2e,hdm1,hdm2,hdm3)
+    norb = mc.ncas
+    a9 = numpy.empty((norb,)*4)
+    for p0, p1 in _prange(0, norb, _dm3_blksize(mc)):
+        if 'h3' in dms:
+            hdm3 = numpy.asarray(dms['h3'][p0:p1])
+        else:
+            hdm3 = _hdm3_block(dm1,dm2,numpy.asarray(dm3[p0:p1]),hdm1,hdm2,p0,p1)
+        a9[p0:p1] = make_a9(h1e,h2e,hdm1,hdm2[p0:p1],hdm3)
+        hdm3 = None
     norm = 0.5*numpy.einsum('qpij,baij,pqab->ij',h2e_v,h2e_v,hdm2)
     h = 0.5*numpy.einsum('qpij,baij,pqab->ij',h2e_v,h2e_v,a9)
     diff = orbe[:mc.ncore,None] + orbe[None,:mc.ncore]
@@ -545,8 +607,14 @@ def Sir(mc,orbe, dms, eris, verbose=None):
          - numpy.einsum('rpqi,ri,qp->ir',h2e_v2,h1e_v,dm1)*2.0\
          + numpy.einsum('ri,ri->ir',h1e_v,h1e_v)*2.0
 
-    a12 = make_a12(h1e,h2e,dm1,dm2,dm3)
-    a13 = make_a13(h1e,h2e,dm1,dm2,dm3)
+    norb = mc.ncas
+    a12 = numpy.empty((norb,)*4)
+    a13 = numpy.empty((norb,)*4)
+    for q0, q1 in _prange(0, norb, _dm3_blksize(mc)):
+        dm3blk = numpy.asarray(dm3[q0:q1])
+        a12[:,q0:q1] = make_a12(h1e,h2e,dm1,dm2[q0:q1],dm3blk)
+        a13[:,q0:q1] = make_a13(h1e,h2e,dm1[q0:q1],dm2[q0:q1],dm3blk)
+        dm3blk = None
 
     h = numpy.einsum('rpiq,raib,pqab->ir',h2e_v1,h2e_v1,a12)*2.0\
          - numpy.einsum('rpiq,rabi,pqab->ir',h2e_v1,h2e_v2,a12)\
@@ -560,8 +628,17 @@ def Sir(mc,orbe, dms, eris, verbose=None):
 def kernel(mc, *args, **kwargs):
     return sc_nevpt(mc, *args, **kwargs)
 
-def sc_nevpt(mc, ci=None, useMPS=False, verbose=None):
-    '''Strongly contracted NEVPT2'''
+def sc_nevpt(mc, ci=None, useMPS=False, verbose=None, nproc=1):
+    '''Strongly contracted NEVPT2
+
+    Kwargs:
+        nproc : int
+            When nproc > 1, the eight perturber subspaces are evaluated on a
+            pool of nproc processes.  The integrals and RDMs are shared with
+            the workers through memory-mapped files.  The processes are not
+            forked (see :func:`pyscf.lib.process_pool`), the calling script
+            needs the "if __name__ == '__main__':" guard.
+    '''
     if ci==None:
         ci=mc.ci
     #mc.cas_natorb(ci=ci)
@@ -575,6 +652,7 @@ def sc_nevpt(mc, ci=None, useMPS=False, verbose=None):
     #dm1, dm2, dm3, dm4 = fci.rdm.make_dm1234('FCI4pdm_kern_sf',
     #                                         mc.ci, mc.ci, mc.ncas, mc.nelecas)
     logger.debug(mc, 'mc.fcisolver = %s', type(mc.fcisolver))
+    dm3_outcore = False
 
     if hasattr(mc.fcisolver, 'nevpt_intermediate'):
         logger.info(mc, 'DMRG-NEVPT')
@@ -583,8 +661,18 @@ def sc_nevpt(mc, ci=None, useMPS=False, verbose=None):
         if useMPS:
             logger.error(mc,"MPS nevpt only used for DMRG calculation")
             exit()
-        dm1, dm2, dm3 = fci.rdm.make_dm123('FCI3pdm_kern_sf',
-                                           ci, ci, mc.ncas, mc.nelecas)
+        if not _dm3_outcore(mc):
+            dm1, dm2, dm3 = fci.rdm.make_dm123('FCI3pdm_kern_sf',
+                                               ci, ci, mc.ncas, mc.nelecas)
+        else:
+            # Neither dm3 nor the dm4-integral contractions are stored.  The
+            # Sr, Si, ... subspaces generate the slices of dm3, f3ca and f3ac
+            # block by block when they need them.
+            log.debug('dm3, f3ca and f3ac are generated slice by slice')
+            dm3_outcore = True
+            dm1, dm2 = fci.direct_spin1.make_rdm12(ci, mc.ncas, mc.nelecas,
+                                                   reorder=False)
+            dm3 = _DM3Slices(ci, mc.ncas, mc.nelecas)
     dm4 = None
 
     #hdm1 = make_hdm1(dm1)
@@ -602,7 +690,8 @@ def sc_nevpt(mc, ci=None, useMPS=False, verbose=None):
 
 
 
-    if not hasattr(mc.fcisolver, 'nevpt_intermediate'):  # regular FCI solver
+    # regular FCI solver
+    if not hasattr(mc.fcisolver, 'nevpt_intermediate') and not dm3_outcore:
         link_indexa = fci.cistring.gen_linkstr_index(range(mc.ncas), mc.nelecas[0])
         link_indexb = fci.cistring.gen_linkstr_index(range(mc.ncas), mc.nelecas[1])
         aaaa = eris['ppaa'][mc.ncore:nocc,mc.ncore:nocc].copy()
@@ -619,41 +708,52 @@ def sc_nevpt(mc, ci=None, useMPS=False, verbose=None):
     orbe = mc.get_fock(ci=ci,eris=fake_eris).diagonal()
     fake_eris = None
 
-    if useMPS:
-        fh5 = h5py.File('Perturbation_%d'%ci,'r')
-        e_Si     =   fh5['Vi/energy'].value    
-        norm_Si  =   fh5['Vi/norm'].value       
-        e_Sr     =   fh5['Vr/energy'].value     
-        norm_Sr  =   fh5['Vr/norm'].value       
-        fh5.close()
-        logger.note(mc, "Sr    (-1)', Norm = %.14f  E = %.14f", norm_Sr  , e_Sr  )
-        logger.note(mc, "Si    (+1)', Norm = %.14f  E = %.14f", norm_Si  , e_Si  )
-
+    if nproc > 1 and not useMPS and not hasattr(mc.fcisolver, 'nevpt_intermediate'):
+        res = _parallel_subspaces(mc, ci, orbe, dms, eris, nproc, log)
+        for key, label in _SUBSPACES:
+            logger.note(mc, "%s, Norm = %.14f  E = %.14f", label, *res[key][:2])
+        log.info('%-6s %12s %12s', 'space', 'CPU time/s', 'wall time/s')
+        for key, label in _SUBSPACES:
+            log.info('%-6s %12.2f %12.2f', key, *res[key][2:])
+        e_Sr, e_Si, e_Sijrs, e_Sijr, e_Srsi, e_Srs, e_Sij, e_Sir = \
+                [res[key][1] for key, label in _SUBSPACES]
+        time1 = log.timer('subspaces on %d processes' % nproc, *time1)
     else:
-        norm_Sr   , e_Sr    = Sr(mc,ci,orbe, dms, eris)
-        logger.note(mc, "Sr    (-1)', Norm = %.14f  E = %.14f", norm_Sr  , e_Sr  )
-        time1 = log.timer("space Sr (-1)'", *time1)
-        norm_Si   , e_Si    = Si(mc,ci,orbe, dms, eris)
-        logger.note(mc, "Si    (+1)', Norm = %.14f  E = %.14f", norm_Si  , e_Si  )
-        time1 = log.timer("space Si (+1)'", *time1)
-    norm_Sijrs, e_Sijrs = Sijrs(mc,orbe, eris)
-    logger.note(mc, "Sijrs (0)  , Norm = %.14f  E = %.14f", norm_Sijrs,e_Sijrs)
-    time1 = log.timer('space Sijrs (0)', *time1)
-    norm_Sijr , e_Sijr  = Sijr(mc,orbe, dms, eris)
-    logger.note(mc, "Sijr  (+1) , Norm = %.14f  E = %.14f", norm_Sijr, e_Sijr)
-    time1 = log.timer('space Sijr (+1)', *time1)
-    norm_Srsi , e_Srsi  = Srsi(mc,orbe, dms, eris)
-    logger.note(mc, "Srsi  (-1) , Norm = %.14f  E = %.14f", norm_Srsi, e_Srsi)
-    time1 = log.timer('space Srsi (-1)', *time1)
-    norm_Srs  , e_Srs   = Srs(mc,orbe, dms, eris)
-    logger.note(mc, "Srs   (-2) , Norm = %.14f  E = %.14f", norm_Srs , e_Srs )
-    time1 = log.timer('space Srs (-2)', *time1)
-    norm_Sij  , e_Sij   = Sij(mc,orbe, dms, eris)
-    logger.note(mc, "Sij   (+2) , Norm = %.14f  E = %.14f", norm_Sij , e_Sij )
-    time1 = log.timer('space Sij (+2)', *time1)
-    norm_Sir  , e_Sir   = Sir(mc,orbe, dms, eris)
-    logger.note(mc, "Sir   (0)' , Norm = %.14f  E = %.14f", norm_Sir , e_Sir )
-    time1 = log.timer("space Sir (0)'", *time1)
+        if useMPS:
+            fh5 = h5py.File('Perturbation_%d'%ci,'r')
+            e_Si     =   fh5['Vi/energy'].value    
+            norm_Si  =   fh5['Vi/norm'].value       
+            e_Sr     =   fh5['Vr/energy'].value     
+            norm_Sr  =   fh5['Vr/norm'].value       
+            fh5.close()
+            logger.note(mc, "Sr    (-1)', Norm = %.14f  E = %.14f", norm_Sr  , e_Sr  )
+            logger.note(mc, "Si    (+1)', Norm = %.14f  E = %.14f", norm_Si  , e_Si  )
+
+        else:
+            norm_Sr   , e_Sr    = Sr(mc,ci,orbe, dms, eris)
+            logger.note(mc, "Sr    (-1)', Norm = %.14f  E = %.14f", norm_Sr  , e_Sr  )
+            time1 = log.timer("space Sr (-1)'", *time1)
+            norm_Si   , e_Si    = Si(mc,ci,orbe, dms, eris)
+            logger.note(mc, "Si    (+1)', Norm = %.14f  E = %.14f", norm_Si  , e_Si  )
+            time1 = log.timer("space Si (+1)'", *time1)
+        norm_Sijrs, e_Sijrs = Sijrs(mc,orbe, eris)
+        logger.note(mc, "Sijrs (0)  , Norm = %.14f  E = %.14f", norm_Sijrs,e_Sijrs)
+        time1 = log.timer('space Sijrs (0)', *time1)
+        norm_Sijr , e_Sijr  = Sijr(mc,orbe, dms, eris)
+        logger.note(mc, "Sijr  (+1) , Norm = %.14f  E = %.14f", norm_Sijr, e_Sijr)
+        time1 = log.timer('space Sijr (+1)', *time1)
+        norm_Srsi , e_Srsi  = Srsi(mc,orbe, dms, eris)
+        logger.note(mc, "Srsi  (-1) , Norm = %.14f  E = %.14f", norm_Srsi, e_Srsi)
+        time1 = log.timer('space Srsi (-1)', *time1)
+        norm_Srs  , e_Srs   = Srs(mc,orbe, dms, eris)
+        logger.note(mc, "Srs   (-2) , Norm = %.14f  E = %.14f", norm_Srs , e_Srs )
+        time1 = log.timer('space Srs (-2)', *time1)
+        norm_Sij  , e_Sij   = Sij(mc,orbe, dms, eris)
+        logger.note(mc, "Sij   (+2) , Norm = %.14f  E = %.14f", norm_Sij , e_Sij )
+        time1 = log.timer('space Sij (+2)', *time1)
+        norm_Sir  , e_Sir   = Sir(mc,orbe, dms, eris)
+        logger.note(mc, "Sir   (0)' , Norm = %.14f  E = %.14f", norm_Sir , e_Sir )
+        time1 = log.timer("space Sir (0)'", *time1)
 
     nevpt_e  = e_Sr + e_Si + e_Sijrs + e_Sijr + e_Srsi + e_Srs + e_Sij + e_Sir
     logger.note(mc, "Nevpt2 Energy = %.15f", nevpt_e)
@@ -661,6 +761,95 @@ def sc_nevpt(mc, ci=None, useMPS=False, verbose=None):
     return nevpt_e
 
 
+# Subspaces in the order of their contributions to the total energy, and the
+# labels used in the output
+_SUBSPACES = (('Sr'   , "Sr    (-1)'"),
+              ('Si'   , "Si    (+1)'"),
+              ('Sijrs', "Sijrs (0)  "),
+              ('Sijr' , "Sijr  (+1) "),
+              ('Srsi' , "Srsi  (-1) "),
+              ('Srs'  , "Srs   (-2) "),
+              ('Sij'  , "Sij   (+2) "),
+              ('Sir'  , "Sir   (0)' "))
+
+class _MCAttrs(object):
+    '''The attributes of the CASCI/CASSCF object which are required by the
+    subspace functions when the integrals are given.  It is sent to the worker
+    processes in place of the (unpicklable) mc object.
+    '''
+    def __init__(self, mc, mo_coeff):
+        self.ncore = mc.ncore
+        self.ncas = mc.ncas
+        self.nelecas = mc.nelecas
+        self.max_memory = mc.max_memory
+        self.verbose = mc.verbose
+        self.mo_coeff = mo_coeff
+        self.fcisolver = None
+
+def _save_mmap(tmpdir, key, a):
+    '''Save array to a .npy file which can be memory-mapped by the workers.
+    The on-the-fly dm3 is sent as it is, files produced by ao2mo are passed by
+    their names.'''
+    if a is None:
+        return None
+    elif isinstance(a, numpy.ndarray):
+        fname = os.path.join(tmpdir, key+'.npy')
+        numpy.save(fname, a)
+        return fname
+    elif isinstance(a, _DM3Slices):
+        return a
+    else:  # tempfile
+        return a.name
+
+def _load_mmap(fname):
+    if isinstance(fname, str) and fname.endswith('.npy'):
+        return numpy.load(fname, mmap_mode='r')
+    else:
+        return fname
+
+def _subspace_task(args):
+    key, mc, ci, orbe, dmsfile, erisfile = args
+    t0 = (time.clock(), time.time())
+    mc.mo_coeff = _load_mmap(mc.mo_coeff)
+    dms = dict([(k, _load_mmap(v)) for k, v in dmsfile.items()])
+    eris = dict([(k, _load_mmap(v)) for k, v in erisfile.items()])
+    if key in ('Sr', 'Si'):
+        norm, e = globals()[key](mc, ci, orbe, dms, eris)
+    elif key == 'Sijrs':
+        norm, e = Sijrs(mc, orbe, eris)
+    else:
+        norm, e = globals()[key](mc, orbe, dms, eris)
+    return key, norm, e, time.clock()-t0[0], time.time()-t0[1]
+
+def _parallel_subspaces(mc, ci, orbe, dms, eris, nproc, verbose=None):
+    '''Evaluate the eight subspaces on a pool of nproc processes.  Returns a
+    dict of (norm, e, cpu_time, wall_time) for each subspace.  The workers
+    are not forked, see pyscf.lib.process_pool.'''
+    if isinstance(verbose, logger.Logger):
+        log = verbose
+    else:
+        log = logger.Logger(mc.stdout, mc.verbose)
+    tmpdir = tempfile.mkdtemp()
+    try:
+        dmsfile = dict([(k, _save_mmap(tmpdir, 'dm'+k, v))
+                        for k, v in dms.items()])
+        erisfile = dict([(k, _save_mmap(tmpdir, k, v))
+                         for k, v in eris.items()])
+        mcattrs = _MCAttrs(mc, _save_mmap(tmpdir, 'mo_coeff', mc.mo_coeff))
+        log.debug('integrals and RDMs are memory-mapped from %s', tmpdir)
+        tasks = [(key, mcattrs, ci, orbe, dmsfile, erisfile)
+                 for key, label in _SUBSPACES]
+        pool = pyscf.lib.process_pool(min(nproc, len(tasks)))
+        try:
+            res = pool.map(_subspace_task, tasks, chunksize=1)
+        finally:
+            pool.close()
+            pool.join()
+    finally:
+        shutil.rmtree(tmpdir)
+    return dict([(r[0], r[1:]) for r in res])
+
+
 def _contract4pdm(kern, eri, civec, norb, nelec, link_index=None):
     if isinstance(nelec, (int, numpy.integer)):
         neleca = nelecb = nelec//2
@@ -694,6 +883,97 @@ def _contract4pdm(kern, eri, civec, norb, nelec, link_index=None):
             fdm3[j,:,i,j] -= fdm2[i,:]
     return fdm3
 
+def _contract4pdm_slice(kern, eri, civec, norb, nelec, p0, p1, link_index=None):
+    '''The slice [p0:p1] of the first index of _contract4pdm'''
+    if isinstance(nelec, (int, numpy.integer)):
+        neleca = nelecb = nelec//2
+    else:
+        neleca, nelecb = nelec
+    if link_index is None:
+        link_indexa = fci.cistring.gen_linkstr_index(range(norb), neleca)
+        link_indexb = fci.cistring.gen_linkstr_index(range(norb), nelecb)
+    else:
+        link_indexa, link_indexb = link_index
+    na,nlinka = link_indexa.shape[:2]
+    nb,nlinkb = link_indexb.shape[:2]
+    fdm2 = numpy.empty((norb,norb,norb,norb))
+    fdm3 = numpy.empty((p1-p0,norb,norb,norb,norb,norb))
+    eri = numpy.ascontiguousarray(eri)
+    civec = numpy.asarray(civec, order='C')
+
+    libmc.NEVPTcontract_slice(ctypes.c_void_p(_ctypes.dlsym(libmc._handle, kern)),
+                              fdm2.ctypes.data_as(ctypes.c_void_p),
+                              fdm3.ctypes.data_as(ctypes.c_void_p),
+                              eri.ctypes.data_as(ctypes.c_void_p),
+                              civec.ctypes.data_as(ctypes.c_void_p),
+                              ctypes.c_int(p0), ctypes.c_int(p1),
+                              ctypes.c_int(norb),
+                              ctypes.c_int(na), ctypes.c_int(nb),
+                              ctypes.c_int(nlinka), ctypes.c_int(nlinkb),
+                              link_indexa.ctypes.data_as(ctypes.c_void_p),
+                              link_indexb.ctypes.data_as(ctypes.c_void_p))
+    for i in range(p0, p1):
+        for j in range(p0, i):
+            fdm3[j-p0,:,i] = fdm3[i-p0,:,j].transpose(1,0,2,3)
+            fdm3[j-p0,i,i,:] += fdm2[j,:]
+            fdm3[j-p0,:,i,j] -= fdm2[i,:]
+    return fdm3
+
+def _prange(start, end, step):
+    for i in range(start, end, step):
+        yield i, min(i+step, end)
+
+# dm3, f3ca and f3ac are kept in memory if they take less than half of
+# max_memory
+def _dm3_outcore(mc):
+    return mc.ncas**6*8*3/1e6 > mc.max_memory*.5
+
+class _DM3Slices(object):
+    '''The spin-traced 3-pdm (in the storage of fci.rdm.make_dm123) which is
+    not held in memory.  dm3[p0:p1] generates the slices p0:p1 from the CI
+    vector.
+    '''
+    def __init__(self, civec, norb, nelec):
+        self.civec = civec
+        self.norb = norb
+        self.nelec = nelec
+        self.shape = (norb,) * 6
+
+    def __getitem__(self, s):
+        p0, p1 = s.indices(self.norb)[:2]
+        dm3 = numpy.empty((p1-p0,)+self.shape[1:])
+        for p, dm3p in fci.rdm.make_dm3_slices(self.civec, self.norb,
+                                               self.nelec, p0=p0, p1=p1):
+            dm3[p-p0] = dm3p
+        return dm3
+
+# Number of f3ca/f3ac slices computed in one pass over the CI vector.  t2ket
+# and gt2 are rebuilt in every pass, so the slab is as large as half of the
+# free memory allows.  Slabs are cut into _dm3_blksize blocks by the callers.
+def _f3_slabsize(mc, dms):
+    norb = mc.ncas
+    if (('f3ca' in dms and 'f3ac' in dms) or
+        hasattr(mc.fcisolver, 'nevpt_intermediate')):
+        return norb
+    max_memory = mc.max_memory - pyscf.lib.current_memory()[0]
+    slabsize = int(max_memory*.5e6/8/(norb**5*2))
+    return max(1, min(norb, slabsize))
+
+def _dm3_blksize(mc):
+    '''Number of dm3 slices (of the first index) to process at once.  The
+    norb^6 intermediates (a16, a22, hdm3, ...) and the slices of dm3, f3ca
+    and f3ac are only built for one block of the first index, ~12 such
+    blocks are alive in the einsum.
+    '''
+    norb = mc.ncas
+    max_memory = mc.max_memory - pyscf.lib.current_memory()[0]
+    blksize = int(max_memory*1e6/8/(norb**5*12))
+    return max(1, min(norb, blksize))
+
+# sum_xy v1[i,x] a[x,y] v2[i,y]
+def _trace_dot(v1, a, v2):
+    return numpy.einsum('ix,ix->i', numpy.dot(v1, a), v2)
+
 def _extract_orbs(mc, mo_coeff):
     ncore = mc.ncore
     ncas = mc.ncas
@@ -89,6 +89,42 @@ class KnowValues(unittest.TestCase):
         e = nevpt2.sc_nevpt(mc)
         self.assertAlmostEqual(e, -0.1031531038976489, 7)
 
+    def test_energy_dm3_outcore(self):
+        mc1 = mcscf.CASCI(mf, norb, nelec)
+        mc1.fcisolver.conv_tol = 1e-15
+        mc1.kernel()
+        mc1.max_memory = 1
+        e = nevpt2.sc_nevpt(mc1)
+        self.assertAlmostEqual(e, -0.1031531038976489, 7)
+
+    def test_dm3_blocks(self):
+        ref = (nevpt2.Sr(mc, mc.ci, orbe, dms, eris),
+               nevpt2.Si(mc, mc.ci, orbe, dms, eris))
+        mc1 = mcscf.CASCI(mf, norb, nelec)
+        mc1.fcisolver.conv_tol = 1e-15
+        mc1.kernel()
+        mc1.max_memory = 1
+        dm3_blksize = nevpt2._dm3_blksize
+        f3_slabsize = nevpt2._f3_slabsize
+        try:
+            nevpt2._dm3_blksize = lambda mc: 4
+            nevpt2._f3_slabsize = lambda mc, dms: 5
+            norm, e = nevpt2.Sr(mc, mc.ci, orbe, dms, eris)
+            self.assertAlmostEqual(norm, ref[0][0], 9)
+            self.assertAlmostEqual(e, ref[0][1], 9)
+            norm, e = nevpt2.Si(mc, mc.ci, orbe, dms, eris)
+            self.assertAlmostEqual(norm, ref[1][0], 9)
+            self.assertAlmostEqual(e, ref[1][1], 9)
+            e = nevpt2.sc_nevpt(mc1)
+            self.assertAlmostEqual(e, -0.1031531038976489, 7)
+        finally:
+            nevpt2._dm3_blksize = dm3_blksize
+            nevpt2._f3_slabsize = f3_slabsize
+
+    def test_energy_nproc(self):
+        e = nevpt2.sc_nevpt(mc, nproc=3)
+        self.assertAlmostEqual(e, -0.1031531038976489, 7)
+
     def test_energy1(self):
         mol = gto.M(
             verbose = 0,
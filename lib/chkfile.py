@@ -61,7 +61,8 @@ def dump(chkfile, key, value):
 
         value : array, vector ... or dict
             If value is a python dict, the key/value of the dict will be saved
-            recursively as the HDF5 group/dataset
+            recursively as the HDF5 group/dataset.  An h5py dataset is copied
+            to chkfile without being read into memory.
 
     Returns:
         No return value
@@ -87,6 +88,8 @@ def dump(chkfile, key, value):
             root1 = root.create_group(key)
             for k in value:
                 saveasgroup(k, value[k], root1)
+        elif isinstance(value, h5py.Dataset):
+            root.copy(value, key)
         else:
             root[key] = value
     if h5py.is_hdf5(chkfile):
@@ -186,6 +186,44 @@ class DIIS(object):
     def get_num_vec(self):
         return len(self._bookkeep)
 
+    def snapshot(self):
+        '''The DIIS subspace as a dict which can be saved with
+        lib.chkfile.dump and loaded by :func:`restore`.  The vectors in
+        memory are not copied.  The vectors stored in the DIIS HDF5 file are
+        returned as h5py datasets, which lib.chkfile.dump copies file to file.
+        '''
+        state = {'head': self._head,
+                 'bookkeep': numpy.asarray(self._bookkeep, dtype=int),
+                 'err_vec_touched': self._err_vec_touched}
+        if self._H is not None:
+            state['H'] = self._H.copy()
+        if self._xprev is not None:
+            state['xprev'] = self._xprev
+        for i in range(self.get_num_vec()):
+            state['x%d'%i] = self.get_vec(i)
+            state['e%d'%i] = self.get_err_vec(i)
+        return state
+
+    def restore(self, state):
+        '''Restore the DIIS subspace from the dict generated by
+        :func:`snapshot`'''
+        self._buffer = {}
+        self._bookkeep = [int(i) for i in state['bookkeep']]
+        self._head = int(state['head'])
+        self._err_vec_touched = bool(state['err_vec_touched'])
+        if 'H' in state and state['H'] is not None:
+            self._H = numpy.array(state['H'])
+        else:
+            self._H = None
+        if 'xprev' in state and state['xprev'] is not None:
+            self._xprev = numpy.asarray(state['xprev'])
+        else:
+            self._xprev = None
+        for i in range(self.get_num_vec()):
+            self._store('x%d'%i, numpy.asarray(state['x%d'%i]).ravel())
+            self._store('e%d'%i, numpy.asarray(state['e%d'%i]).ravel())
+        return self
+
     def update(self, x, xerr=None):
         '''Extrapolate vector 
 
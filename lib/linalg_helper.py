@@ -256,6 +256,166 @@ eigh = davidson
 dsyev = davidson
 
 
+def davidson_nosym(aop, x0, precond, tol=1e-12, max_cycle=50, max_space=20,
+                   lindep=1e-14, nroots=1, verbose=logger.WARN):
+    '''Block Davidson method for the lowest eigenvalues of a real
+    non-Hermitian matrix.  The eigenvalues are sorted by their real part.
+
+    Args:
+        aop : function(xs) => list of array_like_x
+            aop(xs) to mimic the matrix multiplication on a list of 1D arrays.
+            It is called once per iteration with all new trial vectors of
+            the iteration.
+        x0 : 1D array or a list of 1D arrays
+            Initial guess
+        precond : function(dx, e, x0) => array_like_dx
+            Preconditioner to generate new trial vector.
+
+    Kwargs:
+        tol : float
+            Convergence tolerance of eigenvalues.  The residual norm of a
+            converged root is less than sqrt(tol).
+        max_cycle : int
+            max number of iterations.
+        max_space : int
+            space size to hold trial vectors.  When exceeded, the subspace
+            is collapsed to the current eigenvectors.
+        lindep : float
+            Linear dependency threshold to drop new trial vectors.
+        nroots : int
+            Number of eigenvalues to be computed.
+
+    Converged roots are locked: their residuals are not expanded into new
+    trial vectors, so the cost of one iteration is proportional to the
+    number of roots not yet converged.  Complex eigenvalues cannot be solved
+    with real trial vectors.  A warning is given and their real parts are
+    returned, unconverged.
+
+    Returns:
+        conv : list of bools
+        e : 1D array of nroots eigenvalues
+        c : list of nroots eigenvectors
+
+    Examples:
+
+    >>> from pyscf import lib
+    >>> a = numpy.random.random((50,50)) + numpy.diag(numpy.arange(50.))
+    >>> aop = lambda xs: [numpy.dot(a,x) for x in xs]
+    >>> precond = lambda dx, e, x0: dx/(a.diagonal()-e)
+    >>> conv, e, c = lib.davidson_nosym(aop, numpy.eye(50)[:3], precond, nroots=3)
+    '''
+    if isinstance(verbose, logger.Logger):
+        log = verbose
+    else:
+        log = logger.Logger(sys.stdout, verbose)
+
+    if isinstance(x0, numpy.ndarray) and x0.ndim == 1:
+        x0 = [x0]
+    toloose = numpy.sqrt(tol)
+    max_space = max(max_space, nroots*3)
+
+    xs = []
+    ax = []
+    def orth_append(xt):
+        xnew = []
+        for x in xt:
+            x = x / numpy.linalg.norm(x)
+            for k in range(2):
+                for xi in xs+xnew:
+                    x = x - numpy.dot(xi, x) * xi
+            norm = numpy.linalg.norm(x)
+            if norm > numpy.sqrt(lindep):
+                xnew.append(x/norm)
+        if xnew:
+            xs.extend(xnew)
+            ax.extend(aop(xnew))
+        return len(xnew)
+
+    orth_append(x0)
+    conv = [False] * nroots
+    e = numpy.zeros(nroots)
+    nw = 0
+    heff = numpy.empty((max(max_space, len(xs)),)*2)
+    nheff = 0  # the leading nheff x nheff block of heff is up to date
+    complex_warned = False
+    for icyc in range(max_cycle):
+        space = len(xs)
+        for i in range(nheff, space):
+            for j in range(i+1):
+                heff[i,j] = numpy.dot(xs[i], ax[j])
+                heff[j,i] = numpy.dot(xs[j], ax[i])
+        nheff = space
+        w, v = scipy.linalg.eig(heff[:space,:space])
+        idx = numpy.argsort(w.real)[:nroots]
+        w = w[idx]
+        v = v[:,idx]
+# The subspace may hold fewer than nroots vectors in the first iterations.
+# The missing roots are not converged and their last energies are 0.
+        nw = len(idx)
+        elast = e
+        e = numpy.zeros(nroots)
+        e[:nw] = w.real
+        de = e - elast
+        if numpy.any(abs(w.imag) > toloose) and not complex_warned:
+            log.warn('davidson_nosym: complex eigenvalues %s.  The real parts '
+                     'are used and the roots cannot converge.', w)
+            complex_warned = True
+# The eigenvectors of a complex conjugate pair are replaced by the real and
+# imaginary parts of the first one, which span the same real subspace.
+        vr = v.real
+        for k in range(1, nw):
+            if (abs(w[k].imag) > toloose and
+                abs(w[k] - w[k-1].conj()) < toloose):
+                vr[:,k] = v[:,k-1].imag
+
+        x0 = []
+        ax0 = []
+        for k in range(nw):
+            x1 = xs[0] * vr[0,k]
+            ax1 = ax[0] * vr[0,k]
+            for i in range(1, space):
+                x1 += xs[i] * vr[i,k]
+                ax1 += ax[i] * vr[i,k]
+            norm = numpy.linalg.norm(x1)
+            x0 .append(x1 / norm)
+            ax0.append(ax1 / norm)
+
+        xt = []
+        rnorm = []
+        for k in range(nw):
+            dx = ax0[k] - e[k] * x0[k]
+            rnorm.append(numpy.linalg.norm(dx))
+            conv[k] = rnorm[k] < toloose and abs(de[k]) < tol
+            if not conv[k]:
+                xt.append(precond(dx, e[k], x0[k]))
+        log.debug('davidson_nosym %d %d  |r|= %4.3g  e= %s  converged= %d',
+                  icyc, space, max(rnorm), e[:nw], sum(conv))
+        if all(conv):
+            break
+
+        if space + len(xt) > max_space:
+# Collapse the subspace to the eigenvectors.  a*x are assembled from the
+# existing ax, no extra call to aop.
+            xs = []
+            ax = []
+            for k in range(len(x0)):
+                x1 = x0[k]
+                ax1 = ax0[k]
+                for i in range(len(xs)):
+                    s = numpy.dot(xs[i], x1)
+                    x1 = x1 - s * xs[i]
+                    ax1 = ax1 - s * ax[i]
+                norm = numpy.linalg.norm(x1)
+                if norm > numpy.sqrt(lindep):
+                    xs.append(x1 / norm)
+                    ax.append(ax1 / norm)
+            nheff = 0
+        if orth_append(xt) == 0:
+            break
+
+    return conv[:nw], e[:nw], x0
+
+
 def krylov(aop, b, x0=None, tol=1e-10, max_cycle=30, dot=numpy.dot, \
            lindep=1e-16, callback=None, verbose=logger.WARN):
     '''Krylov subspace method to solve  (1+a) x = b.  Ref:
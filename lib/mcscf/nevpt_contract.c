@@ -200,16 +200,24 @@ void NEVPTkern_dfea_dfec(double *gt2, double *eri, double *t2ket,
 
 // TODO: NEVPTkern_spin0 stra_id >= strb_id as FCI4pdm_kern_spin0
 
-void NEVPTkern_sf(void (*contract_kernel)(),
-                  double *rdm2, double *rdm3, double *eri, double *ci0,
-                  int bcount, int stra_id, int strb_id,
-                  int norb, int na, int nb, int nlinka, int nlinkb,
-                  _LinkT *clink_indexa, _LinkT *clink_indexb)
+/*
+ * rdm3[j-p0,i,k,l,a,c] = <E^l_k E^i_j ket|gt2[a,c]> for p0 <= j < p1.  When
+ * tril is set, the elements j < k < p1 are skipped.  They are generated by
+ * the particle permutation symmetry from the elements k < j of the same
+ * slice in the caller.  rdm2 is skipped if it is NULL.
+ */
+static void kern_sf(void (*contract_kernel)(),
+                    double *rdm2, double *rdm3, double *eri, double *ci0,
+                    int bcount, int stra_id, int strb_id,
+                    int norb, int na, int nb, int nlinka, int nlinkb,
+                    _LinkT *clink_indexa, _LinkT *clink_indexb,
+                    int p0, int p1, int tril)
 {
         const int nnorb = norb * norb;
         const int n4 = nnorb * nnorb;
         const int n3 = nnorb * norb;
-        int i, j, k, l, ij;
+        const int nij = (p1 - p0) * norb;
+        int i, j, k, l, ij, k1, k2;
         size_t n;
         double *t1ket = malloc(sizeof(double) * nnorb * bcount);
         double *t2ket = malloc(sizeof(double) * n4 * bcount);
@@ -225,44 +233,72 @@ void NEVPTkern_sf(void (*contract_kernel)(),
         (*contract_kernel)(gt2, eri, t2ket, bcount, norb, na, nb);
 
 #pragma omp parallel default(none) \
-        shared(rdm2, rdm3, t1ket, t2ket, gt2, norb, bcount), \
-        private(ij, i, j, k, l, n, tbra, pbra, pt2)
+        shared(rdm2, rdm3, t1ket, t2ket, gt2, norb, bcount, p0, p1, tril), \
+        private(ij, i, j, k, l, n, k1, k2, tbra, pbra, pt2)
 {
         tbra = malloc(sizeof(double) * nnorb * bcount);
 #pragma omp for schedule(dynamic, 1) nowait
-        for (ij = 0; ij < nnorb; ij++) { // loop ij for (<ket| E^j_i E^l_k)
-                i = ij / norb;
-                j = ij - i * norb;
+        for (ij = 0; ij < nij; ij++) { // loop ij for (<ket| E^j_i E^l_k)
+                j = p0 + ij / norb;
+                i = ij % norb;
+                // k in [0,k1) and [k2,norb) are computed
+                k1 = tril ? j+1 : norb;
+                k2 = tril ? p1 : norb;
 
                 for (n = 0; n < bcount; n++) {
-                        for (k = 0; k <= j; k++) {
+                        for (k = 0; k < norb; k++) {
+                                if (k == k1) {
+                                        k = k2;
+                                        if (k == norb) {
+                                                break;
+                                        }
+                                }
                                 pbra = tbra + n * nnorb + k*norb;
-                                pt2 = t2ket + n * n4 + k*nnorb + ij;
+                                pt2 = t2ket + n * n4 + k*nnorb + i*norb+j;
                                 for (l = 0; l < norb; l++) {
                                         pbra[l] = pt2[l*n3];
                                 }
                         }
                 }
 
-                tril2pdm_particle_symm(rdm3+(j*norb+i)*n4, tbra, gt2,
-                                       bcount, j+1, norb);
+                tril2pdm_particle_symm(rdm3+((j-p0)*norb+i)*(size_t)n4,
+                                       tbra, gt2, bcount, k1, norb);
+                if (k2 < norb) {
+                        tril2pdm_particle_symm(rdm3+((j-p0)*norb+i)*(size_t)n4
+                                               + k2*norb*nnorb,
+                                               tbra+k2*norb, gt2, bcount,
+                                               norb-k2, norb);
+                }
         }
         free(tbra);
 }
 
-        // reordering of rdm2 is needed: rdm2.transpose(1,0,2,3)
-        const char TRANS_N = 'N';
-        const char TRANS_T = 'T';
-        const double D1 = 1;
-        dgemm_(&TRANS_N, &TRANS_T, &nnorb, &nnorb, &bcount,
-               &D1, gt2, &nnorb, t1ket, &nnorb,
-               &D1, rdm2, &nnorb);
+        if (rdm2 != NULL) {
+                // reordering of rdm2 is needed: rdm2.transpose(1,0,2,3)
+                const char TRANS_N = 'N';
+                const char TRANS_T = 'T';
+                const double D1 = 1;
+                dgemm_(&TRANS_N, &TRANS_T, &nnorb, &nnorb, &bcount,
+                       &D1, gt2, &nnorb, t1ket, &nnorb,
+                       &D1, rdm2, &nnorb);
+        }
 
         free(gt2);
         free(t1ket);
         free(t2ket);
 }
 
+void NEVPTkern_sf(void (*contract_kernel)(),
+                  double *rdm2, double *rdm3, double *eri, double *ci0,
+                  int bcount, int stra_id, int strb_id,
+                  int norb, int na, int nb, int nlinka, int nlinkb,
+                  _LinkT *clink_indexa, _LinkT *clink_indexb)
+{
+        kern_sf(contract_kernel, rdm2, rdm3, eri, ci0, bcount, stra_id, strb_id,
+                norb, na, nb, nlinka, nlinkb, clink_indexa, clink_indexb,
+                0, norb, 1);
+}
+
 
 void NEVPTcontract(void (*kernel)(),
                    double *rdm2, double *rdm3, double *eri, double *ci0,
@@ -304,3 +340,50 @@ void NEVPTcontract(void (*kernel)(),
         free(pdm2);
 }
 
+
+/*
+ * The slice p0:p1 of the first index of the contraction computed by
+ * NEVPTcontract.  t2ket and gt2 are generated once for each CI batch and
+ * contracted with all slices in p0:p1.  The elements j < k < p1 are not
+ * computed, they are filled by the particle permutation symmetry with rdm2
+ * in the caller, as in NEVPTcontract.
+ */
+void NEVPTcontract_slice(void (*kernel)(), double *rdm2, double *rdm3,
+                         double *eri, double *ci0, int p0, int p1,
+                         int norb, int na, int nb, int nlinka, int nlinkb,
+                         int *link_indexa, int *link_indexb)
+{
+        const size_t nnorb = norb * norb;
+        const size_t n4 = nnorb * nnorb;
+        int i, j, k, ib, strk, bcount;
+        double *pdm2 = malloc(sizeof(double) * n4);
+        double *cp1, *cp0;
+
+        _LinkT *clinka = malloc(sizeof(_LinkT) * nlinka * na);
+        _LinkT *clinkb = malloc(sizeof(_LinkT) * nlinkb * nb);
+        compress_link(clinka, link_indexa, norb, na, nlinka);
+        compress_link(clinkb, link_indexb, norb, nb, nlinkb);
+        memset(pdm2, 0, sizeof(double) * n4);
+        memset(rdm3, 0, sizeof(double) * n4 * norb * (p1-p0));
+
+        for (strk = 0; strk < na; strk++) {
+                for (ib = 0; ib < nb; ib += BUFBASE) {
+                        bcount = MIN(BUFBASE, nb-ib);
+                        kern_sf(kernel, pdm2, rdm3, eri, ci0, bcount, strk, ib,
+                                norb, na, nb, nlinka, nlinkb, clinka, clinkb,
+                                p0, p1, 1);
+                }
+        }
+        free(clinka);
+        free(clinkb);
+
+        for (i = 0; i < norb; i++) {
+        for (j = 0; j < norb; j++) {
+                cp1 = rdm2 + (i*norb+j) * nnorb;
+                cp0 = pdm2 + (j*norb+i) * nnorb;
+                for (k = 0; k < nnorb; k++) {
+                        cp1[k] = cp0[k];
+                }
+        } }
+        free(pdm2);
+}
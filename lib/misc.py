@@ -51,6 +51,26 @@ def current_memory():
     else:
         return 0, 0
 
+def process_pool(nproc, initializer=None, initargs=()):
+    '''multiprocessing.Pool of nproc processes which are not forked from the
+    current process.  The OpenMP runtime (libgomp) is not fork-safe, a child
+    forked after an OpenMP/BLAS parallel region can hang in its first
+    parallel region.  The workers are started by a fork server, or spawned
+    if fork server is not available.  Therefore the task functions and their
+    arguments must be picklable, and the main script must be protected by
+    "if __name__ == '__main__':".  Python 2 does not have the start methods,
+    the workers are forked.  Set OMP_NUM_THREADS=1 in this case.
+    '''
+    import multiprocessing
+    if hasattr(multiprocessing, 'get_context'):
+        if 'forkserver' in multiprocessing.get_all_start_methods():
+            ctx = multiprocessing.get_context('forkserver')
+        else:
+            ctx = multiprocessing.get_context('spawn')
+    else:
+        ctx = multiprocessing
+    return ctx.Pool(nproc, initializer, initargs)
+
 def c_int_arr(m):
     npm = numpy.array(m).flatten('C')
     arr = (ctypes.c_int * npm.size)(*npm)
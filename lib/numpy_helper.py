@@ -289,7 +289,8 @@ def transpose_sum(a, inplace=False):
 # pointers we want to pass in.
 # numpy.dot might not call optimized blas
 def dot(a, b, alpha=1, c=None, beta=0):
-    '''Matrix-matrix multiplication for double precision arrays
+    '''Matrix-matrix multiplication for double precision arrays.  Single
+    precision arrays are multiplied by numpy.dot (sgemm).
     '''
     m = a.shape[0]
     k = a.shape[1]
@@ -312,7 +313,7 @@ def dot(a, b, alpha=1, c=None, beta=0):
         raise ValueError('b.flags: %s' % str(b.flags))
 
     if c is None:
-        c = numpy.empty((m,n))
+        c = numpy.empty((m,n), dtype=numpy.result_type(a, b))
         beta = 0
     else:
         assert(c.flags.c_contiguous)
@@ -366,6 +367,11 @@ def _dgemm(trans_a, trans_b, m, n, k, a, b, c, alpha=1, beta=0,
     assert(0 < n < 2147483648)
     assert(0 < k < 2147483648)
 
+    if (a.dtype != numpy.double or b.dtype != numpy.double or
+        c.dtype != numpy.double):
+        return _gemm_numpy(trans_a, trans_b, m, n, k, a, b, c, alpha, beta,
+                           offseta, offsetb, offsetc)
+
     _np_helper.NPdgemm(ctypes.c_char(trans_b.encode('ascii')),
                        ctypes.c_char(trans_a.encode('ascii')),
                        ctypes.c_int(n), ctypes.c_int(m), ctypes.c_int(k),
@@ -379,6 +385,32 @@ def _dgemm(trans_a, trans_b, m, n, k, a, b, c, alpha=1, beta=0,
                        ctypes.c_double(alpha), ctypes.c_double(beta))
     return c
 
+def _gemm_numpy(trans_a, trans_b, m, n, k, a, b, c, alpha=1, beta=0,
+                offseta=0, offsetb=0, offsetc=0):
+    '''The same as _dgemm for the arrays of other types (e.g. float32)'''
+    def submat(x, offset, trans, nrow, ncol):
+        if trans == 'T':
+            nrow, ncol = ncol, nrow
+        ld = x.shape[1]
+        x = x.reshape(-1)[offset:]
+        x = numpy.lib.stride_tricks.as_strided(x, (nrow, ncol),
+                                               (x.strides[0]*ld, x.strides[0]))
+        if trans == 'T':
+            x = x.T
+        return x
+    ab = numpy.dot(submat(a, offseta, trans_a, m, k),
+                   submat(b, offsetb, trans_b, k, n))
+    if alpha != 1:
+        ab *= alpha
+    csub = submat(c, offsetc, 'N', m, n)
+    if beta == 0:
+        csub[:] = ab
+    else:
+        if beta != 1:
+            csub *= beta
+        csub += ab
+    return c
+
 
 
 
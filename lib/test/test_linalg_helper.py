@@ -6,6 +6,7 @@ import unittest
 import numpy
 import scipy.linalg
 import tempfile
+from pyscf import lib
 from pyscf import gto
 from pyscf import scf
 from pyscf import fci
@@ -25,6 +26,19 @@ class KnowValues(unittest.TestCase):
         e = myfci.kernel()[0]
         self.assertAlmostEqual(e, -11.579978414933732, 9)
 
+    def test_davidson_nosym(self):
+        numpy.random.seed(3)
+        n = 60
+        a = numpy.random.random((n,n))*.1 + numpy.diag(numpy.arange(n)*1.)
+        aop = lambda xs: [numpy.dot(a,x) for x in xs]
+        precond = lambda dx, e, x0: dx/(a.diagonal()-e+1e-4)
+        ref = numpy.sort(numpy.linalg.eigvals(a).real)[:4]
+        # one initial vector for four roots
+        conv, e, c = lib.davidson_nosym(aop, numpy.eye(n)[0], precond,
+                                        nroots=4, max_space=12)
+        self.assertTrue(all(conv))
+        self.assertAlmostEqual(abs(e-ref).max(), 0, 9)
+
 if __name__ == "__main__":
     print("Full Tests for linalg_helper")
     unittest.main()
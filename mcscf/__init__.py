@@ -160,6 +160,7 @@ from pyscf.mcscf import casci_uhf
 from pyscf.mcscf import mc1step_uhf
 from pyscf.mcscf.addons import *
 from pyscf.mcscf.df import density_fit
+from pyscf.mcscf.casci import scan_active_space
 
 def CASSCF(mf, *args, **kwargs):
     from pyscf import gto
@@ -329,6 +329,16 @@ def spin_square(casscf, mo_coeff=None, ci=None, ovlp=None):
         return ss, s*2+1
 
 
+def _dense_fci_rdm(fcibase_class):
+    '''Whether the RDM functions of the solver are those of the dense FCI
+    solvers (not overridden by e.g. selected CI)'''
+    for base in (pyscf.fci.direct_spin1.FCISolver,
+                 pyscf.fci.direct_spin0.FCISolver):
+        if (getattr(fcibase_class, 'make_rdm1', None) == base.make_rdm1 and
+            getattr(fcibase_class, 'make_rdm12', None) == base.make_rdm12):
+            return True
+    return False
+
 def state_average_e_(casscf, weights=(0.5,0.5)):
     ''' State average over the energy.  The energy funcitonal is
     E = w1<psi1|H|psi1> + w2<psi2|H|psi2> + ...
@@ -342,11 +352,19 @@ def state_average_e_(casscf, weights=(0.5,0.5)):
     assert(abs(sum(weights)-1) < 1e-10)
     fcibase = casscf.fcisolver
     fcibase_class = casscf.fcisolver.__class__
-    class FakeCISolver(fcibase_class):
+# The RDMs of all states are generated in one pass for the FCI solvers of
+# pyscf.fci which store the dense CI vectors.  Other solvers (selected CI,
+# DMRG, QMC ...) are called state by state.
+    batch_rdm = _dense_fci_rdm(fcibase_class)
+    class StateAverageFCISolver(fcibase_class):
         def __init__(self):
             self.__dict__.update(fcibase.__dict__)
             self.nroots = len(weights)
+            self.weights = weights
+            self._keys = self._keys.union(['weights'])
         def kernel(self, h1, h2, ncas, nelecas, ci0=None, **kwargs):
+# All roots are solved in one Davidson iteration.  ci0 carries the roots of
+# the previous iteration as the initial guess for each state.
             e, c = fcibase_class.kernel(self, h1, h2, ncas, nelecas, ci0,
                                         nroots=self.nroots, **kwargs)
             for i, ei in enumerate(e):
@@ -358,11 +376,16 @@ def state_average_e_(casscf, weights=(0.5,0.5)):
                                         nroots=self.nroots, **kwargs)
             return numpy.einsum('i,i->', e, weights), c
         def make_rdm1(self, ci0, norb, nelec):
+            if batch_rdm:
+                return pyscf.fci.rdm.make_rdm1_sa(ci0, weights, norb, nelec)
             dm1 = 0
             for i, wi in enumerate(weights):
                 dm1 += wi*fcibase_class.make_rdm1(self, ci0[i], norb, nelec)
             return dm1
         def make_rdm12(self, ci0, norb, nelec):
+            if batch_rdm:
+                rdm1, rdm2 = pyscf.fci.rdm.make_rdm12_sa(ci0, weights, norb, nelec)
+                return pyscf.fci.rdm.reorder_rdm(rdm1, rdm2, inplace=True)
             rdm1 = 0
             rdm2 = 0
             for i, wi in enumerate(weights):
@@ -375,7 +398,7 @@ def state_average_e_(casscf, weights=(0.5,0.5)):
             ss = numpy.einsum('i,i->', weights, ss)
             multip = numpy.sqrt(ss+.25)*2
             return ss, multip
-    casscf.fcisolver = FakeCISolver()
+    casscf.fcisolver = StateAverageFCISolver()
     return casscf
 
 def state_average_(casscf, weights=(0.5,0.5)):
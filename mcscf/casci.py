@@ -340,6 +340,126 @@ def kernel(casci, mo_coeff=None, ci0=None, verbose=logger.NOTE):
     return e_tot, e_cas, fcivec
 
 
+def scan_active_space(mf, candidates, mo_coeff=None, nproc=1, conv_tol=1e-8,
+                      verbose=None):
+    '''CASCI energies for a list of candidate active spaces.
+
+    The integrals are transformed only once, for the window of orbitals
+    which covers all candidates.  The CAS Hamiltonian of each candidate is
+    sliced from the window integrals, with the window orbitals below the
+    active space folded into h1eff and the core energy.  The FCI problems
+    are independent and are solved on nproc processes.
+
+    Args:
+        mf : an RHF object
+        candidates : list of tuples
+            (ncas, nelecas) or (ncas, nelecas, ncore), the arguments to
+            initialize :class:`CASCI`.
+
+    Kwargs:
+        mo_coeff : 2D array
+            Orbitals to build the active spaces.  Default is mf.mo_coeff
+        nproc : int
+            Number of processes for the FCI solvers.  The processes are not
+            forked (see :func:`pyscf.lib.process_pool`), the calling script
+            needs the "if __name__ == '__main__':" guard.
+        conv_tol : float
+            Convergence threshold of the FCI solvers.
+
+    Returns:
+        A list with one tuple (ncas, nelecas, ncore, e_tot, natocc) for each
+        candidate.  natocc are the natural occupations of the active
+        orbitals in descending order.
+
+    Examples:
+
+    >>> from pyscf import gto, scf, mcscf
+    >>> mol = gto.M(atom='N 0 0 0; N 0 0 1', basis='ccpvdz', verbose=0)
+    >>> mf = scf.RHF(mol)
+    >>> mf.scf()
+    >>> res = mcscf.scan_active_space(mf, [(4,4), (6,6), (8,10,2)], nproc=3)
+    '''
+    mol = mf.mol
+    if mo_coeff is None: mo_coeff = mf.mo_coeff
+    if verbose is None: verbose = mf.verbose
+    if isinstance(verbose, logger.Logger):
+        log = verbose
+    else:
+        log = logger.Logger(mf.stdout, verbose)
+    t0 = (time.clock(), time.time())
+
+    cases = []
+    for cand in candidates:
+        mc = CASCI(mf, *cand)
+        assert(mc.ncore+mc.ncas <= mo_coeff.shape[1])
+        cases.append((mc.ncas, mc.nelecas, mc.ncore))
+    c0 = min([x[2] for x in cases])
+    c1 = max([x[2]+x[0] for x in cases])
+    nwin = c1 - c0
+    log.info('scan %d active spaces in orbital window [%d:%d]',
+             len(cases), c0, c1)
+
+    mc = CASCI(mf, nwin, mol.nelectron-c0*2, c0)
+    mc.verbose = log.verbose
+    h1win, ecore0 = mc.h1e_for_cas(mo_coeff, nwin, c0)
+    eriwin = mc.ao2mo(mo_coeff[:,c0:c1])
+    eriwin = ao2mo.restore(1, eriwin, nwin)
+    t1 = log.timer('integrals in the orbital window', *t0)
+
+    ecores = []
+    tasks = []
+    for ncas, nelecas, ncore in cases:
+        k = ncore - c0
+        cas = slice(k, k+ncas)
+        eri_kk = eriwin[:k,:k,:k,:k]
+        ecores.append(ecore0 + h1win.diagonal()[:k].sum() * 2
+                      + numpy.einsum('iijj', eri_kk) * 2
+                      - numpy.einsum('ijji', eri_kk))
+        vj = numpy.einsum('ijkk->ij', eriwin[cas,cas,:k,:k])
+        vk = numpy.einsum('ikkj->ij', eriwin[cas,:k,:k,cas])
+        h1eff = h1win[cas,cas] + vj * 2 - vk
+        eri_cas = ao2mo.restore(4, eriwin[cas,cas,cas,cas].copy(), ncas)
+        tasks.append((h1eff, eri_cas, ncas, nelecas, conv_tol))
+    eriwin = eri_kk = None
+
+    if nproc > 1 and len(tasks) > 1:
+        pool = pyscf.lib.process_pool(min(nproc, len(tasks)))
+        try:
+            res = pool.map(_scan_task, tasks, chunksize=1)
+        finally:
+            pool.close()
+            pool.join()
+    else:
+        res = [_scan_task(task) for task in tasks]
+    log.timer('FCI for %d active spaces' % len(tasks), *t1)
+
+    e_nuc = mol.energy_nuc()
+    log.note('ncas  nelecas   ncore  E(CASCI)             natural occupations')
+    table = []
+    for (ncas, nelecas, ncore), (e_cas, natocc), ecore in \
+            zip(cases, res, ecores):
+        e_tot = e_cas + ecore + e_nuc
+        log.note('%-5d (%2d,%2d)   %-5d  %.15g  %s', ncas, nelecas[0],
+                 nelecas[1], ncore, e_tot, numpy.round(natocc, 4))
+        table.append((ncas, nelecas, ncore, e_tot, natocc))
+    log.timer('active space scan', *t0)
+    return table
+
+def _scan_task(args):
+    h1eff, eri_cas, ncas, nelecas, conv_tol = args
+    if nelecas[0] == nelecas[1]:
+        cis = fci.direct_spin0.FCISolver()
+    else:
+        cis = fci.direct_spin1.FCISolver()
+    cis.verbose = logger.QUIET
+    cis.conv_tol = conv_tol
+    cis.lindep = 1e-10
+    e_cas, fcivec = cis.kernel(h1eff, eri_cas, ncas, nelecas)
+    casdm1 = cis.make_rdm1(fcivec, ncas, nelecas)
+    natocc = numpy.linalg.eigh(casdm1)[0][::-1]
+    return e_cas, natocc
+
+
 class CASCI(object):
     '''CASCI
 
@@ -462,6 +582,9 @@ class CASCI(object):
         if mo_coeff is None:
             mo_coeff = self.mo_coeff[:,self.ncore:self.ncore+self.ncas]
         nao, nmo = mo_coeff.shape
+        if hasattr(self._scf, '_cderi'):
+            from pyscf.mcscf import df
+            return df.ao2mo_cas(self.mol, self._scf, mo_coeff)
         if self._scf._eri is not None and \
            (nao**2*nmo**2+nmo**4*2+self._scf._eri.size)*8/1e6 < self.max_memory*.95:
             eri = pyscf.ao2mo.incore.full(self._scf._eri, mo_coeff)
@@ -46,6 +46,9 @@ def density_fit(casscf, auxbasis='weigend'):
             self._keys = self._keys.union(['auxbasis'])
 
         def ao2mo(self, mo):
+            if hasattr(self._scf, '_cderi'):
+                # SCF object is density fitted, all integrals are approximated
+                return _ERIS(self, mo, self._scf)
             ncore = self.ncore
             #self._cderi = None # FIXME? leave as much memory as possible for mc_ao2mo
             eris = mc_ao2mo._ERIS(self, mo, 'incore', level=2)
@@ -99,6 +102,121 @@ def density_fit(casscf, auxbasis='weigend'):
     return CASSCF()
 
 
+class _ERIS(object):
+    '''ppaa, papa, vhf_c and the orbital Hessian intermediates j_pc, k_pc
+    generated from the 3-center DF integrals (L|pq).  No 4-index AO or MO
+    integrals are constructed.
+
+    Args:
+        casscf : an CASSCF object
+        mo : 2D array
+            MO coefficients
+        with_df : object
+            The object which holds the DF integrals _cderi (and _naoaux),
+            e.g. the SCF object decorated by :func:`scf.density_fit`
+    '''
+    def __init__(self, casscf, mo, with_df):
+        log = pyscf.lib.logger.Logger(casscf.stdout, casscf.verbose)
+        t0 = (time.clock(), time.time())
+        _gen_cderi(casscf.mol, with_df)
+
+        mo = numpy.asarray(mo, order='F')
+        nao, nmo = mo.shape
+        ncore = casscf.ncore
+        ncas = casscf.ncas
+        nocc = ncore + ncas
+        naoaux = with_df._naoaux
+        self.j_pc = numpy.zeros((nmo,ncore))
+        k_cp = numpy.zeros((ncore,nmo))
+        vj = numpy.zeros((nmo,nmo))
+        vk = numpy.zeros((nmo,nmo))
+        ppaa = numpy.zeros((nmo*nmo,ncas*ncas))
+        papa = numpy.zeros((nmo*ncas,nmo*ncas))
+
+        mem_now = pyscf.lib.current_memory()[0]
+        max_memory = max(0, casscf.max_memory*.9-mem_now)
+        blksize = int(max_memory*1e6/8/(nmo**2*2+nao**2))
+        blksize = max(4, min(dfhf.BLOCKDIM, blksize))
+        log.debug1('DF _ERIS blksize %d', blksize)
+        t1 = t0
+        with df.load(with_df._cderi) as feri:
+            for b0, b1 in dfhf.prange(0, naoaux, blksize):
+                buf = _trans_cderi(feri[b0:b1], mo, 0, nmo, 0, nmo)
+                naux = b1 - b0
+                bufaa = numpy.asarray(buf[:,ncore:nocc,ncore:nocc], order='C')
+                #:ppaa += numpy.einsum('Lpq,Luv->pquv', buf, bufaa)
+                pyscf.lib.dot(buf.reshape(naux,-1).T, bufaa.reshape(naux,-1),
+                              1, ppaa, 1)
+                bufpa = numpy.asarray(buf[:,:,ncore:nocc], order='C')
+                #:papa += numpy.einsum('Lpu,Lqv->puqv', bufpa, bufpa)
+                pyscf.lib.dot(bufpa.reshape(naux,-1).T, bufpa.reshape(naux,-1),
+                              1, papa, 1)
+                bufaa = bufpa = None
+
+                if ncore > 0:
+                    bufd = numpy.einsum('kii->ki', buf).copy()
+                    #:self.j_pc += numpy.einsum('ki,kj->ij', bufd, bufd[:,:ncore])
+                    pyscf.lib.dot(bufd.T, numpy.asarray(bufd[:,:ncore],order='C'),
+                                  1, self.j_pc, 1)
+                    k_cp += numpy.einsum('kij,kij->ij', buf[:,:ncore], buf[:,:ncore])
+                    #:vj += numpy.einsum('kpq,k->pq', buf, bufd[:,:ncore].sum(axis=1))
+                    pyscf.lib.dot(bufd[:,:ncore].sum(axis=1).reshape(1,-1),
+                                  buf.reshape(naux,-1), 1, vj.reshape(1,-1), 1)
+                    #:vk += numpy.einsum('kpi,kqi->pq', buf[:,:,:ncore], buf[:,:,:ncore])
+                    bufpc = buf[:,:,:ncore].transpose(1,0,2).reshape(nmo,-1)
+                    pyscf.lib.dot(bufpc, bufpc.T, 1, vk, 1)
+                    bufd = bufpc = None
+                buf = None
+                t1 = log.timer_debug1('DF _ERIS [%d:%d]'%(b0,b1), *t1)
+
+        self.k_pc = k_cp.T.copy()
+        self.vhf_c = vj*2 - vk
+        self.ppaa = ppaa.reshape(nmo,nmo,ncas,ncas)
+        self.papa = papa.reshape(nmo,ncas,nmo,ncas)
+        log.timer('density fitting ao2mo', *t0)
+
+def _gen_cderi(mol, with_df):
+    if not hasattr(with_df, '_cderi') or with_df._cderi is None:
+        # using dm=[], a hacky call to dfhf.get_jk, to generate _cderi
+        dfhf.get_jk_(with_df, mol, [])
+    return with_df._cderi
+
+def _trans_cderi(eri1, mo, i0, i1, j0, j1):
+    '''Transform a block of (L|ij) (lower triangular ij) to (L|pq) for
+    p in mo[:,i0:i1] and q in mo[:,j0:j1]'''
+    eri1 = numpy.asarray(eri1, order='C')
+    mo = numpy.asarray(mo, order='F')
+    nao = mo.shape[0]
+    naux = eri1.shape[0]
+    buf = numpy.empty((naux,i1-i0,j1-j0))
+    fmmm = _ao2mo._fpointer('AO2MOmmm_nr_s2_iltj')
+    fdrv = _ao2mo.libao2mo.AO2MOnr_e2_drv
+    ftrans = _ao2mo._fpointer('AO2MOtranse2_nr_s2kl')
+    fdrv(ftrans, fmmm,
+         buf.ctypes.data_as(ctypes.c_void_p),
+         eri1.ctypes.data_as(ctypes.c_void_p),
+         mo.ctypes.data_as(ctypes.c_void_p),
+         ctypes.c_int(naux), ctypes.c_int(nao),
+         ctypes.c_int(i0), ctypes.c_int(i1-i0),
+         ctypes.c_int(j0), ctypes.c_int(j1-j0),
+         ctypes.c_void_p(0), ctypes.c_int(0))
+    return buf
+
+def ao2mo_cas(mol, with_df, mo_cas):
+    '''The active space 2e integrals (uv|wx) ~ sum_L (uv|L)(L|wx) in the
+    4-fold symmetry compressed form, as returned by ao2mo.incore.full'''
+    _gen_cderi(mol, with_df)
+    ncas = mo_cas.shape[1]
+    idx = numpy.tril_indices(ncas)
+    eri = 0
+    with df.load(with_df._cderi) as feri:
+        for b0, b1 in dfhf.prange(0, with_df._naoaux, dfhf.BLOCKDIM):
+            buf = _trans_cderi(feri[b0:b1], mo_cas, 0, ncas, 0, ncas)
+            buf = numpy.asarray(buf[:,idx[0],idx[1]], order='C')
+            eri = eri + pyscf.lib.dot(buf.T, buf)
+    return eri
+
+
 
 if __name__ == '__main__':
     from pyscf import gto
@@ -227,6 +227,13 @@ def gen_g_hop(casscf, mo, u, casdm1, casdm2, eris):
 
 def rotate_orb_cc(casscf, mo, fcasdm1, fcasdm2, eris, x0_guess=None,
                   conv_tol_grad=1e-4, verbose=None):
+    '''Generator of the orbital rotations.  Each step yields the rotation
+    matrix u, the orbital gradients, the accumulated number of JK builds and
+    a dict of the AH statistics of the step: the AH iterations 'nah' and the
+    wall time 'jk_time' spent in the Hessian products and the keyframe
+    gradient updates (the JK builds).  The rest of the step is the AH
+    Davidson work.
+    '''
     if isinstance(verbose, logger.Logger):
         log = verbose
     else:
@@ -266,6 +273,24 @@ def rotate_orb_cc(casscf, mo, fcasdm1, fcasdm2, eris, x0_guess=None,
     if x0_guess is None:
         x0_guess = g_orb
     ah_conv_tol = min(norm_gorb**2, casscf.ah_conv_tol)
+    ah_stat = {'nah': 0, 'jk_time': 0.}
+    def h_op_jk(x):
+        t0 = time.time()
+        hx = h_op(x)
+        ah_stat['jk_time'] += time.time() - t0
+        return hx
+    def gorb_update_jk(u):
+        t0 = time.time()
+        g = gorb_update(u)
+        ah_stat['jk_time'] += time.time() - t0
+        return g
+    if (getattr(casscf, 'ah_reuse_space', 0) > 0 and
+        isinstance(mo, numpy.ndarray)):
+        if casscf._ah_space is None:
+            casscf._ah_space = _AHSpace(casscf.ah_reuse_space)
+        ah_space = casscf._ah_space
+    else:
+        ah_space = None
     while True:
         # increase the AH accuracy when approach convergence
         ah_start_tol = (numpy.log(norm_gorb+conv_tol_grad) -
@@ -281,8 +306,15 @@ def rotate_orb_cc(casscf, mo, fcasdm1, fcasdm2, eris, x0_guess=None,
 
         g_op = lambda: g_orb
 
+        if ah_space is None:
+            xs0 = ax0 = []
+            h_op1 = h_op_jk
+        else:
+            xs0, ax0, h_op1 = ah_space.seed(mo, x0_guess, h_op_jk)
+            log.debug('    AH starts with %d trial vectors', len(xs0))
+
         for ah_end, ihop, w, dxi, hdxi, residual, seig \
-                in davidson_cc(h_op, g_op, precond, x0_guess,
+                in davidson_cc(h_op1, g_op, precond, x0_guess, xs=xs0, ax=ax0,
                                tol=ah_conv_tol, max_cycle=casscf.ah_max_cycle,
                                lindep=casscf.ah_lindep, verbose=log):
             norm_residual = numpy.linalg.norm(residual)
@@ -323,7 +355,7 @@ def rotate_orb_cc(casscf, mo, fcasdm1, fcasdm2, eris, x0_guess=None,
                        norm_gorb < norm_gkf*kf_trust_region)):
                     ikf = 0
                     u = casscf.update_rotate_matrix(dr)
-                    g_kf = gorb_update(u)
+                    g_kf = gorb_update_jk(u)
                     norm_gkf = numpy.linalg.norm(g_kf)
                     norm_dg = numpy.linalg.norm(g_kf-g_orb)
                     kf_compensate = norm_dg / norm_gorb
@@ -351,15 +383,17 @@ def rotate_orb_cc(casscf, mo, fcasdm1, fcasdm2, eris, x0_guess=None,
 
         u = casscf.update_rotate_matrix(dr)
         jkcount += ihop
+        ah_stat['nah'] = ihop
         gorb_update = h_op = h_diag = None
         t3m = log.timer('aug_hess in %d inner iters' % imic, *t3m)
 
-        yield u, g_orb0.copy(), jkcount
+        yield u, g_orb0.copy(), jkcount, ah_stat
 
+        ah_stat = {'nah': 0, 'jk_time': 0.}
         t3m = (time.clock(), time.time())
         g_kf1, gorb_update, h_op, h_diag = \
                 casscf.gen_g_hop(mo, u, fcasdm1(), fcasdm2(), eris)
-        g_kf1 = gorb_update(u)
+        g_kf1 = gorb_update_jk(u)
         if (numpy.linalg.norm(g_kf1-g_kf) > norm_gkf*casscf.ah_grad_trust_region):
             log.debug('    Rejct keyframe |g|= %4.3g  |g_last| = %4.3f',
                       numpy.linalg.norm(g_kf1), norm_gkf)
@@ -396,6 +430,10 @@ def davidson_cc(h_op, g_op, precond, x0, tol=1e-10, xs=[], ax=[],
 
     heff = numpy.zeros((max_cycle+nx+1,max_cycle+nx+1))
     ovlp = numpy.eye(max_cycle+nx+1)
+    for i in range(nx-1):
+        for j in range(i+1):
+            heff[i+1,j+1] = heff[j+1,i+1] = numpy.dot(xs[i], ax[j])
+            ovlp[i+1,j+1] = ovlp[j+1,i+1] = numpy.dot(xs[i], xs[j])
     w_t = 0
     for istep in range(min(max_cycle,x0.size)):
         g = g_op()
@@ -454,6 +492,74 @@ def _dgemv(v, m):
         vm += vi * m[i+1]
     return vm
 
+class _AHSpace(object):
+    '''Keep the last max_space trial vectors of the AH solver and their
+    Hessian products, to seed the next AH solver of the same macro
+    iteration.  Within a macro iteration the orbitals and the integrals are
+    fixed and the Hessian only changes through the CI vector, so the old
+    products are a good approximation.  They are dropped whenever the
+    orbitals change.
+    '''
+    def __init__(self, max_space):
+        self.max_space = max_space
+        self.mo = None
+        self.xs = []
+        self.ax = []
+        self.nreuse = 0
+        self.nhop = 0
+        self.thop = 0
+
+    def seed(self, mo, x0, h_op):
+        '''Returns the initial trial vectors and Hessian products for
+        davidson_cc, and a h_op which records the new trial vectors'''
+        if mo is self.mo:  # the same orbitals, only the CI vector changed
+            xs, ax = self.xs, self.ax
+        else:
+            xs, ax = [], []
+        self.mo = mo
+
+        def h_op1(x):
+            t0 = time.time()
+            hx = h_op(x)
+            self.thop += time.time() - t0
+            self.nhop += 1
+            self.xs.append(x)
+            self.ax.append(hx)
+            del(self.xs[:-self.max_space])
+            del(self.ax[:-self.max_space])
+            return hx
+        # Orthonormalize the old vectors and x0.  x0 (the last AH step or
+        # the gradients) is often in the space of the old vectors.
+        qs = []
+        aq = []
+        for x, hx in zip(xs, ax):
+            for q, hq in zip(qs, aq):
+                c = numpy.dot(q, x)
+                x = x - c * q
+                hx = hx - c * hq
+            norm = numpy.linalg.norm(x)
+            if norm > 1e-6:
+                qs.append(x/norm)
+                aq.append(hx/norm)
+        self.nreuse += len(qs)
+        self.xs = list(qs)
+        self.ax = list(aq)
+        x0 = x0 / numpy.linalg.norm(x0)
+        for q in qs:
+            x0 = x0 - numpy.dot(q, x0) * q
+        norm = numpy.linalg.norm(x0)
+        if norm > 1e-6 or len(qs) == 0:
+            x0 = x0 / norm
+            qs.append(x0)
+            aq.append(h_op1(x0))
+        return qs, aq, h_op1
+
+    def saved_time(self):
+        if self.nhop > 0:
+            return self.thop / self.nhop * self.nreuse
+        else:
+            return 0
+
 
 def kernel(casscf, mo_coeff, tol=1e-7, conv_tol_grad=None, macro=50, micro=3,
            ci0=None, callback=None, verbose=logger.NOTE,
@@ -468,14 +574,19 @@ def kernel(casscf, mo_coeff, tol=1e-7, conv_tol_grad=None, macro=50, micro=3,
     log.debug('Start 1-step CASSCF')
     if callback is None:
         callback = casscf.callback
+    casscf._ah_space = None
 
     mo = mo_coeff
     nmo = mo.shape[1]
     ncas = casscf.ncas
+    tel = _Telemetry(casscf)
     #TODO: lazy evaluate eris, to leave enough memory for FCI solver
     eris = casscf.ao2mo(mo)
+    tel.tick('ao2mo')
     e_tot, e_ci, fcivec = casscf.casci(mo, ci0, eris)
+    tel.tick('fci')
     log.info('CASCI E = %.15g', e_tot)
+    tel.emit('casci', e_tot=e_tot)
     if ncas == nmo:
         log.debug('CASSCF canonicalization')
         mo, fcivec = casscf.canonicalize(mo, fcivec, eris, False,
@@ -488,11 +599,16 @@ def kernel(casscf, mo_coeff, tol=1e-7, conv_tol_grad=None, macro=50, micro=3,
     conv_tol_ddm = conv_tol_grad * 3
     max_cycle_micro = micro
     conv = False
-    totmicro = totinner = 0
+    totmicro = totinner = totah = 0
     norm_gorb = norm_gci = -1
     elast = e_tot
 
     r0 = None
+    ncore = casscf.ncore
+    nocc = ncore + ncas
+    eris_exact = True
+    eris_drift = nincr = 0
+    force_full_eris = False
 
     t1m = log.timer('Initializing 1-step CASSCF', *cput0)
     casdm1, casdm2 = casscf.fcisolver.make_rdm12(fcivec, ncas, casscf.nelecas)
@@ -502,9 +618,13 @@ def kernel(casscf, mo_coeff, tol=1e-7, conv_tol_grad=None, macro=50, micro=3,
     for imacro in range(macro):
         if casscf.dynamic_micro_step:
             max_cycle_micro = max(micro, int(micro-1-numpy.log(norm_ddm)))
-        imicro = 0
-        for u, g_orb, njk in casscf.rotate_orb_cc(mo, lambda:casdm1, lambda:casdm2,
-                                                  eris, r0, conv_tol_grad, log):
+        imicro = nah = 0
+        tel.tick()
+        for u, g_orb, njk, ah_stat in \
+                casscf.rotate_orb_cc(mo, lambda:casdm1, lambda:casdm2,
+                                     eris, r0, conv_tol_grad, log):
+            tel.tick('ah_davidson', ah_jk=ah_stat['jk_time'])
+            nah += ah_stat['nah']
             imicro += 1
             norm_gorb = numpy.linalg.norm(g_orb)
             if imicro == 1:
@@ -517,6 +637,7 @@ def kernel(casscf, mo_coeff, tol=1e-7, conv_tol_grad=None, macro=50, micro=3,
                 break
 
             casdm1, casdm2, gci, fcivec = casscf.update_casdm(mo, u, fcivec, e_ci, eris)
+            tel.tick('ci_update')
             if isinstance(gci, numpy.ndarray):
                 norm_gci = numpy.linalg.norm(gci)
             else:
@@ -537,21 +658,45 @@ def kernel(casscf, mo_coeff, tol=1e-7, conv_tol_grad=None, macro=50, micro=3,
                 (norm_gorb < conv_tol_grad*.8 and
                  (norm_ddm < conv_tol_ddm or norm_ddm_micro < conv_tol_ddm*.1))):
                 break
+            tel.tick()
+        tel.tick('ah_davidson')
 
         log.debug1('current memory %d MB', pyscf.lib.current_memory()[0])
 
         totmicro += imicro
         totinner += njk
+        totah += nah
 
         r0 = casscf.pack_uniq_var(u)
-        mo = numpy.dot(mo, u)
-
-        eris = None
-        eris = casscf.ao2mo(mo)
+        eris_exact_last = eris_exact
+        if casscf.incremental_eris_tol > 0 and not force_full_eris:
+            # second order error of rotate_eris ~ |u[inactive,active]|^2
+            ua = u[:,ncore:nocc].copy()
+            ua[ncore:nocc] = 0
+            eris_drift += numpy.linalg.norm(ua)**2
+            nincr += 1
+        if (casscf.incremental_eris_tol > 0 and not force_full_eris and
+            eris_drift < casscf.incremental_eris_tol and
+            nincr <= casscf.incremental_eris_cycle and
+            isinstance(eris.ppaa, numpy.ndarray) and
+            casscf._scf._eri is not None):
+            eris = mc_ao2mo.rotate_eris(casscf, mo, u, eris, log)
+            mo = numpy.dot(mo, u)
+            eris_exact = False
+            log.debug('incremental eris update %d, drift %4.3g', nincr, eris_drift)
+        else:
+            mo = numpy.dot(mo, u)
+            eris = None
+            eris = casscf.ao2mo(mo)
+            eris_exact = True
+            eris_drift = nincr = 0
+            force_full_eris = False
+        tel.tick('ao2mo')
         t2m = log.timer('update eri', *t3m)
 
         elast = e_tot
         e_tot, e_ci, fcivec = casscf.casci(mo, fcivec, eris)
+        tel.tick('fci')
         if hasattr(casscf.fcisolver, 'spin_square'):
             ss = casscf.fcisolver.spin_square(fcivec, ncas, casscf.nelecas)
         else:
@@ -573,7 +718,17 @@ def kernel(casscf, mo_coeff, tol=1e-7, conv_tol_grad=None, macro=50, micro=3,
 
         if (abs(e_tot - elast) < tol
             and (norm_gorb0 < conv_tol_grad and norm_ddm < conv_tol_ddm)):
-            conv = True
+            if eris_exact and eris_exact_last:
+                conv = True
+            else:
+# The gradients or the energy were computed with the incrementally updated
+# integrals.  Check the convergence again with the exact integrals.
+                force_full_eris = True
+
+        tel.emit('macro', imacro=imacro, e_tot=e_tot, de=e_tot-elast,
+                 norm_gorb=norm_gorb0, norm_gci=norm_gci, norm_ddm=norm_ddm,
+                 nmicro=imicro, njk=njk, nah=nah, eris_exact=eris_exact,
+                 converged=conv)
 
         if dump_chk:
             casscf.dump_chk(locals())
@@ -586,6 +741,9 @@ def kernel(casscf, mo_coeff, tol=1e-7, conv_tol_grad=None, macro=50, micro=3,
     else:
         log.info('1-step CASSCF not converged, %d macro (%d JK %d micro) steps',
                  imacro+1, totinner, totmicro)
+    _report_ah_space(casscf, log)
+    tel.emit('end', e_tot=e_tot, converged=conv, nmacro=imacro+1,
+             nmicro=totmicro, njk=totinner, nah=totah)
 
     log.debug('CASSCF canonicalization')
     mo, fcivec = casscf.canonicalize(mo, fcivec, eris, False,
@@ -596,6 +754,71 @@ def kernel(casscf, mo_coeff, tol=1e-7, conv_tol_grad=None, macro=50, micro=3,
     log.timer('1-step CASSCF', *cput0)
     return conv, e_tot, e_ci, fcivec, mo
 
+class _Telemetry(object):
+    '''Per-iteration statistics of the CASSCF kernel.
+
+    Each event is a dict with the event type ('casci', 'macro' or 'end'),
+    the quantities given by the kernel, the wall time spent in the different
+    parts of the kernel since the last event and the peak memory.  The
+    orbital rotation is split into 'ah_jk' (the JK builds of the Hessian
+    products and keyframes) and 'ah_davidson' (the rest of the AH solver).
+    It is passed to casscf.telemetry_callback and appended as one JSON line
+    to casscf.telemetry_file, if they are set.
+    '''
+    def __init__(self, casscf):
+        self.callback = getattr(casscf, 'telemetry_callback', None)
+        self.filename = getattr(casscf, 'telemetry_file', None)
+        self.enabled = callable(self.callback) or bool(self.filename)
+        self.t0 = self.tlast = self.tevent = time.time()
+        self.timing = {}
+        self.peak_memory = 0
+
+    def tick(self, key=None, **parts):
+        '''Attribute the wall time since the last tick to key.  The times
+        given in parts were measured within this interval, they are
+        attributed to their own keys and taken out of key.
+        '''
+        if self.enabled:
+            t1 = time.time()
+            if key is not None:
+                dt = t1 - self.tlast
+                for k, t in parts.items():
+                    self.timing[k] = self.timing.get(k, 0) + t
+                    dt -= t
+                self.timing[key] = self.timing.get(key, 0) + dt
+            self.tlast = t1
+            self.peak_memory = max(self.peak_memory,
+                                   pyscf.lib.current_memory()[0])
+
+    def emit(self, event, **kwargs):
+        if not self.enabled:
+            return
+        self.tick()
+        stat = {'event': event}
+        for key, val in kwargs.items():
+            if isinstance(val, (numpy.number, numpy.bool_)):
+                val = val.item()
+            stat[key] = val
+        stat['time'] = self.timing
+        stat['wall_time'] = self.tlast - self.tevent
+        stat['elapsed'] = self.tlast - self.t0
+        stat['peak_memory'] = self.peak_memory
+        if callable(self.callback):
+            self.callback(stat)
+        if self.filename:
+            import json
+            with open(self.filename, 'a') as f:
+                f.write(json.dumps(stat) + '\n')
+        self.timing = {}
+        self.tevent = self.tlast
+
+def _report_ah_space(casscf, log):
+    ah_space = getattr(casscf, '_ah_space', None)
+    if ah_space is not None:
+        log.info('AH subspace reuse: %d trial vectors reused, %d H*x evaluated, '
+                 'about %.2f s saved', ah_space.nreuse, ah_space.nhop,
+                 ah_space.saved_time())
+
 def get_fock(mc, mo_coeff=None, ci=None, eris=None, verbose=None):
     return casci.get_fock(mc, mo_coeff, ci, eris, verbose)
 
@@ -754,6 +977,20 @@ class CASSCF(casci.CASCI):
 # ah_grad_trust_region allow gradients increase for AH optimization
         self.ah_grad_trust_region = 2.5
         self.ah_decay_rate = .8
+# ah_reuse_space > 0 keeps the last ah_reuse_space AH trial vectors and their
+# Hessian products to initialize the next AH solver of the same macro
+# iteration.  The old Hessian products are not updated for the new CI vector.
+# They are dropped when the orbitals change.
+        self.ah_reuse_space = 0
+# incremental_eris_tol > 0 allows to update the integrals of the rotated
+# orbitals incrementally (see mc_ao2mo.rotate_eris) instead of the full
+# transformation, as long as the accumulated drift sum |u[inactive,active]|^2
+# is less than incremental_eris_tol and at most incremental_eris_cycle times
+# in a row.  Convergence is only accepted with the exact integrals.  The
+# incremental update needs the AO integrals in _scf._eri.  It is not used by
+# the outcore integral transformation.
+        self.incremental_eris_tol = 0
+        self.incremental_eris_cycle = 4
         self.grad_update_dep = 1
         self.ci_update_dep = 2
         self.internal_rotation = False
@@ -765,6 +1002,12 @@ class CASSCF(casci.CASCI):
         self.ci_response_space = 4
         self.natorb = False
         self.callback = None
+# telemetry_callback(stat) is called with a dict of statistics (energy,
+# gradients, JK count, AH iterations, timings, peak memory) after each macro
+# iteration.
+# The same dicts are appended as JSON lines to telemetry_file.
+        self.telemetry_callback = None
+        self.telemetry_file = None
 
         self.fcisolver.max_cycle = 50
 
@@ -774,6 +1017,7 @@ class CASSCF(casci.CASCI):
         self.ci = None
         self.mo_coeff = mf.mo_coeff
         self.converged = False
+        self._ah_space = None
 
         self._keys = set(self.__dict__.keys())
 
@@ -801,9 +1045,15 @@ class CASSCF(casci.CASCI):
         log.info('augmented hessian start_cycle = %d', self.ah_start_cycle)
         log.info('augmented hessian grad_trust_region = %g', self.ah_grad_trust_region)
         log.info('augmented hessian decay rate = %g', self.ah_decay_rate)
+        log.info('augmented hessian reuse space = %d', self.ah_reuse_space)
+        if self.incremental_eris_tol > 0:
+            log.info('incremental eris tol = %g  cycle = %d',
+                     self.incremental_eris_tol, self.incremental_eris_cycle)
         log.info('ci_response_space = %d', self.ci_response_space)
         log.info('chkfile = %s', self.chkfile)
         log.info('natorb = %s', self.natorb)
+        if self.telemetry_file:
+            log.info('telemetry_file = %s', self.telemetry_file)
         log.info('max_memory %d MB (current use %d MB)',
                  self.max_memory, pyscf.lib.current_memory()[0])
         log.debug('grad_update_dep %d', self.grad_update_dep)
@@ -926,7 +1176,8 @@ class CASSCF(casci.CASCI):
 #        return eris
 
         if hasattr(self._scf, '_cderi'):
-            raise RuntimeError('TODO: density fitting')
+            from pyscf.mcscf import df
+            return df._ERIS(self, mo, self._scf)
         return mc_ao2mo._ERIS(self, mo, method='incore', level=2)
 
     def get_h2eff(self, mo_coeff=None):
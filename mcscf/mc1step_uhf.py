@@ -254,8 +254,9 @@ def kernel(casscf, mo_coeff, tol=1e-7, conv_tol_grad=None, macro=50, micro=3,
         if casscf.dynamic_micro_step:
             max_cycle_micro = max(micro, int(micro-2-numpy.log(norm_ddm)))
         imicro = 0
-        for u, g_orb, njk in casscf.rotate_orb_cc(mo, lambda:casdm1, lambda:casdm2,
-                                                  eris, r0, conv_tol_grad, log):
+        for u, g_orb, njk, ah_stat in \
+                casscf.rotate_orb_cc(mo, lambda:casdm1, lambda:casdm2,
+                                     eris, r0, conv_tol_grad, log):
             imicro += 1
             norm_gorb = numpy.linalg.norm(g_orb)
             if imicro == 1:
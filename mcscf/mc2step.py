@@ -21,6 +21,7 @@ def kernel(casscf, mo_coeff, tol=1e-7, conv_tol_grad=None, macro=50, micro=1,
     log = logger.Logger(casscf.stdout, verbose)
     cput0 = (time.clock(), time.time())
     log.debug('Start 2-step CASSCF')
+    casscf._ah_space = None
 
     mo = mo_coeff
     nmo = mo.shape[1]
@@ -55,8 +56,9 @@ def kernel(casscf, mo_coeff, tol=1e-7, conv_tol_grad=None, macro=50, micro=1,
         t3m = log.timer('update CAS DM', *t3m)
         for imicro in range(micro):
 
-            for u, g_orb, njk in casscf.rotate_orb_cc(mo, lambda:casdm1, lambda:casdm2,
-                                                      eris, r0, conv_tol_grad, log):
+            for u, g_orb, njk, ah_stat in \
+                    casscf.rotate_orb_cc(mo, lambda:casdm1, lambda:casdm2,
+                                         eris, r0, conv_tol_grad, log):
                 break
             ninner += njk
             norm_t = numpy.linalg.norm(u-numpy.eye(nmo))
@@ -119,6 +121,7 @@ def kernel(casscf, mo_coeff, tol=1e-7, conv_tol_grad=None, macro=50, micro=1,
     else:
         log.info('2-step CASSCF not converged, %d macro (%d JK %d micro) steps',
                  imacro+1, totinner, totmicro)
+    mc1step._report_ah_space(casscf, log)
 
     log.debug('CASSCF canonicalization')
     mo, fcivec = casscf.canonicalize(mo, fcivec, eris, False,
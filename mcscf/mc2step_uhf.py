@@ -50,8 +50,9 @@ def kernel(casscf, mo_coeff, tol=1e-7, conv_tol_grad=None, macro=50, micro=1,
         t3m = log.timer('update CAS DM', *t3m)
         for imicro in range(micro):
 
-            for u, g_orb, njk in casscf.rotate_orb_cc(mo, lambda:casdm1, lambda:casdm2,
-                                                      eris, r0, conv_tol_grad, log):
+            for u, g_orb, njk, ah_stat in \
+                    casscf.rotate_orb_cc(mo, lambda:casdm1, lambda:casdm2,
+                                         eris, r0, conv_tol_grad, log):
                 break
             ninner += njk
             norm_t = numpy.linalg.norm(u-numpy.eye(nmo))
@@ -1,6 +1,7 @@
 #!/usr/bin/env python
 
 import sys
+import copy
 import ctypes
 import _ctypes
 import time
@@ -68,13 +69,26 @@ def trans_e1_incore(eri_ao, mo, ncore, ncas):
 # level = 1: ppaa, papa and jpc, kpc
 # level = 2 or 3: ppaa, papa
 def trans_e1_outcore(mol, mo, ncore, ncas, erifile,
-                     max_memory=None, level=1, verbose=logger.WARN):
+                     max_memory=None, level=1, verbose=logger.WARN,
+                     async_io=False, blksize=None):
+    '''Half transformation and the construction of ppaa and papa on disk.
+
+    Kwargs:
+        async_io : bool
+            Write the HDF5 blocks in a background thread.  The integral
+            evaluation and the transformation of the next block are overlapped
+            with the write of the previous block.
+        blksize : int
+            Max number of AO pairs in each block of AO integrals.  By default
+            it is determined by max_memory.
+    '''
     time0 = (time.clock(), time.time())
     if isinstance(verbose, logger.Logger):
         log = verbose
     else:
         log = logger.Logger(mol.stdout, verbose)
-    log.debug1('trans_e1_outcore level %d  max_memory %d', level, max_memory)
+    log.debug1('trans_e1_outcore level %d  max_memory %d  async_io %s',
+               level, max_memory, async_io)
     nao, nmo = mo.shape
     nao_pair = nao*(nao+1)//2
     nocc = ncore + ncas
@@ -91,7 +105,13 @@ def trans_e1_outcore(mol, mo, ncore, ncas, erifile,
     k_pc = numpy.zeros((nmo,ncore))
 
     mem_words = int(max(2000,max_memory-papa_buf.nbytes/1e6)*1e6/8)
-    aobuflen = mem_words//(nao_pair+nocc*nmo) + 1
+    if async_io:
+# the data of the previous block are held by the writer
+        aobuflen = mem_words//(nao_pair+nocc*nmo+ncas**2*2) + 1
+    else:
+        aobuflen = mem_words//(nao_pair+nocc*nmo) + 1
+    if blksize is not None:
+        aobuflen = min(aobuflen, blksize)
     shranges = outcore.guess_shell_ranges(mol, aobuflen, aobuflen, 's4')
     ao2mopt = _ao2mo.AO2MOpt(mol, 'cint2e_sph',
                              'CVHFnr_schwarz_cond', 'CVHFsetnr_direct_scf')
@@ -109,6 +129,7 @@ def trans_e1_outcore(mol, mo, ncore, ncas, erifile,
     fmmm = _fpointer('MCSCFhalfmmm_nr_s2_ket')
     ftrans = _fpointer('AO2MOtranse1_nr_s4')
     fdrv = getattr(libmcscf, 'AO2MOnr_e2_drv')
+    writer = outcore._AsyncWriter(async_io)
     for istep,sh_range in enumerate(shranges):
         log.debug('[%d/%d], AO [%d:%d], len(buf) = %d',
                   istep+1, nstep, *(sh_range[:3]))
@@ -178,8 +199,9 @@ def trans_e1_outcore(mol, mo, ncore, ncas, erifile,
             ti1 = log.timer('half transformation of the buffer', *ti1)
 
 # ppaa, papa
-        faapp_buf[str(istep)] = \
-                bufpa.reshape(sh_range[2],nmo,ncas)[:,ncore:nocc].reshape(-1,ncas**2).T
+        aapp = bufpa.reshape(sh_range[2],nmo,ncas)[:,ncore:nocc]
+        writer.write(faapp_buf, str(istep),
+                     pyscf.lib.transpose(aapp.reshape(-1,ncas**2)))
         p0 = 0
         for ij in range(sh_range[0], sh_range[1]):
             i,j = _ao2mo._extract_pair(ij)
@@ -209,19 +231,23 @@ def trans_e1_outcore(mol, mo, ncore, ncas, erifile,
             ti1 = log.timer('ppaa and papa buffer', *ti1)
 
         ti0 = log.timer('gen AO/transform MO [%d/%d]'%(istep+1,nstep), *ti0)
-    buf = buf1 = bufpa = None
+    buf = buf1 = bufpa = aapp = None
     bufs1 = bufs2 = bufs3 = None
+    writer.sync()
     time1 = log.timer('mc_ao2mo pass 1', *time0)
 
     log.debug1('Half transformation done. Current memory %d',
                pyscf.lib.current_memory()[0])
 
-    nblk = int(max(8, min(nmo, max(2000,max_memory*1e6/8-papa_buf.size)/(ncas**2*nmo))))
+# In async mode, one block is being written and one is queued while the next
+# block is computed
+    nbuf = 3 if async_io else 1
+    nblk = int(max(8, min(nmo, max(2000,max_memory*1e6/8-papa_buf.size)/(ncas**2*nmo*nbuf))))
     log.debug1('nblk for papa = %d', nblk)
     dset = feri.create_dataset('papa', (nmo,ncas,nmo,ncas), 'f8')
     for i0, i1 in prange(0, nmo, nblk):
         tmp = pyscf.lib.dot(mo[:,i0:i1].T, papa_buf.reshape(nao,-1))
-        dset[i0:i1] = tmp.reshape(i1-i0,ncas,nmo,ncas)
+        writer.write(dset, slice(i0,i1), tmp.reshape(i1-i0,ncas,nmo,ncas))
     papa_buf = tmp = None
     time1 = log.timer('papa pass 2', *time1)
 
@@ -230,16 +256,17 @@ def trans_e1_outcore(mol, mo, ncore, ncas, erifile,
     for istep, sh_range in enumerate(shranges):
         tmp[:,p0:p0+sh_range[2]] = faapp_buf[str(istep)]
         p0 += sh_range[2]
-    nblk = int(max(8, min(nmo, max(2000,max_memory*1e6/8-tmp.size)/(ncas**2*nmo)-1)))
+    nblk = int(max(8, min(nmo, max(2000,max_memory*1e6/8-tmp.size)/(ncas**2*nmo*nbuf)-1)))
     log.debug1('nblk for ppaa = %d', nblk)
     dset = feri.create_dataset('ppaa', (nmo,nmo,ncas,ncas), 'f8')
     for i0, i1 in prange(0, nmo, nblk):
         tmp1 = _ao2mo.nr_e2_(tmp, mo, (i0,i1-i0,0,nmo), 's4', 's1', ao_loc=ao_loc)
         tmp1 = tmp1.reshape(ncas,ncas,i1-i0,nmo)
-        for j in range(i1-i0):
-            dset[i0+j] = tmp1[:,:,j].transpose(2,0,1)
+        writer.write(dset, slice(i0,i1), tmp1.transpose(2,3,0,1).copy())
     tmp = tmp1 = None
+    writer.close()
     time1 = log.timer('ppaa pass 2', *time1)
+    writer.report(log, time.time()-time0[1])
 
     faapp_buf.close()
     feri.close()
@@ -251,7 +278,15 @@ def trans_e1_outcore(mol, mo, ncore, ncas, erifile,
 # level = 1: ppaa, papa and vhf, jpc, kpc
 # level = 2: ppaa, papa, vhf,  jpc=0, kpc=0
 class _ERIS(object):
-    def __init__(self, casscf, mo, method='incore', level=1):
+    '''Integrals for CASSCF.
+
+    method can be 'incore', 'outcore' or 'outcore_async'.  The incore
+    transformation is used when the memory allows, unless
+    mol.incore_anyway is set.  'outcore_async' overlaps the disk writes of
+    the outcore transformation with the computation; blksize tunes the
+    number of AO pairs in each block of the outcore transformation.
+    '''
+    def __init__(self, casscf, mo, method='incore', level=1, blksize=None):
         mol = casscf.mol
         nao, nmo = mo.shape
         ncore = casscf.ncore
@@ -280,7 +315,9 @@ class _ERIS(object):
                     trans_e1_outcore(mol, mo, casscf.ncore, casscf.ncas,
                                      self._tmpfile.name,
                                      max_memory=max_memory,
-                                     level=level, verbose=log)
+                                     level=level, verbose=log,
+                                     async_io=(method == 'outcore_async'),
+                                     blksize=blksize)
             self.feri = h5py.File(self._tmpfile.name, 'r')
             self.ppaa = self.feri['ppaa']
             self.papa = self.feri['papa']
@@ -294,6 +331,82 @@ class _ERIS(object):
             self.feri = None
             self._tmpfile = None
 
+def rotate_eris(casscf, mo, u, eris, verbose=None):
+    '''Approximate the integrals of the rotated orbitals mo*u by updating the
+    integrals of orbitals mo.
+
+    The general indices of ppaa and papa are rotated exactly.  For the active
+    indices, the rotation within the active space is exact and the mixing
+    between the active and inactive orbitals is included to first order,
+    through the integrals (pq|x_u y_v) and (p x_u|q y_v), where y are the
+    active orbitals rotated within the active space and x the contributions
+    of the inactive orbitals.  The error is second order in the
+    active-inactive rotation.  vhf_c is computed exactly.  j_pc and k_pc,
+    which are only used by the hessian diagonal, are not updated.
+
+    Both integrals are obtained from the half transformation (p x|kl) of
+    the AO integrals, which costs ~ nao^4*ncas compared to
+    nao^4*(ncore+ncas) of the full transformation.  The AO integrals are
+    taken from casscf._scf._eri, which should not be None.
+    '''
+    if isinstance(verbose, logger.Logger):
+        log = verbose
+    else:
+        log = logger.Logger(casscf.stdout, casscf.verbose)
+    t0 = (time.clock(), time.time())
+    mol = casscf.mol
+    nao, nmo = mo.shape
+    ncore = casscf.ncore
+    ncas = casscf.ncas
+    nocc = ncore + ncas
+    mo1 = numpy.dot(mo, u)
+    ua = u[:,ncore:nocc]
+    ua_in = ua[ncore:nocc]
+    x = numpy.dot(mo, ua) - numpy.dot(mo[:,ncore:nocc], ua_in)
+    y = numpy.dot(mo[:,ncore:nocc], ua_in)
+
+    eris1 = copy.copy(eris)
+    # (ab|cd) -> (pq|rs) with p,q in all orbitals, r,s in the active space
+    ppaa = _rotate_papa(numpy.asarray(eris.ppaa).transpose(0,2,1,3), u, ua_in)
+    ppaa = numpy.asarray(ppaa.transpose(0,2,1,3), order='C')
+    papa = numpy.asarray(_rotate_papa(eris.papa, u, ua_in), order='C')
+
+    eri = casscf._scf._eri
+    # (p x_u|kl).  Since y = mo1 * c, (y_u x_v|kl) = \sum_p c_pu (p x_v|kl)
+    buf = pyscf.ao2mo.incore.half_e1(eri, (mo1,x), compact=False)
+    c = numpy.dot(u[ncore:nocc].T, ua_in)
+    yx = numpy.dot(c.T, buf.reshape(nmo,-1)).reshape(ncas*ncas,-1)
+    # (x_u y_v|pq) + (y_u x_v|pq)
+    yx = _ao2mo.nr_e2_(yx, mo1, (0,nmo,0,nmo), 's4', 's1')
+    yx = yx.reshape(ncas,ncas,nmo,nmo)
+    ppaa += (yx + yx.transpose(1,0,2,3)).transpose(2,3,0,1)
+    yx = None
+    # (p x_u|q y_v) + (p y_u|q x_v)
+    buf = _ao2mo.nr_e2_(buf, numpy.hstack((mo1,y)), (0,nmo,nmo,ncas),
+                        's4', 's1')
+    buf = buf.reshape(nmo,ncas,nmo,ncas)
+    papa += buf
+    papa += buf.transpose(2,3,0,1)
+    buf = None
+    eris1.ppaa = ppaa
+    eris1.papa = papa
+
+    dm_core = numpy.dot(mo1[:,:ncore], mo1[:,:ncore].T)
+    vj, vk = casscf._scf.get_jk(mol, dm_core)
+    eris1.vhf_c = reduce(numpy.dot, (mo1.T, vj*2-vk, mo1))
+    log.timer('rotate_eris', *t0)
+    return eris1
+
+#:numpy.einsum('aubv,ap,uw,bq,vx->pwqx', papa, u, ua, u, ua)
+def _rotate_papa(papa, u, ua):
+    nmo, ncas = papa.shape[:2]
+    a = numpy.dot(numpy.asarray(papa).reshape(-1,ncas), ua)
+    a = numpy.dot(u.T, a.reshape(nmo,-1)).reshape(nmo,ncas,nmo,ncas)
+    a = numpy.dot(ua.T, a.transpose(1,0,2,3).reshape(ncas,-1))
+    a = a.reshape(ncas,nmo,nmo,ncas).transpose(1,0,3,2).reshape(-1,nmo)
+    a = numpy.dot(a, u)
+    return a.reshape(nmo,ncas,ncas,nmo).transpose(0,1,3,2)
+
 def _mem_usage(ncore, ncas, nmo):
     nvir = nmo - ncore
     outcore = basic = ncas**2*nmo**2*2 * 8/1e6
@@ -46,6 +46,12 @@ class KnowValues(unittest.TestCase):
         self.assertTrue(numpy.allclose(eris0.ppaa , eris3.ppaa ))
         self.assertTrue(numpy.allclose(eris0.papa , eris3.papa ))
 
+        eris4 = mcscf.mc_ao2mo._ERIS(mc, mo, 'outcore_async', blksize=200)
+        self.assertTrue(numpy.allclose(eris0.j_pc , eris4.j_pc ))
+        self.assertTrue(numpy.allclose(eris0.k_pc , eris4.k_pc ))
+        self.assertTrue(numpy.allclose(eris0.ppaa , eris4.ppaa ))
+        self.assertTrue(numpy.allclose(eris0.papa , eris4.papa ))
+
         ncore = mc.ncore
         ncas = mc.ncas
         nocc = ncore + ncas
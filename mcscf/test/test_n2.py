@@ -1,6 +1,8 @@
 #!/usr/bin/env python
 
 import unittest
+import tempfile
+import json
 import numpy
 from pyscf import gto
 from pyscf import scf
@@ -41,6 +43,72 @@ class KnowValues(unittest.TestCase):
         self.assertAlmostEqual(numpy.linalg.norm(mc.analyze()),
                                2.7015375913946591, 4)
 
+    def test_mc1step_4o4e_ah_reuse_space(self):
+        def count_macro(mc):
+            niter = [0]
+            def callback(envs):
+                niter[0] = max(niter[0], envs['imacro']+1)
+            mc.callback = callback
+            return niter
+        mc = mcscf.CASSCF(m, 4, 4)
+        nref = count_macro(mc)
+        mc.mc1step()
+        mc = mcscf.CASSCF(m, 4, 4)
+        mc.ah_reuse_space = 8
+        niter = count_macro(mc)
+        emc = mc.mc1step()[0]
+        self.assertAlmostEqual(emc, -108.913786407955, 7)
+        self.assertTrue(mc._ah_space.nreuse > 0)
+        self.assertTrue(niter[0] <= nref[0] + 2)
+        emc = mc.mc2step()[0]
+        self.assertAlmostEqual(emc, -108.913786407955, 7)
+
+    def test_mc1step_4o4e_incremental_eris(self):
+        stats = []
+        mc = mcscf.CASSCF(m, 4, 4)
+        mc.incremental_eris_tol = 1e-2
+        mc.telemetry_callback = stats.append
+        emc = mc.mc1step()[0]
+        self.assertAlmostEqual(emc, -108.913786407955, 7)
+        # rotate_eris was called for at least one macro iteration
+        self.assertTrue(any([not st['eris_exact'] for st in stats
+                             if st['event'] == 'macro']))
+
+    def test_mc1step_4o4e_telemetry(self):
+        ftmp = tempfile.NamedTemporaryFile()
+        stats = []
+        mc = mcscf.CASSCF(m, 4, 4)
+        mc.telemetry_file = ftmp.name
+        mc.telemetry_callback = stats.append
+        emc = mc.mc1step()[0]
+        self.assertAlmostEqual(emc, -108.913786407955, 7)
+        with open(ftmp.name) as f:
+            lines = [json.loads(l) for l in f]
+        self.assertEqual(len(lines), len(stats))
+        self.assertEqual(lines[0]['event'], 'casci')
+        self.assertEqual(lines[-1]['event'], 'end')
+        self.assertTrue(lines[-1]['converged'])
+        self.assertAlmostEqual(lines[-2]['e_tot'], emc, 9)
+        self.assertTrue('ah_jk' in lines[1]['time'])
+        self.assertTrue('ah_davidson' in lines[1]['time'])
+        self.assertTrue(lines[1]['nah'] > 0)
+        self.assertEqual(lines[-1]['nah'],
+                         sum([l['nah'] for l in lines if l['event'] == 'macro']))
+
+    def test_rotate_eris(self):
+        mc = mcscf.CASSCF(m, 4, 4)
+        mo = m.mo_coeff
+        nmo = mo.shape[1]
+        numpy.random.seed(1)
+        x = numpy.random.random((nmo,nmo)) * 1e-3
+        u = mcscf.mc1step.expmat(x - x.T)
+        eris0 = mc.ao2mo(mo)
+        eris1 = mcscf.mc_ao2mo.rotate_eris(mc, mo, u, eris0)
+        eris2 = mc.ao2mo(numpy.dot(mo, u))
+        self.assertTrue(abs(eris1.ppaa - eris2.ppaa).max() < 1e-5)
+        self.assertTrue(abs(eris1.papa - eris2.papa).max() < 1e-5)
+        self.assertTrue(numpy.allclose(eris1.vhf_c, eris2.vhf_c))
+
     def test_mc1step_4o4e_internal_rotation(self):
         mc = mcscf.CASSCF(m, 4, 4)
         mc.internal_rotation = True
@@ -97,6 +165,14 @@ class KnowValues(unittest.TestCase):
         self.assertAlmostEqual(numpy.linalg.norm(mc.analyze()),
                                2.6910275883606078, 4)
 
+    def test_scan_active_space(self):
+        res = mcscf.scan_active_space(m, [(4,4), (6,6), (6,6,3)], nproc=2)
+        self.assertAlmostEqual(res[0][3], -108.8896744464714, 7)
+        self.assertAlmostEqual(res[0][4].sum(), 4, 9)
+        for ncas, nelecas, ncore, e_tot, natocc in res[1:]:
+            mc = mcscf.CASCI(m, ncas, nelecas, ncore)
+            self.assertAlmostEqual(e_tot, mc.casci()[0], 7)
+
     def test_casci_symm_4o4e(self):
         mc = mcscf.CASCI(msym, 4, 4)
         emc = mc.casci()[0]
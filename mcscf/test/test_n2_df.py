@@ -5,6 +5,9 @@ import numpy
 from pyscf import gto
 from pyscf import scf
 from pyscf import mcscf
+from pyscf import ao2mo
+from pyscf import df
+from pyscf import lib
 
 b = 1.4
 mol = gto.M(
@@ -113,6 +116,25 @@ class KnowValues(unittest.TestCase):
         h1 = mcscf.mc1step.h1e_for_cas(mc, mo, mc.ao2mo(mo))
         self.assertTrue(numpy.allclose(h0, h1))
 
+    def test_df_eris(self):
+        mf = scf.density_fit(scf.RHF(mol))
+        mc = mcscf.CASSCF(mf, 4, 4)
+        mo = m.mo_coeff
+        eris = mc.ao2mo(mo)
+        with df.load(mf._cderi) as feri:
+            cderi = numpy.array([lib.unpack_tril(x) for x in feri])
+        cderi = numpy.einsum('kij,ip,jq->kpq', cderi, mo, mo)
+        eri = numpy.einsum('kpq,krs->pqrs', cderi, cderi)
+        self.assertTrue(numpy.allclose(eris.ppaa, eri[:,:,5:9,5:9]))
+        self.assertTrue(numpy.allclose(eris.papa, eri[:,5:9,:,5:9]))
+        self.assertTrue(numpy.allclose(eris.j_pc, numpy.einsum('iipp->pi', eri[:5,:5])))
+        self.assertTrue(numpy.allclose(eris.k_pc, numpy.einsum('ippi->pi', eri[:5,:,:,:5])))
+        h0 = mcscf.casci.h1e_for_cas(mc, mo, 4, 5)[0]
+        h1 = mcscf.mc1step.h1e_for_cas(mc, mo, eris)
+        self.assertTrue(numpy.allclose(h0, h1))
+        eri_cas = ao2mo.restore(1, mc.get_h2cas(mo[:,5:9]), 4)
+        self.assertTrue(numpy.allclose(eri_cas, eri[5:9,5:9,5:9,5:9]))
+
 #    def test_casci_uhf(self):
 #        mf = scf.UHF(mol)
 #        mf.scf()
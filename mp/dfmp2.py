@@ -3,12 +3,14 @@
 # -*- coding: utf-8
 
 '''
-density fitting MP2,  3-center integrals incore.
+density fitting MP2,  3-center integrals are held in a memory-mapped file.
 '''
 
 import time
 import tempfile
+from multiprocessing.pool import ThreadPool
 import numpy
+import pyscf.lib
 from pyscf.lib import logger
 from pyscf import df
 
@@ -18,34 +20,92 @@ from pyscf import df
 # (ij|kl) => (ij|ol) => (ol|ij) => (ol|oj) => (ol|ov) => (ov|ov)
 #   or    => (ij|ol) => (oj|ol) => (oj|ov) => (ov|ov)
 
-def kernel(mp, mo_energy, mo_coeff, nocc, ioblk=256, verbose=None):
+def kernel(mp, mo_energy, mo_coeff, nocc, ioblk=256, verbose=None,
+           with_t2=False, nthreads=1):
+    '''DF-MP2 correlation energy.
+
+    The transformed 3-center integrals are dumped once to a memory-mapped
+    (ia|L) array.  (ia|jb) are then generated for tiles of occupied pairs
+    (I,J) with I >= J, the tiles in the same row being evaluated on a pool
+    of nthreads threads.  When with_t2 is False, the t2 amplitudes are not
+    stored and None is returned for t2.
+    '''
     nmo = mo_coeff.shape[1]
     nvir = nmo - nocc
-    auxmol = df.incore.format_aux_basis(mp.mol, mp.auxbasis)
-    naoaux = auxmol.nao_nr()
-
-    iolen = max(int(ioblk*1e6/8/(nvir*nocc)), 160)
 
     eia = mo_energy[:nocc,None] - mo_energy[None,nocc:]
-    t2 = None
-    emp2 = 0
-    with mp.ao2mo(mo_coeff, nocc) as fov:
-        for p0, p1 in prange(0, naoaux, iolen):
-            logger.debug(mp, 'Load cderi block %d:%d', p0, p1)
-            qov = numpy.array(fov[p0:p1], copy=False)
-            for i in range(nocc):
-                buf = numpy.dot(qov[:,i*nvir:(i+1)*nvir].T,
-                                qov).reshape(nvir,nocc,nvir)
-                djba = (eia.reshape(-1,1) + eia[i].reshape(1,-1)).ravel()
-                gi = numpy.array(buf, copy=False)
-                gi = gi.reshape(nvir,nocc,nvir).transpose(1,2,0)
-                t2i = (gi.ravel()/djba).reshape(nocc,nvir,nvir)
-                # 2*ijab-ijba
-                theta = gi*2 - gi.transpose(0,2,1)
-                emp2 += numpy.einsum('jab,jab', t2i, theta)
+    if with_t2:
+        t2 = numpy.empty((nocc,nocc,nvir,nvir))
+    else:
+        t2 = None
 
+    with mp.ao2mo(mo_coeff, nocc) as fov:
+        naoaux = fov.shape[0]
+        lov_file = tempfile.NamedTemporaryFile()
+        lov = _dump_lov(fov, lov_file.name, ioblk)
+
+    mem_now = pyscf.lib.current_memory()[0]
+    max_memory = max(mp.max_memory - mem_now, 1)
+    if with_t2:
+        max_memory = max(max_memory - t2.size*8/1e6, 1)
+# (ia|jb) of each tile, and the (ia|L) slabs
+    occblk = int((max_memory*.5e6/8/(nthreads*nvir**2))**.5)
+    occblk = min(occblk, int(max_memory*.5e6/8/((nthreads+1)*nvir*naoaux)))
+    occblk = max(1, min(nocc, occblk))
+    logger.debug(mp, 'occblk = %d  nthreads = %d', occblk, nthreads)
+
+    def tile(i0, i1, lovi, j0, j1):
+        if j0 == i0:
+            lovj = lovi
+        else:
+            lovj = numpy.array(lov[j0*nvir:j1*nvir])
+        g = numpy.dot(lovi, lovj.T).reshape(i1-i0,nvir,j1-j0,nvir)
+        lovj = None
+        dajb = eia[j0:j1].reshape(j1-j0,1,nvir)
+        e = 0
+        for i in range(i0, i1):
+            gi = numpy.asarray(g[i-i0].transpose(1,0,2), order='C')
+            t2i = gi / (eia[i].reshape(1,-1,1) + dajb)
+            # 2*ijab-ijba
+            theta = gi*2 - gi.transpose(0,2,1)
+            e += numpy.dot(t2i.ravel(), theta.ravel())
+            if with_t2:
+                t2[i,j0:j1] = t2i
+                t2[j0:j1,i] = t2i.transpose(0,2,1)
+        if j0 != i0:
+            e *= 2
+        return e
+
+    if nthreads > 1:
+        pool = ThreadPool(nthreads)
+    emp2 = 0
+    for i0, i1 in prange(0, nocc, occblk):
+        lovi = numpy.array(lov[i0*nvir:i1*nvir])
+        tasks = [(i0, i1, lovi, j0, j1) for j0, j1 in prange(0, i1, occblk)]
+        if nthreads > 1:
+            emp2 += sum(pool.map(lambda args: tile(*args), tasks))
+        else:
+            emp2 += sum([tile(*args) for args in tasks])
+        lovi = None
+    if nthreads > 1:
+        pool.close()
+        pool.join()
+    lov = None
     return emp2, t2
 
+def _dump_lov(fov, filename, ioblk=256):
+    '''Transpose the (L|ia) integrals of an HDF5 dataset to a raw (ia|L)
+    memory-mapped array, so that the rows of an occupied block are
+    contiguous on disk.  fov is read once, in blocks of ioblk MB.'''
+    naoaux, nov = fov.shape
+    lov = numpy.memmap(filename, dtype=numpy.double, mode='w+',
+                       shape=(nov,naoaux))
+    blksize = max(int(ioblk*1e6/8/nov), 1)
+    for p0, p1 in prange(0, naoaux, blksize):
+        lov[:,p0:p1] = numpy.asarray(fov[p0:p1]).T
+    lov.flush()
+    return lov
+
 
 class MP2(object):
     def __init__(self, mf):
@@ -60,21 +120,28 @@ class MP2(object):
             self.auxbasis = 'weigend'
         self._cderi = None
         self.ioblk = 256
+# Only the energy is computed by default.  Set with_t2 to keep t2.
+        self.with_t2 = False
+# Number of threads to evaluate the (i,j) tiles of (ia|jb).
+        self.nthreads = 1
 
         self.emp2 = None
         self.t2 = None
 
-    def kernel(self, mo_energy=None, mo_coeff=None, nocc=None):
+    def kernel(self, mo_energy=None, mo_coeff=None, nocc=None, with_t2=None):
         if mo_coeff is None:
             mo_coeff = self._scf.mo_coeff
         if mo_energy is None:
             mo_energy = self._scf.mo_energy
         if nocc is None:
             nocc = self.mol.nelectron // 2
+        if with_t2 is None:
+            with_t2 = self.with_t2
 
         self.emp2, self.t2 = \
                 kernel(self, mo_energy, mo_coeff, nocc, self.ioblk,
-                       verbose=self.verbose)
+                       verbose=self.verbose, with_t2=with_t2,
+                       nthreads=self.nthreads)
         logger.log(self, 'RMP2 energy = %.15g', self.emp2)
         return self.emp2, self.t2
 
@@ -11,6 +11,10 @@ import pyscf.lib
 from pyscf.lib import logger
 from pyscf import ao2mo
 
+# The integral-direct (ia|jb) is used if all occupied orbitals can be
+# handled in at most DIRECT_MAX_BATCHES batches.
+DIRECT_MAX_BATCHES = 4
+
 
 '''
 spin-adapted MP2
@@ -22,23 +26,33 @@ t2[i,j,a,b] = (ia|jb) / D_ij^ab
 # (ij|kl) => (ij|ol) => (ol|ij) => (ol|oj) => (ol|ov) => (ov|ov)
 #   or    => (ij|ol) => (oj|ol) => (oj|ov) => (ov|ov)
 
-def kernel(mp, mo_energy, mo_coeff, verbose=logger.NOTE):
+def kernel(mp, mo_energy, mo_coeff, verbose=logger.NOTE, with_t2=False):
+    '''MP2 correlation energy and t2 amplitudes.
+
+    When with_t2 is False, t2 is not stored (None is returned for t2) and
+    only one slab t2[i] is held in memory at a time.
+    '''
     nocc = mp.nocc
     nvir = mp.nmo - nocc
     eia = mo_energy[:nocc,None] - mo_energy[None,nocc:]
-    t2 = numpy.empty((nocc,nocc,nvir,nvir))
+    if with_t2:
+        t2 = numpy.empty((nocc,nocc,nvir,nvir))
+    else:
+        t2 = None
     emp2 = 0
 
-    with mp.ao2mo(mo_coeff) as ovov:
+    with mp.ao2mo(mo_coeff, with_t2) as ovov:
         for i in range(nocc):
             dajb = (eia[i].reshape(-1,1) +
                     eia.reshape(1,-1)).reshape(nvir,nocc,nvir)
             gi = numpy.asarray(ovov[i*nvir:(i+1)*nvir])
             gi = gi.reshape(nvir,nocc,nvir).transpose(1,0,2)
-            t2[i] = (gi/dajb.transpose(1,0,2)).reshape(nocc,nvir,nvir)
+            t2i = (gi/dajb.transpose(1,0,2)).reshape(nocc,nvir,nvir)
             # 2*ijab-ijba
             theta = gi*2 - gi.transpose(0,2,1)
-            emp2 += numpy.einsum('jab,jab', t2[i], theta)
+            emp2 += numpy.einsum('jab,jab', t2i, theta)
+            if with_t2:
+                t2[i] = t2i
 
     return emp2, t2
 
@@ -51,7 +65,7 @@ def make_rdm1_ao(mp, mo_energy, mo_coeff, verbose=logger.NOTE):
     dm1vir = numpy.zeros((nvir,nvir))
     eia = mo_energy[:nocc,None] - mo_energy[None,nocc:]
     emp2 = 0
-    with mp.ao2mo(mo_coeff) as ovov:
+    with mp.ao2mo(mo_coeff, False) as ovov:
         for i in range(nocc):
             dajb = (eia[i].reshape(-1,1) +
                     eia.reshape(1,-1)).reshape(nvir,nocc,nvir)
@@ -114,6 +128,48 @@ def make_rdm2(mp, t2, verbose=logger.NOTE):
         dm2[nocc:,i,nocc:,:nocc] = dm2[i,nocc:,:nocc,nocc:].transpose(0,2,1)
     return dm2
 
+def iter_rdm2(mp, t2, blksize=None):
+    '''Generate the 2-RDM of :func:`make_rdm2` slab by slab.  It yields
+    (p0, p1, dm2[p0:p1]) and holds only one slab of size blksize*nmo**3 in
+    memory.
+    '''
+    nmo = mp.nmo
+    nocc = mp.nocc
+    if blksize is None:
+        mem_now = pyscf.lib.current_memory()[0]
+        max_memory = max(0, mp.max_memory - mem_now)
+        blksize = max(1, int(max_memory*.3e6/8/nmo**3))
+    for p0 in range(0, nocc, blksize):
+        p1 = min(p0+blksize, nocc)
+        dm2 = numpy.zeros((p1-p0,nmo,nmo,nmo))
+        for i in range(p0, p1):
+            t2i = t2[i]
+            dm2[i-p0,nocc:,:nocc,nocc:] = t2i.transpose(1,0,2)*2 - t2i.transpose(2,0,1)
+        yield p0, p1, dm2
+    for p0 in range(nocc, nmo, blksize):
+        p1 = min(p0+blksize, nmo)
+        a0, a1 = p0 - nocc, p1 - nocc
+        dm2 = numpy.zeros((p1-p0,nmo,nmo,nmo))
+        #: dm2[a,i,b,j] = t2[i,j,a,b]*2 - t2[i,j,b,a]
+        dm2[:,:nocc,nocc:,:nocc] = (t2[:,:,a0:a1]*2 -
+                                    t2[:,:,:,a0:a1].transpose(0,1,3,2)).transpose(2,0,3,1)
+        yield p0, p1, dm2
+
+def make_rdm2_outcore(mp, t2, filename, dataname='dm2', blksize=None):
+    '''Write the 2-RDM of :func:`make_rdm2` to the dataset dataname of the
+    HDF5 file filename without holding the full array in memory.
+    '''
+    import h5py
+    nmo = mp.nmo
+    feri = h5py.File(filename, 'a')
+    if dataname in feri:
+        del(feri[dataname])
+    dm2 = feri.create_dataset(dataname, (nmo,nmo,nmo,nmo), 'f8')
+    for p0, p1, buf in iter_rdm2(mp, t2, blksize):
+        dm2[p0:p1] = buf
+    feri.close()
+    return filename
+
 
 class MP2(object):
     def __init__(self, mf):
@@ -125,23 +181,34 @@ class MP2(object):
 
         self.nocc = self.mol.nelectron // 2
         self.nmo = len(mf.mo_energy)
+# By default only the energy is computed and the t2 amplitudes are not kept.
+# Set with_t2 to keep t2.  make_rdm1 and make_rdm2 generate t2 on demand.
+        self.with_t2 = False
+# If the AO integrals are not held in _scf._eri, (ia|jb) are generated
+# integral-direct for a batch of occupied orbitals at a time, unless more than
+# DIRECT_MAX_BATCHES batches are needed.  Set direct to False to always
+# transform the integrals through a temporary file (ao2mo.outcore).
+        self.direct = True
 
         self.emp2 = None
         self.t2 = None
 
-    def kernel(self, mo_energy=None, mo_coeff=None):
+    def kernel(self, mo_energy=None, mo_coeff=None, with_t2=None):
         if mo_coeff is None:
             mo_coeff = self._scf.mo_coeff
         if mo_energy is None:
             mo_energy = self._scf.mo_energy
+        if with_t2 is None:
+            with_t2 = self.with_t2
 
         self.emp2, self.t2 = \
-                kernel(self, mo_energy, mo_coeff, verbose=self.verbose)
+                kernel(self, mo_energy, mo_coeff, verbose=self.verbose,
+                       with_t2=with_t2)
         logger.log(self, 'RMP2 energy = %.15g', self.emp2)
         return self.emp2, self.t2
 
     # return eri_ovov array[nocc*nvir,nocc*nvir]
-    def ao2mo(self, mo_coeff):
+    def ao2mo(self, mo_coeff, with_t2=None):
         log = logger.Logger(self.stdout, self.verbose)
         time0 = (time.clock(), time.time())
         log.debug('transform (ia|jb)')
@@ -150,38 +217,147 @@ class MP2(object):
         nvir = nmo - nocc
         co = mo_coeff[:,:nocc]
         cv = mo_coeff[:,nocc:]
-        mem_incore, mem_outcore, mem_basic = _mem_usage(nocc, nvir)
+        if with_t2 is None:
+            with_t2 = self.with_t2
+        mem_incore, mem_outcore, mem_basic = _mem_usage(nocc, nvir, with_t2)
         mem_now = pyscf.lib.current_memory()[0]
+        max_memory = max(2000, self.max_memory*.9-mem_now) - mem_basic
+        if self.direct:
+            occblk = _direct_occblk(nocc, nvir, mo_coeff.shape[0], max_memory)
         if (self._scf._eri is not None and
             mem_incore+mem_now < self.max_memory or
             self.mol.incore_anyway):
             if self._scf._eri is None:
                 from pyscf.scf import _vhf
+                mol = self.mol
                 eri = _vhf.int2e_sph(mol._atm, mol._bas, mol._env)
             else:
                 eri = self._scf._eri
             eri = ao2mo.incore.general(eri, (co,cv,co,cv))
+# Each batch of the direct scheme recomputes all AO integrals.  Use the
+# outcore transformation if too many batches are needed.
+        elif self.direct and occblk*DIRECT_MAX_BATCHES >= nocc:
+            eri = _DirectOVOV(self, mo_coeff, max_memory)
+            log.debug('integral-direct (ia|jb), %d occupied orbitals per batch',
+                      eri.occblk)
+            return eri
         else:
-            max_memory = max(2000, self.max_memory*.9-mem_now)
+            if self.direct:
+                log.debug('%d occupied orbitals per batch for integral-direct '
+                          '(ia|jb).  Switch to outcore', occblk)
             erifile = tempfile.NamedTemporaryFile()
             ao2mo.outcore.general(self.mol, (co,cv,co,cv), erifile.name,
-                                  max_memory=max_memory-mem_basic,
-                                  verbose=self.verbose)
+                                  max_memory=max_memory,
+                                  verbose=self.verbose, file_format='raw')
             eri = erifile
         time1 = log.timer('Integral transformation', *time0)
         return ao2mo.load(eri)
 
     def make_rdm1(self, t2=None):
-        if t2 is None: t2 = self.t2
+        if t2 is None: t2 = self._get_t2()
         return make_rdm1(self, t2, self.verbose)
 
     def make_rdm2(self, t2=None):
-        if t2 is None: t2 = self.t2
+        if t2 is None: t2 = self._get_t2()
         return make_rdm2(self, t2, self.verbose)
 
-def _mem_usage(nocc, nvir):
+    def iter_rdm2(self, t2=None, blksize=None):
+        if t2 is None: t2 = self._get_t2()
+        return iter_rdm2(self, t2, blksize)
+
+    def _get_t2(self):
+        if self.t2 is None:
+            self.kernel(with_t2=True)
+        return self.t2
+
+class _DirectOVOV(object):
+    '''(ia|jb) as a [nocc*nvir,nocc*nvir] array whose rows are generated on
+    demand.  The Schwarz-screened AO integrals are recomputed for each batch
+    of occupied orbitals and transformed in memory; only the current batch
+    of (ia|jb) is stored.  Rows should be accessed in ascending order.
+    '''
+    def __init__(self, mp, mo_coeff, max_memory):
+        from pyscf.ao2mo import _ao2mo
+        mol = mp.mol
+        nao, nmo = mo_coeff.shape
+        nocc = mp.nocc
+        nvir = nmo - nocc
+        nao_pair = nao * (nao+1) // 2
+        self.mol = mol
+        self.mo_coeff = mo_coeff
+        self.nocc = nocc
+        self.nvir = nvir
+        self.shape = (nocc*nvir, nocc*nvir)
+
+        mem_words = max(1, max_memory*1e6/8)
+# AO integrals buffer, then the half transformed (ia|kl) and (ia|jb) of a batch
+        aobuflen = int(max(min(mem_words*.2/nao_pair, nao_pair), 1))
+        self.occblk = _direct_occblk(nocc, nvir, nao, max_memory)
+        self.shranges = [aoshs for sh_range in
+                         ao2mo.outcore.guess_shell_ranges(mol, nao_pair,
+                                                          aobuflen, 's4')
+                         for aoshs in sh_range[3]]
+        self.ao2mopt = _ao2mo.AO2MOpt(mol, 'cint2e_sph',
+                                      'CVHFnr_schwarz_cond',
+                                      'CVHFsetnr_direct_scf')
+        self._i0 = self._i1 = 0
+        self._buf = None
+
+    def __enter__(self):
+        return self
+    def __exit__(self, type, value, traceback):
+        self._buf = None
+        self.ao2mopt = None
+
+    def __getitem__(self, s):
+        nvir = self.nvir
+        i0 = s.start // nvir
+        i1 = (s.stop + nvir - 1) // nvir
+        if not (self._i0 <= i0 and i1 <= self._i1):
+            self._build(i0, min(self.nocc, max(i1, i0+self.occblk)))
+        p0 = self._i0 * nvir
+        return self._buf[s.start-p0:s.stop-p0]
+
+    def _build(self, i0, i1):
+        from pyscf.ao2mo import _ao2mo
+        mol = self.mol
+        nocc = self.nocc
+        nvir = self.nvir
+        mo_coeff = self.mo_coeff
+        nao = mo_coeff.shape[0]
+        nao_pair = nao * (nao+1) // 2
+        ni = i1 - i0
+        moij = numpy.asarray(numpy.hstack((mo_coeff[:,i0:i1],
+                                           mo_coeff[:,nocc:])), order='F')
+        self._buf = None
+        half = numpy.empty((nao_pair,ni*nvir))
+        aobuf = numpy.empty((max([x[2] for x in self.shranges]),nao_pair))
+        p0 = 0
+        for aoshs in self.shranges:
+            buf = aobuf[:aoshs[2]]
+            _ao2mo.nr_e1fill_('cint2e_sph', aoshs, mol._atm, mol._bas,
+                              mol._env, 's4', 1, self.ao2mopt, vout=buf)
+            _ao2mo.nr_e1_(buf, moij, (0,ni,ni,nvir), 's4', 's1',
+                          vout=half[p0:p0+aoshs[2]])
+            p0 += aoshs[2]
+        aobuf = buf = None
+        half = pyscf.lib.transpose(half)
+        self._buf = _ao2mo.nr_e2_(half, mo_coeff, (0,nocc,nocc,nvir),
+                                  's2kl', 's1')
+        self._i0, self._i1 = i0, i1
+
+def _direct_occblk(nocc, nvir, nao, max_memory):
+    '''Number of occupied orbitals per batch of _DirectOVOV'''
+    nao_pair = nao * (nao+1) // 2
+    mem_words = max(1, max_memory*1e6/8)
+    occblk = int(mem_words*.8/(nvir*(nao_pair*2+nocc*nvir)))
+    return max(1, min(nocc, occblk))
+
+def _mem_usage(nocc, nvir, with_t2=True):
     nmo = nocc + nvir
-    basic = ((nocc*nvir)**2 + nocc*nvir**2*2)*8 / 1e6
+    basic = nocc*nvir**2*2*8 / 1e6
+    if with_t2:
+        basic += (nocc*nvir)**2*8 / 1e6
     incore = nocc*nvir*nmo**2/2*8 / 1e6 + basic
     outcore = basic
     return incore, outcore, basic
@@ -216,11 +392,11 @@ if __name__ == '__main__':
     t2ref0 = t2ref0.reshape(nocc,nvir,nocc,nvir).transpose(0,2,1,3)
 
     pt = MP2(mf)
-    emp2, t2 = pt.kernel()
+    emp2, t2 = pt.kernel(with_t2=True)
     print(emp2 - -0.204019967288338)
     print('incore', numpy.allclose(t2, t2ref0))
     pt.max_memory = 1
-    print('direct', numpy.allclose(pt.kernel()[1], t2ref0))
+    print('direct', numpy.allclose(pt.kernel(with_t2=True)[1], t2ref0))
 
     rdm1 = make_rdm1_ao(pt, mf.mo_energy, mf.mo_coeff)
     print(numpy.allclose(reduce(numpy.dot, (mf.mo_coeff, pt.make_rdm1(),
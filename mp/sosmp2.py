@@ -0,0 +1,167 @@
+#!/usr/bin/env python
+# -*- coding: utf-8
+
+'''
+Laplace-transformed, density fitting SOS-MP2
+
+The energy denominator is expanded in exponentials
+
+    1/(e_a+e_b-e_i-e_j) = sum_k w_k exp(-t_k (e_a-e_i)) exp(-t_k (e_b-e_j))
+
+so that the opposite-spin MP2 energy
+
+    E_os = -sum_k w_k sum_PQ X^k_PQ X^k_PQ,
+    X^k_PQ = sum_ia (P|ia) exp(-t_k (e_a-e_i)) (Q|ia)
+
+is computed in O(N^4) operations.  E(SOS-MP2) = c_os * E_os.
+
+Ref: Y. Jung, R. C. Lochan, A. D. Dutoi, M. Head-Gordon,
+     J. Chem. Phys. 121, 9793 (2004)
+'''
+
+import sys
+import numpy
+import pyscf.lib
+from pyscf.lib import logger
+from pyscf.mp import dfmp2
+
+
+def kernel(mp, mo_energy, mo_coeff, nocc, ioblk=256, verbose=None):
+    '''Opposite-spin MP2 correlation energy from the Laplace quadrature
+    of the DF integrals.  The scaling factor c_os is not applied.
+    '''
+    if isinstance(verbose, logger.Logger):
+        log = verbose
+    else:
+        log = logger.Logger(mp.stdout, verbose)
+    nmo = mo_coeff.shape[1]
+    nvir = nmo - nocc
+    eia = mo_energy[nocc:] - mo_energy[:nocc,None]
+    xmin = eia.min() * 2
+    xmax = eia.max() * 2
+    t, w = laplace_quadrature(xmin, xmax, mp.laplace_tol, verbose=log)
+    log.info('Laplace quadrature  %d points  [%g, %g]', len(t), xmin, xmax)
+    log.debug('exponents %s', t)
+    log.debug('weights %s', w)
+    eia = eia.ravel()
+
+    e_os = 0
+    with mp.ao2mo(mo_coeff, nocc) as fov:
+        naoaux = fov.shape[0]
+        nov = nocc * nvir
+        collen = max(int(ioblk*1e6/8/naoaux), nvir)
+        mem_now = pyscf.lib.current_memory()[0]
+        max_memory = mp.max_memory - mem_now - collen*naoaux*2*8/1e6
+        kblk = max(1, min(len(t), int(max_memory*1e6/8/naoaux**2)))
+        log.debug('collen = %d  kblk = %d', collen, kblk)
+        for k0, k1 in dfmp2.prange(0, len(t), kblk):
+            x = numpy.zeros((k1-k0,naoaux,naoaux))
+            for p0, p1 in dfmp2.prange(0, nov, collen):
+                lov = numpy.asarray(fov[:,p0:p1])
+                for k in range(k0, k1):
+                    lovt = lov * numpy.exp(-.5*t[k]*eia[p0:p1])
+                    x[k-k0] += numpy.dot(lovt, lovt.T)
+                lov = lovt = None
+            for k in range(k0, k1):
+                e_os -= w[k] * numpy.dot(x[k-k0].ravel(), x[k-k0].ravel())
+            x = None
+    return e_os
+
+def laplace_quadrature(xmin, xmax, tol=1e-6, nmax=40, verbose=logger.WARN):
+    '''Exponents t and weights w of the quadrature
+
+        1/x ~= sum_k w_k exp(-t_k x)
+
+    whose relative error is below tol for x in [xmin, xmax].  The
+    exponents are geometrically spaced, the spacing and the number of
+    points being the smallest ones found to reach tol, and the weights
+    are fitted by least squares on a logarithmic grid of x.  If tol is
+    not reached with nmax points, a warning is given and the quadrature
+    of the smallest error is returned.
+    '''
+    if xmax < xmin * (1+1e-8):
+        xmax = xmin * (1+1e-8)
+    xs = numpy.exp(numpy.linspace(numpy.log(xmin), numpy.log(xmax), 400))
+    best = None
+    for n in range(1, nmax+1):
+        for a in (.02, .05, .1, .2, .5):
+            for b in (.5, 1, 2, 4, 8):
+                t = numpy.exp(numpy.linspace(numpy.log(a/xmax),
+                                             numpy.log(b/xmin), n))
+                ax = numpy.exp(-xs[:,None]*t) * xs[:,None]
+                w = numpy.linalg.lstsq(ax, numpy.ones_like(xs), rcond=-1)[0]
+                err = abs(numpy.dot(ax, w) - 1).max()
+                if best is None or err < best[2]:
+                    best = (t, w, err)
+        if best[2] < tol:
+            break
+    if best[2] >= tol:
+        if isinstance(verbose, logger.Logger):
+            log = verbose
+        else:
+            log = logger.Logger(sys.stdout, verbose)
+        log.warn('Laplace quadrature error %g > tol %g with %d points',
+                 best[2], tol, nmax)
+    return best[0], best[1]
+
+
+class SOSMP2(dfmp2.MP2):
+    '''Scaled opposite-spin MP2 with Laplace quadrature and density fitting
+
+    Attributes:
+        c_os : float
+            Scaling factor of the opposite-spin correlation energy.
+            Default is 1.3
+        laplace_tol : float
+            Max relative error of the Laplace quadrature of the energy
+            denominators.  Default is 1e-6
+
+    Saved results
+
+        e_os : float
+            Unscaled opposite-spin correlation energy
+        emp2 : float
+            SOS-MP2 correlation energy, c_os * e_os
+        t2 : None
+            The amplitudes are not generated.  kernel returns (emp2, None)
+            as dfmp2.MP2.kernel does.
+    '''
+    def __init__(self, mf):
+        dfmp2.MP2.__init__(self, mf)
+        self.c_os = 1.3
+        self.laplace_tol = 1e-6
+        self.e_os = None
+
+    def kernel(self, mo_energy=None, mo_coeff=None, nocc=None):
+        if mo_coeff is None:
+            mo_coeff = self._scf.mo_coeff
+        if mo_energy is None:
+            mo_energy = self._scf.mo_energy
+        if nocc is None:
+            nocc = self.mol.nelectron // 2
+
+        self.e_os = kernel(self, mo_energy, mo_coeff, nocc, self.ioblk,
+                           verbose=self.verbose)
+        self.emp2 = self.c_os * self.e_os
+        self.t2 = None
+        logger.log(self, 'E(OS) = %.15g  SOS-MP2 energy = %.15g',
+                   self.e_os, self.emp2)
+        return self.emp2, self.t2
+
+
+if __name__ == '__main__':
+    from pyscf import scf
+    from pyscf import gto
+    mol = gto.Mole()
+    mol.verbose = 0
+    mol.atom = [
+        [8 , (0. , 0.     , 0.)],
+        [1 , (0. , -0.757 , 0.587)],
+        [1 , (0. , 0.757  , 0.587)]]
+
+    mol.basis = 'cc-pvdz'
+    mol.build()
+    mf = scf.RHF(mol)
+    mf.scf()
+    pt = SOSMP2(mf)
+    print(pt.kernel()[0])
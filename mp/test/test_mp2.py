@@ -6,6 +6,8 @@ from pyscf import scf
 from pyscf import gto
 from pyscf import ao2mo
 from pyscf import mp
+from pyscf.mp import dfmp2
+from pyscf.mp import sosmp2
 
 mol = gto.Mole()
 mol.verbose = 0
@@ -44,10 +46,73 @@ class KnowValues(unittest.TestCase):
     def test_mp2_outcore(self):
         pt = mp.mp2.MP2(mf)
         pt.max_memory = 1
-        e, t2 = pt.kernel()
+        e, t2 = pt.kernel(with_t2=True)
         self.assertAlmostEqual(e, -0.20401996728747132, 11)
         self.assertAlmostEqual(numpy.linalg.norm(t2), 0.19379397642098622, 9)
 
+    def test_mp2_direct(self):
+        nocc = mol.nelectron//2
+        co = mf.mo_coeff[:,:nocc]
+        cv = mf.mo_coeff[:,nocc:]
+        g = ao2mo.incore.general(mf._eri, (co,cv,co,cv))
+        pt = mp.mp2.MP2(mf)
+        with mp.mp2._DirectOVOV(pt, mf.mo_coeff, .05) as ovov:
+            self.assertEqual(ovov.occblk, 1)
+            nvir = ovov.nvir
+            for i in range(nocc):
+                self.assertTrue(numpy.allclose(ovov[i*nvir:(i+1)*nvir],
+                                               g[i*nvir:(i+1)*nvir]))
+        pt.max_memory = 1
+        e, t2 = pt.kernel()
+        self.assertAlmostEqual(e, -0.20401996728747132, 11)
+        pt.direct = False
+        self.assertAlmostEqual(pt.kernel()[0], e, 11)
+
+    def test_mp2_energy_only(self):
+        pt = mp.mp2.MP2(mf)
+        e, t2 = pt.kernel()
+        self.assertAlmostEqual(e, -0.204019967288338, 11)
+        self.assertTrue(t2 is None)
+        pt.max_memory = 1
+        e, t2 = pt.kernel()
+        self.assertAlmostEqual(e, -0.20401996728747132, 11)
+        self.assertTrue(t2 is None)
+
+    def test_dfmp2_tiles(self):
+        pt = dfmp2.MP2(mf)
+        e, t2 = pt.kernel()
+        self.assertAlmostEqual(e, -0.204254491987, 8)
+        self.assertTrue(t2 is None)
+        pt.max_memory = .05
+        pt.nthreads = 3
+        e1, t2 = pt.kernel(with_t2=True)
+        self.assertAlmostEqual(e1, e, 11)
+        self.assertTrue(numpy.allclose(t2, t2.transpose(1,0,3,2)))
+
+    def test_laplace_quadrature(self):
+        t, w = sosmp2.laplace_quadrature(1., 100., 1e-6)
+        x = numpy.linspace(1, 100, 1000)
+        err = numpy.dot(numpy.exp(-x[:,None]*t), w) * x - 1
+        self.assertTrue(abs(err).max() < 1e-6)
+
+    def test_sosmp2(self):
+        nocc = mol.nelectron//2
+        pt = sosmp2.SOSMP2(mf)
+        e, t2 = pt.kernel()
+        self.assertTrue(t2 is None)
+        with pt.ao2mo(mf.mo_coeff, nocc) as fov:
+            g = numpy.dot(numpy.asarray(fov).T, numpy.asarray(fov))
+        eia = mf.mo_energy[:nocc,None] - mf.mo_energy[nocc:]
+        e_os = numpy.sum(g**2/(eia.reshape(-1,1)+eia.reshape(-1)))
+        self.assertAlmostEqual(pt.e_os, e_os, 7)
+        self.assertAlmostEqual(e, e_os*1.3, 7)
+
+        # opposite-spin component of the DF-MP2 amplitudes, t2*(ia|jb)
+        emp2, t2 = dfmp2.MP2(mf).kernel(with_t2=True)
+        d = eia[:,None,:,None] + eia[None,:,None,:]
+        e_os = numpy.einsum('ijab,ijab,ijab', t2, t2, d)
+        self.assertAlmostEqual(pt.e_os, e_os, 7)
+
     def test_mp2_dm(self):
         nocc = mol.nelectron//2
         nmo = mf.mo_energy.size
@@ -89,6 +154,15 @@ class KnowValues(unittest.TestCase):
         self.assertAlmostEqual(numpy.einsum('iajb,iajb', eris, dm2ref)*.5, emp2, 9)
         self.assertTrue(numpy.allclose(pt.make_rdm2(), dm2ref))
 
+        dm2 = numpy.empty_like(dm2ref)
+        for p0, p1, dm2slab in pt.iter_rdm2(blksize=3):
+            dm2[p0:p1] = dm2slab
+        self.assertTrue(numpy.allclose(dm2, dm2ref))
+        e2 = ao2mo.addons.contract_rdm2(pt.iter_rdm2(blksize=3), eris) * .5
+        self.assertAlmostEqual(e2, emp2, 9)
+        e2 = ao2mo.addons.contract_rdm2(pt.iter_rdm2(blksize=3), mf._eri,
+                                        mf.mo_coeff) * .5
+        self.assertAlmostEqual(e2, emp2, 9)
 
 
 if __name__ == "__main__":